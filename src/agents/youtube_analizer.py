@@ -1,354 +1,806 @@
 # src/agents/youtube_analizer.py
-print("Starting youtube_analizer.py")
+# LlamaIndex, NumPy and ffmpeg are imported where they are first used, so importing
+# this module (or a CLI that only needs part of it) doesn't pay for all of them.
 import os
-print("os imported")
-import subprocess
-print("subprocess imported")
+import asyncio
+import json
+import logging
+import time
 from dotenv import load_dotenv
-print("dotenv imported")
-from llama_index.core import VectorStoreIndex, Document
-print("llama_index.core imported")
-from llama_index.embeddings.openai import OpenAIEmbedding
-print("llama_index.embeddings.openai imported")
-from llama_index.core.node_parser import SimpleNodeParser
-print("llama_index.core.node parser imported")
-from llama_index.llms.openai import OpenAI
-print("llama_index.llms imported")
-import re
-print("re imported")
-import pysubs2  # For handling .srt subtitles
-print("pysubs2 imported")
+from utils.instrumentation import span, incr, instrument_llama_index
+from utils.subtitle_parser import Cue, iter_cues, read_new_cues
+from utils.rolling_captions import RollingCaptionDeduper, dedupe_rolling_cues
+from utils.subtitle_track import SubtitleTrack
+from utils.subtitle_chunker import chunk_track_by_tokens, chunk_stats
+from utils.file_hash import file_sha256
+from utils.timestamp_extractor import extract_timestamps, TranscriptSnapper
+from utils.segment_merger import merge_segments
+
+DEFAULT_QUERIES = [
+    "Identify the main topics or concepts explained in the video and the time they are discussed.",
+    "What are the key steps or processes demonstrated, along with their start and end times?",
+    "Point out any summaries or key takeaways explicitly mentioned by the speaker and their timestamps.",
+    "Find segments where important examples or demonstrations are provided, noting the time.",
+]
+
+logger = logging.getLogger(__name__)
 
 class VideoAnalyzer:
-    def __init__(self, video_path: str, output_path: str = "/app/data/video_analysis"):
+    def __init__(self, video_path: str | None, output_path: str = "/app/data/video_analysis", dedupe_captions: bool = True,
+                 chunk_tokens: int = 512, chunk_overlap_tokens: int = 0, embedding_cache_dir: str | None = "",
+                 embedding_cache_size: int = 100_000, queries: list[str] | None = None,
+                 max_concurrent_queries: int = 4, query_timeout: float = 60.0, extraction_mode: str = "queries",
+                 similarity_top_k: int = 5, merge_policy: str = "union", merge_iou_threshold: float = 0.5,
+                 max_segment_seconds: float | None = None, subtitle_path: str | None = None,
+                 audio_highlights: str = "fallback", retrieval_mode: str = "vector", hybrid_alpha: float = 0.5,
+                 llm=None, corpus_dir: str | None = "", embed_model=None):
+        # video_path may be None (or not downloaded yet) when subtitle_path is given
+        if not video_path and not subtitle_path:
+            raise ValueError("VideoAnalyzer needs a video_path or a subtitle_path")
         self.video_path = video_path
+        self.subtitle_path = subtitle_path
         self.output_path = output_path
+        self.video_id = os.path.basename(video_path or subtitle_path).split('.')[0]
+        self.index_dir = os.path.join(output_path, self.video_id)
+        self.dedupe_captions = dedupe_captions
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        # "" means the default location under output_path, None disables the cache
+        if embedding_cache_dir == "":
+            embedding_cache_dir = os.path.join(output_path, "embedding_cache")
+        self.embedding_cache_dir = embedding_cache_dir
+        self.embedding_cache_size = embedding_cache_size
+        # Shared index over every analyzed video; "" means the default location under
+        # output_path, None keeps a separate index per video in index_dir
+        if corpus_dir == "":
+            corpus_dir = os.path.join(output_path, "corpus")
+        self.corpus_dir = corpus_dir
+        self.corpus = None
+        self._incremental = None
+        self.queries = list(queries) if queries else list(DEFAULT_QUERIES)
+        self.max_concurrent_queries = max_concurrent_queries
+        self.query_timeout = query_timeout
+        # "queries": one LLM answer per query, timestamps parsed from free text.
+        # "structured": one LLM call over the retrieved chunks returning validated JSON segments.
+        # "retrieval": no LLM at all; the best retrieved chunks for each query are the segments.
+        if extraction_mode not in ("queries", "structured", "retrieval"):
+            raise ValueError(f"Unknown extraction_mode: {extraction_mode}")
+        self.extraction_mode = extraction_mode
+        self.similarity_top_k = similarity_top_k
+        # "vector": OpenAI embeddings. "bm25": local lexical index, no embeddings or network.
+        # "hybrid": both, scores fused as hybrid_alpha * vector + (1 - hybrid_alpha) * BM25.
+        if retrieval_mode not in ("vector", "bm25", "hybrid"):
+            raise ValueError(f"Unknown retrieval_mode: {retrieval_mode}")
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_alpha = hybrid_alpha
+        # Any LlamaIndex LLM; defaults to OpenAI gpt-3.5-turbo
+        self.llm = llm
+        # Any LlamaIndex embedding model; defaults to OpenAI embeddings
+        self.embed_model = embed_model
+        self.merge_policy = merge_policy
+        self.merge_iou_threshold = merge_iou_threshold
+        self.max_segment_seconds = max_segment_seconds
+        # "fallback": loudness highlights from the audio track when there are no subtitles.
+        # "fuse": also merge them with the transcript segments. "off": never decode audio.
+        if audio_highlights not in ("off", "fallback", "fuse"):
+            raise ValueError(f"Unknown audio_highlights mode: {audio_highlights}")
+        self.audio_highlights = audio_highlights
+        self.subtitle_track = None
+        self.index = None
+        self.retriever = None
+        self.snapper = None
         os.makedirs(self.output_path, exist_ok=True)
         load_dotenv()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
 
-        if not self.openai_api_key:
-            print("Warning: OPENAI_API_KEY not found in .env file.")
+        needs_openai = ((self.embed_model is None and self.retrieval_mode != "bm25")
+                        or (self.llm is None and self.extraction_mode != "retrieval"))
+        if not self.openai_api_key and needs_openai:
+            logger.warning("OPENAI_API_KEY not found in .env file.")
 
     def analyze(self):
-        print(f"Starting analysis of video: {self.video_path}")
-        important_segments = self._identify_important_segments()
-        print(f"Analysis complete. Important segments identified: {len(important_segments)}")
+        """Synchronous wrapper around aanalyze(); must not be called from a running event loop."""
+        return asyncio.run(self.aanalyze())
+
+    async def aanalyze(self, prepared=None):
+        """The important segments, or None when the analysis failed.
+
+        A failure (an error while indexing, every query failing, the structured
+        extraction call failing) is not the same as a video without important
+        segments, and should be retried rather than stored. prepared is the
+        result of _prepare_subtitles(), possibly from another process, so
+        parsing and chunking are not repeated.
+        """
+        logger.info("Starting analysis of video: %s", self.video_path or self.subtitle_path)
+        with span('analyze'):
+            important_segments = await self._identify_important_segments(prepared)
+        if important_segments is None:
+            logger.error("Analysis failed: %s", self.video_path or self.subtitle_path)
+            return None
+        logger.info("Analysis complete. Important segments identified: %d", len(important_segments))
         return important_segments
 
+    def export_clips(self, segments, output_dir=None, precise=False, highlight_reel=False, max_workers=None):
+        """Cut the segments returned by analyze() out of the video file.
+
+        Clips are stream-copied by default (precise=True re-encodes exact cuts) and
+        written to <output_path>/<video_id>/clips. With highlight_reel=True they are
+        also joined into highlights.mp4 (or the source container's extension).
+        """
+        if not self.video_path or not os.path.exists(self.video_path):
+            logger.warning("Video file not available for clip export: %s", self.video_path)
+            return {'clips': [], 'highlight_reel': None}
+        from utils.clip_exporter import export_clips, concat_clips
+        output_dir = output_dir or os.path.join(self.index_dir, 'clips')
+        with span('clip_export'):
+            clips = export_clips(self.video_path, segments, output_dir, precise=precise, max_workers=max_workers)
+        logger.info("Exported %d clips to %s", len(clips), output_dir)
+        reel = None
+        if highlight_reel and clips:
+            ext = os.path.splitext(clips[0]['path'])[1]
+            reel = concat_clips([clip['path'] for clip in clips], os.path.join(output_dir, f'highlights{ext}'))
+            logger.info("Highlight reel written to %s", reel)
+        return {'clips': clips, 'highlight_reel': reel}
+
     def _load_subtitles_with_time(self, subtitle_path):
+        """Load every cue from a .vtt or .srt file as a list of Cue(start, end, text)."""
+        subtitle_data = list(self._iter_subtitles_with_time(subtitle_path))
+        logger.info("Loaded %d subtitle entries", len(subtitle_data))
+        return subtitle_data
+
+    def _iter_subtitles_with_time(self, subtitle_path):
+        """Stream cues from a subtitle file without materializing the full list."""
+        if not subtitle_path.endswith(('.vtt', '.srt')):
+            logger.warning("Unsupported subtitle format: %s", subtitle_path)
+            return
+        logger.info("Loading subtitle from %s", subtitle_path)
         try:
-            if subtitle_path.endswith('.vtt'):
-                print(f"Loading VTT subtitle from {subtitle_path}")
-                with open(subtitle_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                subtitle_data = []
-                i = 0
-                while i < len(lines):
-                    if '-->' in lines[i]:
-                        try:
-                            time_segment = lines[i].strip().split(' --> ')
-                            start_time_str = time_segment[0]
-                            end_time_str = time_segment[1].split()[0]
-                            
-                            def time_to_seconds(t):
-                                parts = t.replace(',', '.').split(':')
-                                if len(parts) == 3:
-                                    return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-                                elif len(parts) == 2:
-                                    return float(parts[0]) * 60 + float(parts[1])
-                                return 0
-                                
-                            start_time = time_to_seconds(start_time_str)
-                            end_time = time_to_seconds(end_time_str)
-                            
-                            i += 1
-                            text = ''
-                            while i < len(lines) and lines[i].strip() and not '-->' in lines[i]:
-                                text += lines[i].strip() + ' '
-                                i += 1
-                                
-                            if text.strip():  # Only add if there's actual text content
-                                subtitle_data.append({'start': start_time, 'end': end_time, 'text': text.strip()})
-                        except Exception as e:
-                            print(f"Error parsing subtitle line: {lines[i]}, error: {e}")
-                            i += 1
-                    else:
-                        i += 1
-                        
-                print(f"Loaded {len(subtitle_data)} subtitle entries")
-                return subtitle_data
-            elif subtitle_path.endswith('.srt'):
-                try:
-                    subs = pysubs2.load(subtitle_path, encoding='utf-8')
-                    subtitle_data = []
-                    for sub in subs:
-                        start_time = sub.start / 1000.0
-                        end_time = sub.end / 1000.0
-                        text = sub.text.replace('\\N', ' ').replace('\\n', ' ')  # Clean up line breaks
-                        subtitle_data.append({'start': start_time, 'end': end_time, 'text': text})
-                    print(f"Loaded {len(subtitle_data)} SRT subtitle entries")
-                    return subtitle_data
-                except Exception as e:
-                    print(f"Error loading SRT subtitles: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return []
-            else:
-                print(f"Unsupported subtitle format: {subtitle_path}")
-                return []
+            yield from iter_cues(subtitle_path)
+        except Exception:
+            logger.exception("Error loading subtitles with time")
+
+    def _get_embed_model(self):
+        """The embedding model (OpenAI by default), served from the on-disk cache when one is configured."""
+        from utils.embedding_cache import EmbeddingCache, CachedEmbedding
+        instrument_llama_index()
+        embed_model = self.embed_model
+        if embed_model is None:
+            from llama_index.embeddings.openai import OpenAIEmbedding
+            embed_model = OpenAIEmbedding(api_key=self.openai_api_key)
+        if not self.embedding_cache_dir:
+            return embed_model
+        cache = EmbeddingCache(self.embedding_cache_dir, max_entries=self.embedding_cache_size)
+        return CachedEmbedding(embed_model, cache)
+
+    def _index_fingerprint(self, subtitle_path, embed_model):
+        """Everything the persisted index depends on; any change forces a rebuild."""
+        return {
+            'subtitle_sha256': file_sha256(subtitle_path),
+            'dedupe_captions': self.dedupe_captions,
+            'chunk_tokens': self.chunk_tokens,
+            'chunk_overlap_tokens': self.chunk_overlap_tokens,
+            'embed_model': embed_model.model_name,
+        }
+
+    def _load_persisted_index(self, fingerprint, embed_model):
+        fingerprint_path = os.path.join(self.index_dir, 'fingerprint.json')
+        if not os.path.exists(fingerprint_path):
+            return None
+        try:
+            with open(fingerprint_path, 'r') as f:
+                if json.load(f) != fingerprint:
+                    logger.info("Persisted index for %s is stale, rebuilding", self.video_id)
+                    return None
+            from llama_index.core import StorageContext, load_index_from_storage
+            with span('index_load'):
+                storage_context = StorageContext.from_defaults(persist_dir=self.index_dir)
+                index = load_index_from_storage(storage_context, embed_model=embed_model)
+            logger.info("Loaded persisted index from %s", self.index_dir)
+            return index
         except Exception as e:
-            print(f"Error loading subtitles with time: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+            logger.warning("Error loading persisted index, rebuilding: %s", e)
+            return None
+
+    def _chunk_nodes(self, chunks):
+        from llama_index.core.schema import TextNode
+        # One node per chunk: chunks already fit the token budget, so they are not re-split.
+        # start/end are shown to the LLM but kept out of the embedded text.
+        return [
+            TextNode(
+                text=chunk['text'],
+                metadata={'start': chunk['start'], 'end': chunk['end']},
+                excluded_embed_metadata_keys=['start', 'end'],
+            )
+            for chunk in chunks
+        ]
+
+    def _embed(self, embed_model, texts):
+        from utils.embedding_cache import CachedEmbedding
+        with span('embedding'):
+            embeddings = embed_model.get_text_embedding_batch(texts)
+        if isinstance(embed_model, CachedEmbedding):
+            logger.info("Embedding cache: %s", embed_model.cache.stats())
+        return embeddings
+
+    def _get_llm(self):
+        instrument_llama_index()
+        if self.llm is None:
+            from llama_index.llms.openai import OpenAI
+            self.llm = OpenAI(model="gpt-3.5-turbo", api_key=self.openai_api_key)
+        return self.llm
+
+    def _get_index(self, prepared, embed_model):
+        """Load this video's index from output_path, or build and persist it."""
+        fingerprint = self._prepared_fingerprint(prepared, embed_model)
+        index = self._load_persisted_index(fingerprint, embed_model)
+        if index is not None:
+            return index
+
+        # Combine nearby subtitles into chunks to get more context
+        chunked_subtitles = self._prepared_chunks(prepared)
+        logger.info("Created %d subtitle chunks", len(chunked_subtitles))
+
+        from llama_index.core import VectorStoreIndex
+        from llama_index.core.schema import MetadataMode
+        nodes = self._chunk_nodes(chunked_subtitles)
+        # Embedded up front (as VectorStoreIndex would) so embedding and index building are timed apart
+        embeddings = self._embed(embed_model, [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes])
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+        with span('index_build'):
+            index = VectorStoreIndex(nodes, embed_model=embed_model)
+            # Write the fingerprint last so a half-written index is never picked up
+            index.storage_context.persist(persist_dir=self.index_dir)
+            with open(os.path.join(self.index_dir, 'fingerprint.json'), 'w') as f:
+                json.dump(fingerprint, f, indent=4)
+        logger.info("Persisted index to %s", self.index_dir)
+        return index
+
+    def _add_to_corpus(self, prepared, embed_model):
+        """Embed and insert this video's chunks into the shared corpus unless it is already there; returns its nodes."""
+        from utils.corpus_index import CorpusIndex
+        if self.corpus is None:
+            self.corpus = CorpusIndex(self.corpus_dir, embed_model.model_name)
+        fingerprint = self._prepared_fingerprint(prepared, embed_model)
+        if self.corpus.has_video(self.video_id, fingerprint):
+            logger.info("%s is already in the corpus at %s", self.video_id, self.corpus_dir)
+        else:
+            chunks = self._prepared_chunks(prepared)
+            embeddings = self._embed(embed_model, [chunk['text'] for chunk in chunks])
+            with span('index_build'):
+                self.corpus.add_video(self.video_id, chunks, embeddings, fingerprint)
+        return self.corpus.nodes(self.video_id)
+
+    def load_index(self, prepared=None):
+        """Load (or build) this video's index without running the analysis queries.
+
+        With a corpus this adds the video to it and returns the CorpusIndex.
+        """
+        prepared = prepared or self._prepare_subtitles()
+        if prepared is None:
+            return None
+        if self.corpus_dir:
+            self._add_to_corpus(prepared, self._get_embed_model())
+            return self.corpus
+        self.index = self._get_index(prepared, self._get_embed_model())
+        return self.index
+
+    def query(self, question: str, similarity_top_k: int = 5, whole_library: bool = False):
+        """Ad-hoc question about the video, answered from its persisted index.
+
+        With whole_library=True (corpus only) the question is answered from every video in the corpus.
+        """
+        if self.index is None and self.corpus is None and self.load_index() is None:
+            return None
+        if self.corpus is None:
+            return self.index.as_query_engine(similarity_top_k=similarity_top_k, llm=self._get_llm()).query(question)
+        from llama_index.core.query_engine import RetrieverQueryEngine
+        retriever = self.corpus.as_retriever(
+            self._get_embed_model(),
+            video_ids=None if whole_library else [self.video_id],
+            similarity_top_k=similarity_top_k,
+        )
+        return RetrieverQueryEngine.from_args(retriever, llm=self._get_llm()).query(question)
+
+    def _prepare_subtitles(self):
+        """Find and parse the subtitles; returns {'subtitle_path', 'track', 'fingerprint', 'chunks'} or None.
+
+        fingerprint and chunks are filled in when first needed. The dict pickles,
+        so a worker process can prepare a video and hand it to the analysis.
+        """
+        subtitle_path = self._find_subtitle_file()
+        if not subtitle_path:
+            return None
+        track = self._load_subtitle_track(subtitle_path)
+        if not track:
+            return None
+        return {'subtitle_path': subtitle_path, 'track': track, 'fingerprint': None, 'chunks': None}
+
+    def _prepared_fingerprint(self, prepared, embed_model):
+        if prepared['fingerprint'] is None:
+            prepared['fingerprint'] = self._index_fingerprint(prepared['subtitle_path'], embed_model)
+        return prepared['fingerprint']
+
+    def _prepared_chunks(self, prepared):
+        if prepared['chunks'] is None:
+            prepared['chunks'] = self._chunk_subtitles(prepared['track'])
+        return prepared['chunks']
+
+    def _load_subtitle_track(self, subtitle_path):
+        """Stream cues from the file (deduplicating rolling captions) into a SubtitleTrack."""
+        cues = self._iter_subtitles_with_time(subtitle_path)
+        dedupe_stats = {}
+        if self.dedupe_captions:
+            cues = dedupe_rolling_cues(cues, stats=dedupe_stats)
+        with span('subtitle_parse'):
+            track = SubtitleTrack.from_cues(cues)
+        if dedupe_stats.get('chars_before'):
+            saved = 1 - dedupe_stats['chars_after'] / dedupe_stats['chars_before']
+            logger.info("Rolling caption dedup: %d -> %d cues, %d -> %d chars (%.0f%% saved)",
+                        dedupe_stats['cues_before'], dedupe_stats['cues_after'],
+                        dedupe_stats['chars_before'], dedupe_stats['chars_after'], saved * 100)
+        logger.info("Loaded %d subtitle entries (%.0fs)", len(track), track.duration)
+        self.subtitle_track = track
+        return track
 
     def _find_subtitle_file(self):
+        if self.subtitle_path:
+            if os.path.exists(self.subtitle_path):
+                return self.subtitle_path
+            logger.warning("Subtitle file not found: %s", self.subtitle_path)
+            return None
+
         # First try the default approach - looking for subtitle with same base name
         base_filename = os.path.basename(self.video_path).split('.')[0]
         possible_extensions = ['.en.vtt', '.vtt', '.en.srt', '.srt']
         subtitle_dir = os.path.dirname(self.video_path)
         
         # Debug info
-        print(f"Video path: {self.video_path}")
-        print(f"Base filename: {base_filename}")
-        print(f"Subtitle directory: {subtitle_dir}")
+        logger.debug("Video path: %s", self.video_path)
+        logger.debug("Base filename: %s", base_filename)
+        logger.debug("Subtitle directory: %s", subtitle_dir)
         
         # First try with the original video filename
         for ext in possible_extensions:
             subtitle_path = os.path.join(subtitle_dir, f'{base_filename}{ext}')
-            print(f"Checking for: {subtitle_path}")
+            logger.debug("Checking for: %s", subtitle_path)
             if os.path.exists(subtitle_path):
-                print(f"Found subtitle file: {subtitle_path}")
+                logger.info("Found subtitle file: %s", subtitle_path)
                 return subtitle_path
         
         # If not found, try looking for 'watch.en.vtt' which is common for YouTube files
         fallback_file = os.path.join(subtitle_dir, 'watch.en.vtt')
-        print(f"Checking fallback: {fallback_file}")
+        logger.debug("Checking fallback: %s", fallback_file)
         if os.path.exists(fallback_file):
-            print(f"Found fallback subtitle file: {fallback_file}")
+            logger.info("Found fallback subtitle file: %s", fallback_file)
             return fallback_file
             
         # List all files in the directory for debugging
-        print("All files in directory:")
+        logger.debug("All files in directory:")
         try:
             for file in os.listdir(subtitle_dir):
-                print(f"  {file}")
+                logger.debug("  %s", file)
                 # Check if any file in the directory has one of our extensions
                 for ext in possible_extensions:
                     if file.endswith(ext):
                         subtitle_path = os.path.join(subtitle_dir, file)
-                        print(f"Found potential subtitle file: {subtitle_path}")
+                        logger.info("Found potential subtitle file: %s", subtitle_path)
                         return subtitle_path
         except Exception as e:
-            print(f"Error listing directory: {e}")
+            logger.warning("Error listing directory: %s", e)
             
-        print("No subtitle file found.")
+        logger.warning("No subtitle file found.")
         return None
 
-    def _identify_important_segments(self):
-        try:
-            subtitle_path = self._find_subtitle_file()
-            if not subtitle_path:
-                print("No subtitle file found for analysis.")
-                return []
+    def _prepare_index(self, prepared=None):
+        """Find and load the subtitles (unless already prepared) and build the retriever; returns (track, retriever).
 
-            subtitle_data = self._load_subtitles_with_time(subtitle_path)
-            if not subtitle_data:
-                print("No subtitle data loaded.")
-                return []
-                
-            print(f"Processing {len(subtitle_data)} subtitle entries")
+        BM25 needs no embeddings, so in "bm25" mode the chunks are indexed in
+        memory (in milliseconds) instead of loading or building the vector index.
+        """
+        if prepared is None:
+            prepared = self._prepare_subtitles()
+            if prepared is None:
+                logger.warning("No subtitle data loaded for analysis.")
+                return None, None
+        track = self.subtitle_track = prepared['track']
 
-            # Combine nearby subtitles into chunks to get more context
-            chunked_subtitles = self._chunk_subtitles(subtitle_data)
-            print(f"Created {len(chunked_subtitles)} subtitle chunks")
+        from utils.bm25 import BM25Retriever, HybridRetriever
+        if self.retrieval_mode == "bm25":
+            nodes = self._chunk_nodes(self._prepared_chunks(prepared))
+            with span('index_build'):
+                self.retriever = BM25Retriever(nodes, similarity_top_k=self.similarity_top_k)
+        else:
+            embed_model = self._get_embed_model()
+            if self.corpus_dir:
+                nodes = self._add_to_corpus(prepared, embed_model)
 
-            documents = [Document(text=chunk['text'], metadata={'start': chunk['start'], 'end': chunk['end']}) for chunk in chunked_subtitles]
-            
-            embed_model = OpenAIEmbedding(api_key=self.openai_api_key)
-            llm = OpenAI(model="gpt-3.5-turbo", api_key=self.openai_api_key)
+                def vector_retriever(top_k):
+                    return self.corpus.as_retriever(embed_model, video_ids=[self.video_id], similarity_top_k=top_k)
+            else:
+                self.index = self._get_index(prepared, embed_model)
+                # Nodes come from the index itself so they also exist for a reloaded index
+                nodes = list(self.index.docstore.docs.values())
 
-            index = VectorStoreIndex.from_documents(documents, embed_model=embed_model)
-            query_engine = index.as_query_engine(similarity_top_k=5)
+                def vector_retriever(top_k):
+                    return self.index.as_retriever(similarity_top_k=top_k)
+            if self.retrieval_mode == "hybrid":
+                # Over-fetch from both sides so the fused top k isn't limited to either one's top k
+                self.retriever = HybridRetriever(
+                    vector_retriever(2 * self.similarity_top_k),
+                    BM25Retriever(nodes, similarity_top_k=2 * self.similarity_top_k),
+                    alpha=self.hybrid_alpha,
+                    similarity_top_k=self.similarity_top_k,
+                )
+            else:
+                self.retriever = vector_retriever(self.similarity_top_k)
+
+        chunk_bounds = sorted((node.metadata['start'], node.metadata['end']) for node in nodes)
+        self.snapper = TranscriptSnapper(
+            track.starts, track.ends,
+            [start for start, _ in chunk_bounds], [end for _, end in chunk_bounds],
+        )
+        return track, self.retriever
+
+    async def _run_query(self, query_engine, query, semaphore):
+        async with semaphore:
+            try:
+                # Retrieval plus the LLM call(s) that answer from the retrieved chunks
+                with span('llm_query'):
+                    response = await asyncio.wait_for(query_engine.aquery(query), timeout=self.query_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Query timed out after %ss: '%s'", self.query_timeout, query)
+                return None
+            except Exception as e:
+                logger.error("Error processing query '%s': %s", query, e)
+                return None
+        logger.debug("Query: %s\nResponse: %s", query, response.response)
+        segments = self._parse_response_for_time(response.response)
+        for segment in segments:
+            segment['query'] = query
+        return segments
+
+    async def _run_queries(self, retriever, llm):
+        # Run the query set concurrently; a failed or timed out query only loses its own results
+        from llama_index.core.query_engine import RetrieverQueryEngine
+        query_engine = RetrieverQueryEngine.from_args(retriever, llm=llm)
+        semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+        results = await asyncio.gather(*(self._run_query(query_engine, query, semaphore) for query in self.queries))
+        if self.queries and all(segments is None for segments in results):
+            raise RuntimeError("Every analysis query failed")
+        # gather keeps query order, so the merge is deterministic
+        return [segment for segments in results if segments for segment in segments]
 
-            important_segments = []
-            queries = [
-                "Identify the main topics or concepts explained in the video and the time they are discussed.",
-                "What are the key steps or processes demonstrated, along with their start and end times?",
-                "Point out any summaries or key takeaways explicitly mentioned by the speaker and their timestamps.",
-                "Find segments where important examples or demonstrations are provided, noting the time.",
-            ]
+    async def _retrieve_all(self, retriever):
+        """Retrieve chunks for every query concurrently; returns one result list per query.
 
-            for query in queries:
+        A failed retrieval gives an empty list; raises when all of them failed.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+
+        async def retrieve(query):
+            async with semaphore:
                 try:
-                    response = query_engine.query(query)
-                    print(f"Query: {query}\nResponse: {response.response}")
-                    extracted_times = self._parse_response_for_time(response.response)
-                    important_segments.extend(extracted_times)
+                    with span('retrieval'):
+                        return await retriever.aretrieve(query)
                 except Exception as e:
-                    print(f"Error processing query '{query}': {e}")
-                    continue
+                    logger.error("Error retrieving for query '%s': %s", query, e)
+                    return None
+
+        results = await asyncio.gather(*(retrieve(query) for query in self.queries))
+        if self.queries and all(nodes is None for nodes in results):
+            raise RuntimeError("Every retrieval failed")
+        return [nodes or [] for nodes in results]
+
+    async def _extract_retrieved(self, retriever):
+        """Use the retrieved chunks themselves as segments, scored by retrieval rank; no LLM involved."""
+        results = await self._retrieve_all(retriever)
+        segments = []
+        for query, nodes_with_scores in zip(self.queries, results):
+            for rank, node_with_score in enumerate(nodes_with_scores):
+                node = node_with_score.node
+                segments.append({
+                    'start': node.metadata['start'],
+                    'end': node.metadata['end'],
+                    'text': node.get_content(),
+                    'query': query,
+                    'score': round(1 / (rank + 1), 3),
+                })
+        return segments
+
+    async def _extract_structured(self, retriever, llm):
+        """Retrieve chunks for every query, then ask for all segments as JSON in a single LLM call."""
+        results = await self._retrieve_all(retriever)
+        nodes = {}
+        for node_with_score in (n for ns in results for n in ns):
+            nodes.setdefault(node_with_score.node.node_id, node_with_score.node)
+        if not nodes:
+            return []
+        chunks = sorted(
+            ({'start': node.metadata['start'], 'end': node.metadata['end'], 'text': node.get_content()}
+             for node in nodes.values()),
+            key=lambda chunk: chunk['start'],
+        )
+
+        from utils.structured_extraction import build_extraction_prompt, parse_extracted_segments
+        prompt = build_extraction_prompt(chunks)
+        try:
+            with span('llm_query'):
+                response = await asyncio.wait_for(llm.acomplete(prompt), timeout=self.query_timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Structured extraction timed out after {self.query_timeout}s") from None
+        logger.debug("Structured extraction over %d chunks:\n%s", len(chunks), response.text)
+        return parse_extracted_segments(response.text)
 
-            # Deduplicate segments based on start and end times
+    async def _extract_segments(self, retriever):
+        if self.extraction_mode == "retrieval":
+            return await self._extract_retrieved(retriever)
+        if self.extraction_mode == "structured":
+            return await self._extract_structured(retriever, self._get_llm())
+        return await self._run_queries(retriever, self._get_llm())
+
+    async def _identify_important_segments(self, prepared=None):
+        try:
+            # Loading, chunking and embedding are blocking; keep them off the event loop
+            track, retriever = await asyncio.to_thread(self._prepare_index, prepared)
+            if track is None:
+                if self.audio_highlights == "off":
+                    return []
+                logger.info("Falling back to audio highlights")
+                return self._deduplicate_segments(await asyncio.to_thread(self._detect_audio_highlights))
+
+            audio_task = None
+            if self.audio_highlights == "fuse":
+                # Decode the audio while the LLM queries run
+                audio_task = asyncio.create_task(asyncio.to_thread(self._detect_audio_highlights))
+
+            important_segments = await self._extract_segments(retriever)
+
+            # Drop times the LLM made up and merge overlapping segments from all queries
+            important_segments = self._validate_segments(important_segments, track)
+            if audio_task is not None:
+                important_segments += await audio_task
             unique_segments = self._deduplicate_segments(important_segments)
             return unique_segments
 
+        except Exception:
+            logger.exception("Error during important segment identification")
+            return None
+
+    def analyze_incremental(self, final=False):
+        """Synchronous wrapper around aanalyze_incremental()."""
+        return asyncio.run(self.aanalyze_incremental(final=final))
+
+    async def aanalyze_incremental(self, final=False):
+        """Analyze only the cues appended to the subtitle file since the last call.
+
+        The byte offset reached, the caption deduplication state and the cues of
+        the last, possibly unfinished chunk are kept in <index_dir>/incremental.json,
+        so this also resumes after a restart. New chunks are embedded and appended
+        to the corpus (or only indexed in memory with BM25), and the queries run
+        over the new time window alone. The last chunk is held back until more
+        text arrives; final=True flushes it once the transcript is complete.
+
+        Returns None when the analysis failed; the state then stays where it
+        was, so the next call retries the same captions.
+        """
+        if not self.corpus_dir and self.retrieval_mode != "bm25":
+            raise ValueError("Incremental analysis needs a corpus_dir or retrieval_mode='bm25'")
+        try:
+            track, retriever = await asyncio.to_thread(self._ingest_new_cues, final)
+            if track is None:
+                return []
+            segments = await self._extract_segments(retriever)
+            return self._deduplicate_segments(self._validate_segments(segments, track))
+        except Exception:
+            logger.exception("Error during incremental analysis")
+            return None
+
+    async def astream_segments(self, poll_interval: float = 10.0, idle_timeout: float | None = 300.0):
+        """Yield segments as captions are appended to the subtitle file.
+
+        The file is polled every poll_interval seconds; once it hasn't grown for
+        idle_timeout seconds the rest is flushed and the stream ends (never, if
+        idle_timeout is None).
+        """
+        idle_since = time.monotonic()
+        while True:
+            offset = self._incremental['offset'] if self._incremental else None
+            # A failed call leaves the offset alone and is retried on the next poll
+            for segment in await self.aanalyze_incremental() or []:
+                yield segment
+            if self._incremental and self._incremental['offset'] != offset:
+                idle_since = time.monotonic()
+            elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                for segment in await self.aanalyze_incremental(final=True) or []:
+                    yield segment
+                return
+            await asyncio.sleep(poll_interval)
+
+    def _incremental_settings(self, embed_model):
+        return {
+            'dedupe_captions': self.dedupe_captions,
+            'chunk_tokens': self.chunk_tokens,
+            'chunk_overlap_tokens': self.chunk_overlap_tokens,
+            'retrieval_mode': self.retrieval_mode,
+            'embed_model': embed_model.model_name if embed_model is not None else None,
+        }
+
+    def _load_incremental_state(self, subtitle_path, embed_model):
+        state_path = os.path.join(self.index_dir, 'incremental.json')
+        settings = self._incremental_settings(embed_model)
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+            if state['subtitle_path'] == subtitle_path and state['settings'] == settings:
+                logger.info("Resuming incremental analysis of %s at byte %d", self.video_id, state['offset'])
+                return state
+            logger.info("Incremental state for %s is stale, starting over", self.video_id)
+        state = {
+            'subtitle_path': subtitle_path,
+            'settings': settings,
+            'offset': 0,
+            'deduper': None,
+            'carry': [],
+            # Rows from a full analysis or an older incremental run are replaced, not appended to
+            'fingerprint': {**settings, 'incremental_since': time.time()},
+        }
+        if self.corpus is not None:
+            self.corpus.add_video(self.video_id, [], [], state['fingerprint'])
+        return state
+
+    def _save_incremental_state(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        state_path = os.path.join(self.index_dir, 'incremental.json')
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(self._incremental, f)
+        os.replace(state_path + '.tmp', state_path)
+
+    def _ingest_new_cues(self, final=False):
+        """Parse, chunk and index the newly appended cues; returns (window track, window retriever)."""
+        from utils.bm25 import BM25Retriever, HybridRetriever
+        embed_model = None if self.retrieval_mode == "bm25" else self._get_embed_model()
+        if self._incremental is None:
+            subtitle_path = self._find_subtitle_file()
+            if not subtitle_path:
+                return None, None
+            if embed_model is not None and self.corpus is None:
+                from utils.corpus_index import CorpusIndex
+                self.corpus = CorpusIndex(self.corpus_dir, embed_model.model_name)
+            self._incremental = self._load_incremental_state(subtitle_path, embed_model)
+        state = self._incremental
+
+        # Kept apart from state until the new chunks are indexed, so a failure retries the same captions
+        with span('subtitle_parse'):
+            cues, offset = read_new_cues(state['subtitle_path'], state['offset'], final=final)
+            deduper_state = state['deduper']
+            if self.dedupe_captions:
+                deduper = RollingCaptionDeduper.from_dict(deduper_state) if deduper_state else RollingCaptionDeduper()
+                cues = deduper.feed(cues) + (deduper.flush() if final else [])
+                deduper_state = deduper.to_dict()
+        window = [Cue(*cue) for cue in state['carry']] + cues
+        chunks = self._chunk_subtitles(SubtitleTrack.from_cues(window)) if window else []
+        carry = []
+        if not final and chunks:
+            # The last chunk may still grow; keep its cues for the next call
+            held_from = chunks.pop()['start']
+            carry = [list(cue) for cue in window if cue.start >= held_from]
+            window = [cue for cue in window if cue.start < held_from]
+        new_state = {'offset': offset, 'deduper': deduper_state, 'carry': carry}
+        if not chunks:
+            state.update(new_state)
+            self._save_incremental_state()
+            return None, None
+
+        logger.info("Indexing %d new chunks of %s (%.1fs - %.1fs)", len(chunks), self.video_id,
+                    chunks[0]['start'], chunks[-1]['end'])
+        top_k = 2 * self.similarity_top_k if self.retrieval_mode == "hybrid" else self.similarity_top_k
+        if embed_model is not None:
+            embeddings = self._embed(embed_model, [chunk['text'] for chunk in chunks])
+            with span('index_build'):
+                self.corpus.append_chunks(self.video_id, chunks, embeddings, state['fingerprint'])
+            vector_retriever = self.corpus.as_retriever(
+                embed_model, video_ids=[self.video_id], similarity_top_k=top_k, min_start=chunks[0]['start'],
+            )
+            # The corpus' own nodes, so both sides of a hybrid search share node ids and are fused
+            nodes = self.corpus.nodes(self.video_id, min_start=chunks[0]['start'])
+        else:
+            nodes = self._chunk_nodes(chunks)
+        state.update(new_state)
+        self._save_incremental_state()
+
+        if self.retrieval_mode == "bm25":
+            retriever = BM25Retriever(nodes, similarity_top_k=self.similarity_top_k)
+        elif self.retrieval_mode == "hybrid":
+            retriever = HybridRetriever(
+                vector_retriever, BM25Retriever(nodes, similarity_top_k=top_k),
+                alpha=self.hybrid_alpha, similarity_top_k=self.similarity_top_k,
+            )
+        else:
+            retriever = vector_retriever
+
+        track = SubtitleTrack.from_cues(window)
+        self.subtitle_track = track
+        self.snapper = TranscriptSnapper(
+            track.starts, track.ends,
+            [chunk['start'] for chunk in chunks], [chunk['end'] for chunk in chunks],
+        )
+        return track, retriever
+
+    def _detect_audio_highlights(self):
+        """Loudness-peak segments from the video's audio track, or [] when there is no video."""
+        if not self.video_path or not os.path.exists(self.video_path):
+            logger.warning("Video file not available for audio analysis: %s", self.video_path)
+            return []
+        try:
+            from utils.audio_analysis import detect_audio_highlights
+            with span('audio_analysis'):
+                segments = list(detect_audio_highlights(self.video_path))
         except Exception as e:
-            print(f"Error during important segment identification: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Error detecting audio highlights: %s", e)
             return []
+        logger.info("Audio highlights found: %d", len(segments))
+        return segments
 
-    def _chunk_subtitles(self, subtitle_data, max_gap_seconds=5, max_chunk_seconds=60):
-        """Combine nearby subtitles into chunks for better context"""
-        if not subtitle_data:
-            return []
-            
-        chunks = []
-        current_chunk = {
-            'start': subtitle_data[0]['start'],
-            'end': subtitle_data[0]['end'],
-            'text': subtitle_data[0]['text']
-        }
-        
-        for i in range(1, len(subtitle_data)):
-            current_sub = subtitle_data[i]
-            time_gap = current_sub['start'] - current_chunk['end']
-            
-            # If the gap is small and chunk isn't too long, extend current chunk
-            if time_gap <= max_gap_seconds and (current_sub['end'] - current_chunk['start']) <= max_chunk_seconds:
-                current_chunk['end'] = current_sub['end']
-                current_chunk['text'] += " " + current_sub['text']
-            else:
-                # Save current chunk and start a new one
-                chunks.append(current_chunk)
-                current_chunk = {
-                    'start': current_sub['start'],
-                    'end': current_sub['end'],
-                    'text': current_sub['text']
-                }
-        
-        # Add the last chunk
-        chunks.append(current_chunk)
+    def _chunk_subtitles(self, subtitle_data, max_gap_seconds=None):
+        """Pack cues into chunks of at most self.chunk_tokens tokens for embedding.
+
+        subtitle_data is a SubtitleTrack (any iterable of cues is converted to one).
+        """
+        with span('chunk'):
+            chunks = chunk_track_by_tokens(
+                subtitle_data,
+                max_tokens=self.chunk_tokens,
+                overlap_tokens=self.chunk_overlap_tokens,
+                max_gap_seconds=max_gap_seconds,
+            )
+        stats = chunk_stats(chunks)
+        incr('tokens', stats['total_tokens'], kind='chunked')
+        logger.info("Chunk stats: %d chunks, %d tokens (min %d, median %d, max %d per chunk)",
+                    stats['chunks'], stats['total_tokens'], stats['min_tokens'], stats['median_tokens'],
+                    stats['max_tokens'])
         return chunks
 
+    def _validate_segments(self, segments, track):
+        """Clamp segments to the transcript and drop the ones where nothing is said."""
+        valid_segments = []
+        for segment in segments:
+            start = max(0.0, float(segment['start']))
+            end = min(float(segment['end']), track.duration)
+            if end <= start:
+                continue
+            cues = track.cues_between(start, end)
+            if not cues:
+                continue
+            # Snap the segment to the speech it actually covers
+            valid_segments.append({**segment, 'start': max(start, cues[0].start), 'end': min(end, max(cue.end for cue in cues))})
+        return valid_segments
+
     def _deduplicate_segments(self, segments):
-        """Remove duplicate segments based on similar start/end times"""
-        if not segments:
-            return []
-            
-        # Sort by start time
-        sorted_segments = sorted(segments, key=lambda x: x['start'])
-        unique_segments = [sorted_segments[0]]
-        
-        for segment in sorted_segments[1:]:
-            last_segment = unique_segments[-1]
-            # Check if this segment overlaps significantly with the last one
-            if abs(segment['start'] - last_segment['start']) <= 10 and abs(segment['end'] - last_segment['end']) <= 10:
-                # Segments are similar, keep the one with the longer text description
-                if len(segment['text']) > len(last_segment['text']):
-                    unique_segments[-1] = segment
-            else:
-                unique_segments.append(segment)
-                
-        return unique_segments
+        """Merge overlapping segments, keeping which queries produced each one and a score."""
+        return merge_segments(
+            segments,
+            policy=self.merge_policy,
+            iou_threshold=self.merge_iou_threshold,
+            max_length=self.max_segment_seconds,
+        )
 
     def _parse_response_for_time(self, llm_response: str):
+        """Turn every timestamp or range in an LLM answer into a segment grounded in the transcript."""
         segments = []
-        lines = llm_response.split('\n')
-        
-        # Pattern for start-end time ranges (e.g., "from 5:20 to 8:45")
-        time_range_pattern = re.compile(r'(?:at|around|from)\s*((\d+):(\d+)(?::(\d+))?)\s*(?:to|-|and|–|—)\s*((\d+):(\d+)(?::(\d+))?)')
-        
-        # Pattern for single timestamps (e.g., "at 5:20")
-        single_time_pattern = re.compile(r'(?:at|around)\s*((\d+):(\d+)(?::(\d+))?)')
-        
-        # Pattern for minutes and seconds format (e.g., "at 5 minutes 20 seconds")
-        minute_second_pattern = re.compile(r'(?:at|around)\s*(?:the\s*)?((\d+)\s*minute(?:s)?(?:\s*and)?\s*(\d+)\s*second(?:s)?)')
-        
-        # Pattern for minutes only (e.g., "at minute 5")
-        minute_only_pattern = re.compile(r'(?:at|around)\s*(?:the\s*)?(?:minute|mark|time(?:stamp)?)\s*(\d+)')
-        
-        def time_to_seconds(hours, minutes, seconds=0):
-            try:
-                return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
-            except (ValueError, TypeError) as e:
-                print(f"Error converting time to seconds: {e}, hours={hours}, minutes={minutes}, seconds={seconds}")
-                return 0
-
-        for line in lines:
-            # Try the time range pattern first
-            range_match = time_range_pattern.search(line)
-            if range_match:
-                try:
-                    # Extract start time
-                    start_hours = int(range_match.group(2)) if range_match.group(2) else 0
-                    start_minutes = int(range_match.group(3)) if range_match.group(3) else 0
-                    start_seconds = int(range_match.group(4)) if range_match.group(4) else 0
-                    
-                    # Extract end time
-                    end_hours = int(range_match.group(6)) if range_match.group(6) else 0
-                    end_minutes = int(range_match.group(7)) if range_match.group(7) else 0
-                    end_seconds = int(range_match.group(8)) if range_match.group(8) else 0
-                    
-                    # Convert to seconds
-                    start_total = time_to_seconds(start_hours, start_minutes, start_seconds)
-                    end_total = time_to_seconds(end_hours, end_minutes, end_seconds)
-                    
-                    segments.append({'start': start_total, 'end': end_total, 'text': line.strip()})
-                    continue  # Skip to next line
-                except Exception as e:
-                    print(f"Error parsing time range: {e} in line: '{line}'")
-            
-            # Try single time pattern
-            single_match = single_time_pattern.search(line)
-            if single_match:
-                try:
-                    hours = int(single_match.group(2)) if single_match.group(2) else 0
-                    minutes = int(single_match.group(3)) if single_match.group(3) else 0
-                    seconds = int(single_match.group(4)) if single_match.group(4) else 0
-                    
-                    start_time = time_to_seconds(hours, minutes, seconds)
-                    end_time = start_time + 30  # Assume 30 second segment
-                    
-                    segments.append({'start': start_time, 'end': end_time, 'text': line.strip()})
-                    continue
-                except Exception as e:
-                    print(f"Error parsing single time: {e} in line: '{line}'")
-            
-            # Try minute-second pattern
-            ms_match = minute_second_pattern.search(line)
-            if ms_match:
-                try:
-                    minutes = int(ms_match.group(2)) if ms_match.group(2) else 0
-                    seconds = int(ms_match.group(3)) if ms_match.group(3) else 0
-                    
-                    start_time = time_to_seconds(0, minutes, seconds)
-                    end_time = start_time + 30  # Assume 30 second segment
-                    
-                    segments.append({'start': start_time, 'end': end_time, 'text': line.strip()})
-                    continue
-                except Exception as e:
-                    print(f"Error parsing minute-second: {e} in line: '{line}'")
-                    
-            # Try minute-only pattern
-            min_match = minute_only_pattern.search(line)
-            if min_match:
-                try:
-                    minutes = int(min_match.group(1)) if min_match.group(1) else 0
-                    
-                    start_time = time_to_seconds(0, minutes, 0)
-                    end_time = start_time + 60  # Assume 60 second segment
-                    
-                    segments.append({'start': start_time, 'end': end_time, 'text': line.strip()})
-                except Exception as e:
-                    print(f"Error parsing minute-only: {e} in line: '{line}'")
-                    
+        for start, end, line in extract_timestamps(llm_response):
+            if self.snapper is not None:
+                start, end = self.snapper.snap(start, end)
+            elif end is None:
+                end = start + 30  # No transcript to ground against; assume a 30 second segment
+            segments.append({'start': start, 'end': end, 'text': line})
         return segments
 
 # Add test code at the end of the file
 if __name__ == '__main__':
+    from utils.instrumentation import configure_logging
+    configure_logging()
     print('Starting test of VideoAnalyzer')
     # Path to your video file
     video_path = '/app/data/youtube_videos/jnWaUtS2Fr8.webm'
@@ -359,6 +811,8 @@ if __name__ == '__main__':
     # Run the analysis
     print('Running analyzer...')
     segments = analyzer.analyze()
+    if segments is None:
+        raise SystemExit('Analysis failed')
     
     # Print the results
     print(f'Found {len(segments)} important segments')
@@ -1,150 +1,223 @@
 # src/agents/youtube_scraper.py
-from utils.youtube_utils import download_video
-import os
-import yt_dlp
+from utils.youtube_utils import fetch_video, fetch_segments, DEFAULT_SEARCH_LOG
+from utils.download_cache import normalize_video_id
+from utils.search_cache import SearchCache
+from utils import instrumentation
+from utils.instrumentation import span, incr, configure_logging
+import sys
+import argparse
+import contextlib
 import json
-import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
 
 class YouTubeScraper:
-    def __init__(self, output_path="/app/data/youtube_videos", urls_log_file="/app/data/found_urls.json"):
+    def __init__(self, output_path="/app/data/youtube_videos", urls_log_file=DEFAULT_SEARCH_LOG,
+                 search_ttl_seconds=24 * 3600):
         self.output_path = output_path
+        # Append-only log of every search, also used as a cache for repeated queries
         self.urls_log_file = urls_log_file
+        self.search_cache = SearchCache(urls_log_file, ttl_seconds=search_ttl_seconds)
     
-    def process_video(self, query: str, max_results: int = 1):
+    def search(self, query: str, max_results: int = 1) -> list[str]:
+        """Return the URLs of the top max_results videos for query, from the search log when fresh."""
+        cached = self.search_cache.get(query, max_results)
+        if cached is not None:
+            incr('cache_hits', cache='search')
+            logger.info("Usando resultados en caché para la consulta '%s'", query)
+            return cached
+        incr('cache_misses', cache='search')
+
+        import yt_dlp
         ydl_opts_search = {
-            'quiet': False,
+            'quiet': True,
             'extract_flat': True,
             'max_entries': max_results,
         }
+        with span('search'), yt_dlp.YoutubeDL(ydl_opts_search) as ydl:
+            incr('api_calls', service='youtube_search')
+            info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
+        video_urls = [entry['url'] for entry in info.get('entries', []) if entry and 'url' in entry]
+
+        # Escribimos las URLs encontradas en el registro de búsquedas
+        self.search_cache.record(query, max_results, video_urls)
+        logger.info("URLs encontradas para la consulta '%s' guardadas en: %s", query, self.urls_log_file)
+        return video_urls
+
+    def _download(self, video_url: str, query: str, subtitles_only: bool = False):
+        """Download one video with its subtitles and build the pipeline result, or None on failure.
+
+        With subtitles_only=True only captions and metadata are fetched, so video_path is
+        None unless the video was already downloaded earlier.
+        """
+        # Video, subtitles and info JSON come from a single extraction
+        try:
+            result = fetch_video(video_url, output_path=self.output_path, download_media=not subtitles_only)
+        except Exception as e:
+            logger.error("Error downloading video: %s", e)
+            return None
+        if subtitles_only:
+            if not result.subtitle_path:
+                logger.warning("No se pudieron descargar los subtítulos.")
+                return None
+        elif not result.video_path:
+            logger.warning("La descarga del video falló.")
+            return None
+
+        if result.video_path:
+            logger.info("Video descargado a: %s", result.video_path)
+        if result.subtitle_path:
+            logger.info("Subtítulos descargados a: %s", result.subtitle_path)
+        else:
+            logger.warning("No se pudieron descargar los subtítulos.")
+        return {
+            "query": query,
+            "video_url": video_url,
+            "video_path": result.video_path,
+            "subtitle_path": result.subtitle_path,
+            "metadata": {"id": result.video_id, "title": result.title, "duration": result.duration,
+                         "info_path": result.info_path},
+            "key_segments": None
+        }
+
+    def process_video(self, query: str, max_results: int = 1, subtitles_only: bool = False):
         try:
-            with yt_dlp.YoutubeDL(ydl_opts_search) as ydl:
-                info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
-                video_urls = [entry['url'] for entry in info.get('entries', []) if entry and 'url' in entry]
-                
-                # Escribimos las URLs encontradas en un archivo JSON
-                with open(self.urls_log_file, 'w') as f:
-                    json.dump({"query": query, "urls": video_urls}, f, indent=4)
-                print(f"URLs encontradas para la consulta '{query}' guardadas en: {self.urls_log_file}")
-                
-                if video_urls:
-                    first_video_url = video_urls[0]
-                    print(f"Descargando video con URL: {first_video_url}")
-                    
-                    # Handle the return value from download_video based on what it actually returns
+            video_urls = self.search(query, max_results)
+            if not video_urls:
+                logger.warning("No se encontraron videos para la consulta: %s", query)
+                return None
+            logger.info("Descargando video con URL: %s", video_urls[0])
+            return self._download(video_urls[0], query, subtitles_only=subtitles_only)
+        except Exception:
+            logger.exception("Error durante la búsqueda en el agente")
+            return None
+
+    def process_batch(self, queries: list[str], top_n: int = 1, max_search_workers: int = 4,
+                      max_download_workers: int = 4, subtitles_only: bool = False):
+        """Search many queries and download the top_n results of each, yielding results as they finish.
+
+        Searches and downloads run in separate bounded thread pools, so slow
+        downloads never hold back searching. A video found by several queries is
+        downloaded once, for the first query that returned it.
+        """
+        seen_ids = set()
+        pending = {}
+        search_pool = ThreadPoolExecutor(max_workers=max_search_workers, thread_name_prefix="search")
+        download_pool = ThreadPoolExecutor(max_workers=max_download_workers, thread_name_prefix="download")
+        try:
+            for query in dict.fromkeys(queries):
+                pending[search_pool.submit(self.search, query, top_n)] = ("search", query)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, query = pending.pop(future)
                     try:
-                        result = download_video(first_video_url, output_path=self.output_path)
-                        
-                        # Check if the function returns a single path or a tuple
-                        if isinstance(result, tuple):
-                            # If it returns a tuple, unpack it
-                            video_path = result[0]
-                            subtitle_path = result[1] if len(result) > 1 else None
-                        else:
-                            # If it returns a single value, assume it's the video path
-                            video_path = result
-                            subtitle_path = None
+                        value = future.result()
                     except Exception as e:
-                        print(f"Error downloading video: {e}")
-                        video_path = None
-                        subtitle_path = None
-                    
-                    # If no subtitles, try to download them separately
-                    if video_path and not subtitle_path:
-                        try:
-                            subtitle_path = self.download_subtitles(first_video_url)
-                        except Exception as e:
-                            print(f"Error downloading subtitles: {e}")
-                            subtitle_path = None
-                    
-                    if video_path:
-                        print(f"Video descargado a: {video_path}")
-                        if subtitle_path:
-                            print(f"Subtítulos descargados a: {subtitle_path}")
-                        else:
-                            print("No se pudieron descargar los subtítulos.")
-                        
-                        return {
-                            "video_path": video_path,
-                            "subtitle_path": subtitle_path,
-                            "metadata": None,
-                            "key_segments": None
-                        }
-                    else:
-                        print("La descarga del video falló.")
-                        return None
-                else:
-                    print(f"No se encontraron videos para la consulta: {query}")
-                    return None
-        except Exception as e:
-            print(f"Error durante la búsqueda en el agente: {e}")
-            import traceback
-            traceback.print_exc()
+                        logger.error("Error during %s for '%s': %s", kind, query, e)
+                        continue
+
+                    if kind == "download":
+                        if value is not None:
+                            yield value
+                        continue
+
+                    for video_url in value:
+                        video_id = normalize_video_id(video_url) or video_url
+                        if video_id in seen_ids:
+                            continue
+                        seen_ids.add(video_id)
+                        pending[download_pool.submit(self._download, video_url, query, subtitles_only)] = ("download", query)
+        finally:
+            # When the caller stops early, drop the queued work instead of waiting for it
+            search_pool.shutdown(wait=False, cancel_futures=True)
+            download_pool.shutdown(wait=False, cancel_futures=True)
+
+    def analyze_video(self, query: str, export_clips: bool = False, clips_path: str = "/app/data/youtube_clips",
+                      **analyzer_kwargs):
+        """Subtitle-only pipeline: fetch captions and metadata, analyze them, and only then fetch media.
+
+        Media is downloaded only when export_clips is set, and only for the time
+        ranges of the identified segments.
+        """
+        result = self.process_video(query, subtitles_only=True)
+        if result is None:
             return None
+        # Imported here so searching and downloading don't pay for loading LlamaIndex
+        from agents.youtube_analizer import VideoAnalyzer
+        analyzer = VideoAnalyzer(None, subtitle_path=result["subtitle_path"], **analyzer_kwargs)
+        result["key_segments"] = analyzer.analyze()
+        result["clip_paths"] = []
+        if export_clips and result["key_segments"]:
+            try:
+                result["clip_paths"] = fetch_segments(result["video_url"], result["key_segments"], output_path=clips_path)
+            except Exception as e:
+                logger.error("Error downloading clips: %s", e)
+        return result
 
     def download_subtitles(self, video_url, output_path=None):
-        """Download subtitles for a video URL."""
+        """Download only the subtitles (and info JSON) for a video URL."""
         if output_path is None:
             output_path = self.output_path
-            
-        os.makedirs(output_path, exist_ok=True)
-        base_filename = video_url.split('/')[-1].split('?')[0]  # Extract video ID from URL
-        subtitle_output = os.path.join(output_path, f'{base_filename}.en.vtt')
-        
+        import yt_dlp
+
         try:
-            print(f"Attempting to download subtitles for '{video_url}'...")
-            subtitle_command = [
-                'yt-dlp',
-                '--write-sub',
-                '--write-auto-sub',
-                '--sub-lang', 'en',
-                '--sub-format', 'vtt',
-                '-o', os.path.join(output_path, base_filename),  # Base filename without the extension
-                '--skip-download',  # Don't download the video again
-                video_url
-            ]
-            subprocess.run(subtitle_command, check=True)
-            
-            # Check for possible subtitle file names
-            possible_names = [
-                subtitle_output,
-                os.path.join(output_path, f'{base_filename}.en.vtt'),
-                os.path.join(output_path, f'{base_filename}.en-US.vtt'),
-                os.path.join(output_path, f'{base_filename}.vtt')
-            ]
-            
-            for name in possible_names:
-                if os.path.exists(name):
-                    print(f"Subtitles found at: {name}")
-                    return name
-                    
-            print("No subtitle file found.")
+            logger.info("Attempting to download subtitles for '%s'...", video_url)
+            result = fetch_video(video_url, output_path=output_path, download_media=False)
+            if result.subtitle_path:
+                logger.info("Subtitles found at: %s", result.subtitle_path)
+            else:
+                logger.warning("No subtitle file found.")
+            return result.subtitle_path
+        except yt_dlp.utils.DownloadError as e:
+            logger.error("Error downloading subtitles: %s", e)
             return None
-        except subprocess.CalledProcessError as e:
-            print(f"Error downloading subtitles: {e}")
-            return None
-        except Exception as e:
-            print(f"Unexpected error downloading subtitles: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Unexpected error downloading subtitles")
             return None
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search YouTube and download the top results of each query.")
+    parser.add_argument("queries", nargs="*", help="Search queries")
+    parser.add_argument("--queries-file", help="File with one query per line")
+    parser.add_argument("--top-n", type=int, default=1, help="Results to download per query")
+    parser.add_argument("--search-workers", type=int, default=4)
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--output-path", default="/app/data/youtube_videos")
+    parser.add_argument("--subtitles-only", action="store_true", help="Fetch captions and metadata, not media")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (default: $LOG_LEVEL or INFO)")
+    parser.add_argument("--metrics-report", help="Enable metrics and write the run's JSON report to this file")
+    parser.add_argument("--metrics-prometheus", help="Enable metrics and write them in Prometheus text format to this file")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    if args.metrics_report or args.metrics_prometheus:
+        instrumentation.enable()
+
+    queries = list(args.queries)
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            queries.extend(line.strip() for line in f if line.strip())
+    if not queries:
+        parser.error("no queries given")
+
+    scraper = YouTubeScraper(output_path=args.output_path)
+    # One JSON line per downloaded video on stdout as soon as it finishes; progress messages go to stderr
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for result in scraper.process_batch(queries, top_n=args.top_n, max_search_workers=args.search_workers,
+                                            max_download_workers=args.download_workers,
+                                            subtitles_only=args.subtitles_only):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    if args.metrics_report:
+        instrumentation.write_report(args.metrics_report)
+    if args.metrics_prometheus:
+        instrumentation.write_prometheus(args.metrics_prometheus)
+
+
 if __name__ == "__main__":
-    try:
-        print("Starting YouTube scraper...")
-        scraper = YouTubeScraper()
-        test_query = "What is the Einstein relativity about?"  # You can modify this line to search for any topic
-        print(f"Searching for: {test_query}")
-        result = scraper.process_video(test_query)
-        if result:
-            print("\nResultado del procesamiento:")
-            print(f"Ruta del video: {result['video_path']}")
-            print(f"Subtitle path: {result.get('subtitle_path')}")
-            print(f"Metadatos: {result['metadata']}")
-            print(f"Segmentos clave: {result['key_segments']}")
-        else:
-            print("No se obtuvo resultado del procesamiento.")
-    except Exception as e:
-        print(f"Error in main execution: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+    main()
@@ -0,0 +1,264 @@
+# src/benchmarks/analysis_benchmark.py
+"""Throughput and peak memory of every analysis stage on synthetic transcripts.
+
+Transcripts from 10 minutes to 10 hours are generated as VTT and SRT, with
+and without YouTube-style rolling captions, and run through parsing, caption
+deduplication, chunking, index building (BM25, per-video vector index and
+the shared corpus), the concurrent query fan-out, timestamp extraction and
+segment merging. Embeddings and LLM answers come from the deterministic local
+stand-ins in benchmarks/synthetic.py, so no network or API key is needed and
+runs are comparable across machines and commits.
+
+Each stage reports its best time over --repeat runs and the peak Python
+memory (tracemalloc) of one more run. Results are checked against THRESHOLDS
+(minimum throughput, maximum peak memory per item) and, with --baseline,
+against an earlier results file; any failure exits non-zero, so it can gate CI:
+
+    cd src && python benchmarks/analysis_benchmark.py --output benchmark.json
+    cd src && python benchmarks/analysis_benchmark.py --durations 10min 1h --baseline benchmark.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from benchmarks.synthetic import HashEmbedding, ScriptedLLM, write_transcript  # noqa: E402
+from utils.rolling_captions import dedupe_rolling_cues  # noqa: E402
+from utils.segment_merger import merge_segments  # noqa: E402
+from utils.subtitle_chunker import approximate_token_count, chunk_track_by_tokens, get_token_counter  # noqa: E402
+from utils.subtitle_parser import iter_cues  # noqa: E402
+from utils.subtitle_track import SubtitleTrack  # noqa: E402
+from utils.timestamp_extractor import TranscriptSnapper, extract_timestamps  # noqa: E402
+
+DURATIONS = {'10min': 600, '1h': 3600, '10h': 36000}
+
+# stage -> minimum throughput and maximum peak memory per item (cue, chunk, query, ...).
+# Floors are several times below a laptop's numbers so only real regressions trip them;
+# --budget-scale loosens them further on slow machines.
+THRESHOLDS = {
+    'parse': {'unit': 'cues/s', 'min_throughput': 20_000, 'max_peak_bytes_per_item': 2_000},
+    'caption_dedup': {'unit': 'cues/s', 'min_throughput': 20_000, 'max_peak_bytes_per_item': 1_000},
+    'chunk': {'unit': 'tokens/s', 'min_throughput': 300_000, 'max_peak_bytes_per_item': 50},
+    'index_bm25': {'unit': 'chunks/s', 'min_throughput': 1_000, 'max_peak_bytes_per_item': 50_000},
+    'index_vector': {'unit': 'chunks/s', 'min_throughput': 200, 'max_peak_bytes_per_item': 100_000},
+    'index_corpus': {'unit': 'chunks/s', 'min_throughput': 200, 'max_peak_bytes_per_item': 100_000},
+    'query_fanout': {'unit': 'queries/s', 'min_throughput': 20, 'max_peak_bytes_per_item': 250_000},
+    'timestamp_extraction': {'unit': 'timestamps/s', 'min_throughput': 8_000, 'max_peak_bytes_per_item': 50},
+    'segment_merge': {'unit': 'segments/s', 'min_throughput': 4_000, 'max_peak_bytes_per_item': 500},
+}
+
+QUERIES = [
+    f"Where does the speaker explain {topic}?"
+    for topic in ("database indexes", "memory allocation", "network latency", "the compiler parser",
+                  "thread locks", "gradient descent", "docker images", "encryption handshakes")
+] * 2
+
+
+def _measure(fn, repeat):
+    """fn()'s result, its best wall time over repeat runs, and the peak traced memory of one more run."""
+    # One untimed run first, so lazy imports and first-use setup are not counted as stage time
+    fn()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def _result(stage, transcript, items, seconds, peak):
+    return {
+        'stage': stage,
+        'transcript': transcript,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'throughput': round(items / seconds, 1) if seconds else None,
+        'unit': THRESHOLDS[stage]['unit'],
+        'peak_bytes': peak,
+    }
+
+
+def bench_transcript(path, name, repeat):
+    """Parse, deduplicate and chunk one transcript file."""
+    count_tokens = get_token_counter()
+    cues, seconds, peak = _measure(lambda: list(iter_cues(path)), repeat)
+    results = [_result('parse', name, len(cues), seconds, peak)]
+    deduped, seconds, peak = _measure(lambda: list(dedupe_rolling_cues(cues)), repeat)
+    results.append(_result('caption_dedup', name, len(cues), seconds, peak))
+    track = SubtitleTrack.from_cues(deduped)
+    chunks, seconds, peak = _measure(lambda: chunk_track_by_tokens(track, count_tokens=count_tokens), repeat)
+    results.append(_result('chunk', name, sum(chunk['tokens'] for chunk in chunks), seconds, peak))
+    return results, track
+
+
+def bench_index_and_queries(path, name, track, work_dir, repeat, llm_latency):
+    """Build each kind of index over the transcript's chunks, then run the query fan-out."""
+    from llama_index.core import VectorStoreIndex
+    from agents.youtube_analizer import VideoAnalyzer
+    from utils.bm25 import BM25Index
+    from utils.corpus_index import CorpusIndex
+
+    analyzer = VideoAnalyzer(None, subtitle_path=path, output_path=tempfile.mkdtemp(dir=work_dir), corpus_dir=None,
+                             embedding_cache_dir=None, embed_model=HashEmbedding(), queries=QUERIES,
+                             max_concurrent_queries=4, llm=ScriptedLLM(latency=llm_latency))
+    chunks = analyzer._chunk_subtitles(track)
+    embed_model = HashEmbedding()
+
+    def build_corpus():
+        # A fresh directory each run, so the video is really inserted rather than found unchanged
+        corpus = CorpusIndex(tempfile.mkdtemp(dir=work_dir), embed_model.model_name)
+        corpus.add_video('video', chunks, embed_model.get_text_embedding_batch([chunk['text'] for chunk in chunks]))
+
+    results = []
+    for stage, build in (
+        ('index_bm25', lambda: BM25Index([chunk['text'] for chunk in chunks])),
+        ('index_vector', lambda: VectorStoreIndex(analyzer._chunk_nodes(chunks), embed_model=embed_model)),
+        ('index_corpus', build_corpus),
+    ):
+        _, seconds, peak = _measure(build, repeat)
+        results.append(_result(stage, name, len(chunks), seconds, peak))
+
+    _, retriever = analyzer._prepare_index()
+    _, seconds, peak = _measure(lambda: asyncio.run(analyzer._extract_segments(retriever)), repeat)
+    results.append(_result('query_fanout', name, len(QUERIES), seconds, peak))
+    return results
+
+
+def bench_timestamps(track, name, repeat, answers=200):
+    """Parse and snap the timestamps of a batch of scripted LLM answers about this transcript."""
+    llm = ScriptedLLM(max_segments=10)
+    step = max(track.duration / (answers * 10), 1.0)
+    prompts = [
+        '\n\n'.join(f"start: {t:.1f}\nend: {t + 30:.1f}" for t in (step * (10 * i + j) for j in range(10)))
+        for i in range(answers)
+    ]
+    responses = [llm._answer(prompt) for prompt in prompts]
+    snapper = TranscriptSnapper(track.starts, track.ends, track.starts, track.ends)
+
+    def extract():
+        found = 0
+        for response in responses:
+            for start, end, _ in extract_timestamps(response):
+                snapper.snap(start, end)
+                found += 1
+        return found
+
+    found, seconds, peak = _measure(extract, repeat)
+    return [_result('timestamp_extraction', name, found, seconds, peak)]
+
+
+def bench_segment_merge(track, name, repeat, count=5000):
+    """Merge many overlapping segments from several queries, as after a large fan-out."""
+    duration = track.duration
+    segments = [
+        {'start': (i * 7.3) % duration, 'end': (i * 7.3) % duration + 20 + i % 40,
+         'text': f"segment {i}", 'query': QUERIES[i % len(QUERIES)]}
+        for i in range(count)
+    ]
+    _, seconds, peak = _measure(lambda: merge_segments(segments), repeat)
+    return [_result('segment_merge', name, count, seconds, peak)]
+
+
+def run(durations=tuple(DURATIONS), repeat=3, llm_latency=0.02, work_dir=None):
+    work_dir = tempfile.mkdtemp(prefix='analysis-benchmark-', dir=work_dir)
+    results = []
+    try:
+        for label in durations:
+            for fmt in ('vtt', 'srt'):
+                for rolling in (False, True):
+                    name = f"{label}-{fmt}{'-rolling' if rolling else ''}"
+                    path = os.path.join(work_dir, f"{name}.{fmt}")
+                    write_transcript(path, DURATIONS[label], fmt=fmt, rolling=rolling)
+                    transcript_results, track = bench_transcript(path, name, repeat)
+                    results.extend(transcript_results)
+                    if fmt == 'vtt' and rolling:
+                        # The later stages see the same deduplicated text whatever the file looked like
+                        results.extend(bench_index_and_queries(path, name, track, work_dir, repeat, llm_latency))
+                        results.extend(bench_timestamps(track, name, repeat))
+                        results.extend(bench_segment_merge(track, name, repeat))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def check(results, budget_scale=1.0, baseline=None, max_regression=0.25):
+    """Failure messages for results below THRESHOLDS or more than max_regression worse than baseline."""
+    failures = []
+    previous = {(r['stage'], r['transcript']): r for r in (baseline or {}).get('results', [])}
+    for result in results:
+        key = f"{result['stage']} on {result['transcript']}"
+        threshold = THRESHOLDS[result['stage']]
+        minimum = threshold['min_throughput'] / budget_scale
+        if result['throughput'] is not None and result['throughput'] < minimum:
+            failures.append(f"{key}: {result['throughput']:.0f} {result['unit']} is below {minimum:.0f}")
+        per_item = result['peak_bytes'] / max(result['items'], 1)
+        if per_item > threshold['max_peak_bytes_per_item'] * budget_scale:
+            failures.append(f"{key}: peak memory {per_item:.0f} bytes per item is above "
+                            f"{threshold['max_peak_bytes_per_item'] * budget_scale:.0f}")
+        before = previous.get((result['stage'], result['transcript']))
+        if before is None:
+            continue
+        if before['throughput'] and result['throughput'] is not None \
+                and result['throughput'] < before['throughput'] * (1 - max_regression):
+            failures.append(f"{key}: {result['throughput']:.0f} {result['unit']}, "
+                            f"baseline {before['throughput']:.0f}")
+        if result['peak_bytes'] > before['peak_bytes'] * (1 + max_regression):
+            failures.append(f"{key}: peak memory {result['peak_bytes']} bytes, baseline {before['peak_bytes']}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis stages on synthetic transcripts.")
+    parser.add_argument('--durations', nargs='+', choices=list(DURATIONS), default=list(DURATIONS))
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the best one counts")
+    parser.add_argument('--llm-latency', type=float, default=0.02, help="Seconds the scripted LLM takes per call")
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help="Divide the throughput floors and multiply the memory ceilings, e.g. 2 on slow CI machines")
+    parser.add_argument('--baseline', help="Earlier --output file to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="Allowed slowdown or memory growth against the baseline (0.25 = 25%%)")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    results = run(durations=args.durations, repeat=args.repeat, llm_latency=args.llm_latency)
+    failures = check(results, budget_scale=args.budget_scale, baseline=baseline, max_regression=args.max_regression)
+
+    for result in results:
+        print(f"{result['stage']:<21} {result['transcript']:<18} {result['items']:>8} items "
+              f"{result['throughput']:>12,.0f} {result['unit']:<13} peak {result['peak_bytes'] / 2**20:7.1f} MiB")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'tokenizer': 'approximate' if get_token_counter() is approximate_token_count else 'tiktoken',
+                'llm_latency': args.llm_latency,
+                'results': results,
+                'failures': failures,
+            }, f, indent=4)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
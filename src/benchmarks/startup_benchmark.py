@@ -0,0 +1,100 @@
+# src/benchmarks/startup_benchmark.py
+"""Import-time budget for every entry point.
+
+Each module is imported in a fresh interpreter (so nothing is already cached in
+sys.modules) several times; the median import time must stay within its budget,
+and none of the modules that entry point is supposed to load lazily may be
+imported. Exits non-zero when any check fails, so it can gate CI:
+
+    cd src && python benchmarks/startup_benchmark.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> (budget in seconds, modules that must not be loaded by importing it)
+ENTRY_POINTS = {
+    'agents.youtube_analizer': (0.5, ['llama_index', 'numpy', 'ffmpeg', 'yt_dlp']),
+    'agents.youtube_scraper': (0.5, ['llama_index', 'yt_dlp']),
+    'youtube_tools': (0.5, ['llama_index', 'yt_dlp']),
+    'youtube_agent': (0.5, ['llama_index', 'yt_dlp']),
+    'starter': (0.3, ['llama_index']),
+    'pipeline': (0.5, ['llama_index', 'yt_dlp']),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted({{name.split('.')[0] for name in sys.modules}})}}))
+"""
+
+
+def measure(module: str, repeat: int = 5) -> dict:
+    """Median import time of module over repeat fresh interpreters, and the top-level packages it loaded."""
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module)],
+            cwd=SRC_DIR, capture_output=True, text=True, check=True,
+        )
+        # The module may print while importing; the probe's result is the last line
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(result['seconds'])
+        loaded = result['modules']
+    return {'module': module, 'median_seconds': statistics.median(timings), 'loaded': loaded}
+
+
+def run(entry_points=ENTRY_POINTS, repeat: int = 5, budget_scale: float = 1.0) -> list[dict]:
+    results = []
+    for module, (budget, forbidden) in entry_points.items():
+        try:
+            measurement = measure(module, repeat=repeat)
+        except subprocess.CalledProcessError as e:
+            results.append({'module': module, 'ok': False, 'error': e.stderr.strip().splitlines()[-1:]})
+            continue
+        eager = [name for name in forbidden if name in measurement['loaded']]
+        budget *= budget_scale
+        results.append({
+            'module': module,
+            'median_seconds': round(measurement['median_seconds'], 4),
+            'budget_seconds': budget,
+            'eager_imports': eager,
+            'ok': measurement['median_seconds'] <= budget and not eager,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of every entry point against its budget.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help="Multiply every budget, e.g. 2 on slow CI machines")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat, budget_scale=args.budget_scale)
+    for result in results:
+        status = 'ok  ' if result['ok'] else 'FAIL'
+        if 'error' in result:
+            print(f"{status} {result['module']}: import failed: {result['error']}")
+            continue
+        line = f"{status} {result['module']}: {result['median_seconds']:.3f}s (budget {result['budget_seconds']:.3f}s)"
+        if result['eager_imports']:
+            line += f", imports {', '.join(result['eager_imports'])} eagerly"
+        print(line)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# src/benchmarks/synthetic.py
+"""Deterministic stand-ins for the benchmark: generated transcripts, a local
+embedding model and a scripted LLM. Nothing here touches the network, and the
+same arguments always produce the same files, vectors and answers.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import zlib
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from utils.bm25 import tokenize
+
+# Topic words are drawn in runs, so neighbouring cues are about the same thing and retrieval has something to find
+_TOPICS = [
+    "database index query planner btree scan",
+    "memory allocator heap fragmentation cache",
+    "network socket latency packet congestion",
+    "compiler parser syntax tree optimization",
+    "thread lock mutex deadlock scheduler",
+    "gradient descent learning rate model loss",
+    "docker container image layer registry",
+    "encryption key certificate handshake cipher",
+]
+_FILLER = ("so we take the this and then you can see here what is going on with a very simple "
+           "example now let me show how it works in practice because it matters when you run it").split()
+
+
+def _clock(seconds, srt=False):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    text = f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+    return text.replace('.', ',') if srt else text
+
+
+def _lines(duration_seconds, seed, cue_seconds):
+    """(start, end, line) for every spoken line of a transcript of duration_seconds."""
+    rng = random.Random(seed)
+    t = 0.0
+    topic = rng.choice(_TOPICS).split()
+    while t < duration_seconds:
+        if rng.random() < 0.05:
+            topic = rng.choice(_TOPICS).split()
+        length = cue_seconds * rng.uniform(0.6, 1.4)
+        words = [rng.choice(topic) if rng.random() < 0.3 else rng.choice(_FILLER) for _ in range(rng.randint(6, 12))]
+        yield t, min(t + length, duration_seconds), ' '.join(words)
+        # Occasional pauses, so gaps in the transcript exist as they do in real ones
+        t += length + (rng.uniform(1, 4) if rng.random() < 0.03 else 0.0)
+
+
+def write_transcript(path, duration_seconds, fmt='vtt', rolling=False, seed=0, cue_seconds=3.0):
+    """Write a synthetic .vtt or .srt transcript; returns the number of cues written.
+
+    rolling=True mimics YouTube's automatic captions: every line is shown
+    twice, first under the previous line with inline word timings, then on
+    its own in a 10 ms cue, which is what dedupe_rolling_cues() undoes.
+    """
+    if fmt not in ('vtt', 'srt'):
+        raise ValueError(f"Unknown subtitle format: {fmt}")
+    srt = fmt == 'srt'
+    cues = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        if not srt:
+            f.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        previous = ''
+        for start, end, line in _lines(duration_seconds, seed, cue_seconds):
+            if rolling:
+                words = line.split()
+                step = (end - start) / len(words)
+                timed = words[0] + ''.join(
+                    f"<{_clock(start + i * step)}><c> {word}</c>" for i, word in enumerate(words[1:], 1)
+                )
+                blocks = [(start, end - 0.01, f"{previous}\n{timed}" if previous else timed),
+                          (end - 0.01, end, line)]
+                previous = line
+            else:
+                blocks = [(start, end, line)]
+            for block_start, block_end, text in blocks:
+                cues += 1
+                if srt:
+                    f.write(f"{cues}\n")
+                f.write(f"{_clock(block_start, srt)} --> {_clock(block_end, srt)}\n{text}\n\n")
+    return cues
+
+
+class HashEmbedding(BaseEmbedding):
+    """Feature-hashed bag of words: a deterministic local embedding where shared words mean similar vectors."""
+
+    dim: int = 256
+
+    def __init__(self, dim: int = 256, **kwargs):
+        super().__init__(model_name=f"hash-{dim}", dim=dim, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _vector(self, text):
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            h = zlib.crc32(token.encode('utf-8'))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _get_text_embedding(self, text):
+        return self._vector(text)
+
+    def _get_query_embedding(self, query):
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query):
+        return self._vector(query)
+
+
+# Chunk times as they appear in the two kinds of prompts VideoAnalyzer sends
+_CONTEXT_TIMES = re.compile(r'start: ([\d.]+)\s*\nend: ([\d.]+)')
+_EXCERPT_TIMES = re.compile(r'\[([\d.]+)s - ([\d.]+)s\]')
+
+
+class ScriptedLLM(CustomLLM):
+    """Answers from the chunk times in the prompt, after latency seconds, like a model that read the excerpts.
+
+    Structured extraction prompts get the JSON they ask for; any other prompt
+    gets one "From MM:SS to MM:SS: ..." line per excerpt, so the timestamp
+    parser has real work to do.
+    """
+
+    latency: float = 0.0
+    max_segments: int = 5
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="scripted")
+
+    def _answer(self, prompt):
+        times = [(float(start), float(end)) for start, end in
+                 _CONTEXT_TIMES.findall(prompt) or _EXCERPT_TIMES.findall(prompt)][:self.max_segments]
+        if '"segments"' in prompt:
+            return json.dumps({'segments': [
+                {'category': 'topic', 'start': start, 'end': end, 'reason': 'explains a key concept'}
+                for start, end in times
+            ]})
+        return '\n'.join(
+            f"- From {int(start // 60):02d}:{start % 60:04.1f} to {int(end // 60):02d}:{end % 60:04.1f}: "
+            f"the speaker explains a key concept"
+            for start, end in times
+        )
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        # Waits without blocking the event loop, like a real API call
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        yield self.complete(prompt, formatted=formatted, **kwargs)
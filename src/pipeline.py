@@ -0,0 +1,320 @@
+# src/pipeline.py
+import argparse
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from agents.youtube_scraper import YouTubeScraper
+from utils import instrumentation
+from utils.download_cache import normalize_video_id
+
+STAGES = ('research', 'search', 'download', 'index', 'analyze')
+DEFAULT_CONCURRENCY = {'research': 2, 'search': 4, 'download': 4, 'index': os.cpu_count() or 2, 'analyze': 2}
+
+# Tells a stage's workers that nothing more is coming
+_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineCheckpoint:
+    """Append-only JSONL record of every stage an item has completed, with its result.
+
+    Lines are appended under an exclusive file lock, so a crash loses at most the
+    stage that was running; on restart each stage returns the recorded result
+    instead of doing the work again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._results = {}  # (key, stage) -> result
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Half-written last line from a crash
+                        continue
+                    self._results[(record['key'], record['stage'])] = record['result']
+
+    def get(self, key: str, stage: str):
+        return self._results.get((key, stage))
+
+    def done(self, key: str, stage: str) -> bool:
+        return (key, stage) in self._results
+
+    def record(self, key: str, stage: str, result):
+        line = json.dumps({'key': key, 'stage': stage, 'result': result}, ensure_ascii=False) + '\n'
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.write(line)
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            self._results[(key, stage)] = result
+
+
+def _index_video(video_path, subtitle_path, analyzer_kwargs, log_level=logging.WARNING, metrics=False):
+    """Process-pool job: parse, chunk and embed one video's subtitles into its persisted index or the corpus.
+
+    Returns (prepared subtitles or None, metrics snapshot or None); the parent
+    hands the prepared subtitles to the analysis so it doesn't parse and chunk
+    them again. Spawned workers start with logging and metrics unconfigured, so
+    the parent passes its settings along.
+    """
+    if not logging.getLogger().handlers:
+        instrumentation.configure_logging(logging.getLevelName(log_level))
+    instrumentation.enable(metrics)
+    instrumentation.reset()
+    # Worker processes share the parent's stdout, which may carry JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        from agents.youtube_analizer import VideoAnalyzer
+        analyzer = VideoAnalyzer(video_path, subtitle_path=subtitle_path, **analyzer_kwargs)
+        prepared = analyzer._prepare_subtitles()
+        if prepared is not None and analyzer.retrieval_mode == "bm25":
+            # Nothing is persisted; the in-memory BM25 index is built from these chunks during analysis
+            analyzer._prepared_chunks(prepared)
+        elif prepared is not None:
+            try:
+                analyzer.load_index(prepared)
+            except Exception as e:
+                # Some client exceptions can't be unpickled in the parent, which would break the whole pool
+                raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return prepared, instrumentation.snapshot() if metrics else None
+
+
+class PipelineRunner:
+    """Runs queries through research -> search -> download -> index -> analyze.
+
+    Stages are connected by bounded asyncio queues, so a slow stage makes the
+    ones before it wait instead of piling up work (backpressure). Each stage
+    runs concurrency[stage] workers: network stages run in threads, indexing
+    (subtitle parsing, chunking, embedding) runs in a process pool, and the
+    LLM analysis runs on the event loop. Every completed stage is checkpointed,
+    so running the same batch again after a crash resumes where it stopped;
+    failed stages are not recorded and run again.
+
+    identify_problem is an optional callable (such as ResearchAgent().identify_problem)
+    turning a query into {'concepts', 'difficulty'}; without it the query is
+    searched as is. analyzer_kwargs go to every VideoAnalyzer and must be
+    picklable, since indexing happens in other processes.
+    """
+
+    def __init__(self, scraper: YouTubeScraper | None = None, checkpoint_path: str = "/app/data/pipeline_checkpoint.jsonl",
+                 identify_problem=None, top_n: int = 1, subtitles_only: bool = True,
+                 concurrency: dict | None = None, queue_size: int = 8, analyzer_kwargs: dict | None = None):
+        self.scraper = scraper or YouTubeScraper()
+        self.checkpoint = PipelineCheckpoint(checkpoint_path)
+        self.identify_problem = identify_problem
+        self.top_n = top_n
+        self.subtitles_only = subtitles_only
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.queue_size = queue_size
+        self.analyzer_kwargs = analyzer_kwargs or {}
+        self.stats = {stage: {'done': 0, 'resumed': 0, 'failed': 0} for stage in STAGES}
+        self._seen_videos = set()
+        # video_id -> subtitles prepared by the index worker, kept out of the items since main() prints them
+        self._prepared = {}
+        self._process_pool = None
+
+    async def _checkpointed(self, key, stage, work):
+        """Return the recorded result of stage for key, or await work() and record it."""
+        if self.checkpoint.done(key, stage):
+            self.stats[stage]['resumed'] += 1
+            return self.checkpoint.get(key, stage)
+        result = await work()
+        if result is None:
+            # The stage failed (e.g. a download or the analysis); leave it to be retried on the next run
+            self.stats[stage]['failed'] += 1
+            logger.warning("Pipeline stage %s failed for %s, not checkpointed", stage, key)
+            return None
+        self.checkpoint.record(key, stage, result)
+        self.stats[stage]['done'] += 1
+        return result
+
+    async def _research(self, item):
+        if self.identify_problem is None:
+            return [{**item, 'search_query': item['query']}]
+
+        async def work():
+            problem = await asyncio.to_thread(self.identify_problem, item['query'])
+            # Same query shape as YoutubeAgent.search
+            return f"{problem['concepts']} {problem['difficulty']} tutorial"
+
+        return [{**item, 'search_query': await self._checkpointed(f"q:{item['query']}", 'research', work)}]
+
+    async def _search(self, item):
+        async def work():
+            return await asyncio.to_thread(self.scraper.search, item['search_query'], self.top_n)
+
+        urls = await self._checkpointed(f"q:{item['query']}", 'search', work)
+        items = []
+        for video_url in urls:
+            video_id = normalize_video_id(video_url) or video_url
+            # A video found by several queries goes through the pipeline once
+            if video_id in self._seen_videos:
+                continue
+            self._seen_videos.add(video_id)
+            items.append({**item, 'video_url': video_url, 'video_id': video_id})
+        return items
+
+    async def _download(self, item):
+        async def work():
+            return await asyncio.to_thread(self.scraper._download, item['video_url'], item['query'], self.subtitles_only)
+
+        result = await self._checkpointed(f"v:{item['video_id']}", 'download', work)
+        if result is None or not (result['subtitle_path'] or result['video_path']):
+            return []
+        return [{**item, **result}]
+
+    async def _index(self, item):
+        async def work():
+            loop = asyncio.get_running_loop()
+            prepared, metrics = await loop.run_in_executor(
+                self._process_pool, _index_video, item['video_path'], item['subtitle_path'], self.analyzer_kwargs,
+                logging.getLogger().getEffectiveLevel(), instrumentation.enabled(),
+            )
+            if metrics is not None:
+                instrumentation.merge(metrics)
+            if prepared is None:
+                return None
+            self._prepared[item['video_id']] = prepared
+            return True
+
+        indexed = await self._checkpointed(f"v:{item['video_id']}", 'index', work)
+        # Videos without subtitles can still be analyzed from their audio
+        return [item] if indexed or item['video_path'] else []
+
+    async def _analyze(self, item):
+        # Not there when the index stage was resumed from the checkpoint; the analyzer then prepares from scratch
+        prepared = self._prepared.pop(item['video_id'], None)
+
+        async def work():
+            from agents.youtube_analizer import VideoAnalyzer
+            analyzer = VideoAnalyzer(item['video_path'], subtitle_path=item['subtitle_path'], **self.analyzer_kwargs)
+            return await analyzer.aanalyze(prepared=prepared)
+
+        segments = await self._checkpointed(f"v:{item['video_id']}", 'analyze', work)
+        if segments is None:
+            return []
+        return [{**item, 'key_segments': segments}]
+
+    async def _run_stage(self, stage, handler, inbox, outbox, next_workers):
+        async def worker():
+            while (item := await inbox.get()) is not _DONE:
+                try:
+                    with instrumentation.span(f"pipeline_{stage}"):
+                        outputs = await handler(item)
+                except Exception as e:
+                    self.stats[stage]['failed'] += 1
+                    logger.error("Pipeline stage %s failed for %s: %s", stage, item.get('video_id') or item['query'], e)
+                    continue
+                for output in outputs:
+                    # Blocks while the next stage is saturated
+                    await outbox.put(output)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency[stage])))
+        for _ in range(next_workers):
+            await outbox.put(_DONE)
+
+    async def run(self, queries):
+        """Push queries through every stage, yielding each analyzed video as soon as it is done."""
+        handlers = [self._research, self._search, self._download, self._index, self._analyze]
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in STAGES]
+        results = asyncio.Queue()
+        # Spawned workers don't inherit the event loop's threads and locks like forked ones would
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=self.concurrency['index'], mp_context=multiprocessing.get_context('spawn'),
+        )
+
+        async def feed():
+            for query in dict.fromkeys(queries):
+                await queues[0].put({'query': query})
+            for _ in range(self.concurrency[STAGES[0]]):
+                await queues[0].put(_DONE)
+
+        tasks = [asyncio.create_task(feed())]
+        for i, (stage, handler) in enumerate(zip(STAGES, handlers)):
+            last = i == len(STAGES) - 1
+            tasks.append(asyncio.create_task(self._run_stage(
+                stage, handler, queues[i], results if last else queues[i + 1],
+                1 if last else self.concurrency[STAGES[i + 1]],
+            )))
+        try:
+            while (result := await results.get()) is not _DONE:
+                yield result
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            logger.info("Pipeline stats: %s", self.stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search, download, index and analyze videos for many queries.")
+    parser.add_argument("queries", nargs="*", help="Search queries")
+    parser.add_argument("--queries-file", help="File with one query per line")
+    parser.add_argument("--top-n", type=int, default=1, help="Videos per query")
+    parser.add_argument("--output-path", default="/app/data/youtube_videos")
+    parser.add_argument("--checkpoint", default="/app/data/pipeline_checkpoint.jsonl",
+                        help="Progress file; rerun with the same file to resume")
+    parser.add_argument("--with-media", action="store_true", help="Download media, not only captions and metadata")
+    parser.add_argument("--queue-size", type=int, default=8)
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-workers", type=int, default=DEFAULT_CONCURRENCY[stage])
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (default: $LOG_LEVEL or INFO)")
+    parser.add_argument("--metrics-report", help="Enable metrics and write the run's JSON report to this file")
+    parser.add_argument("--metrics-prometheus", help="Enable metrics and write them in Prometheus text format to this file")
+    args = parser.parse_args(argv)
+    instrumentation.configure_logging(args.log_level)
+    if args.metrics_report or args.metrics_prometheus:
+        instrumentation.enable()
+
+    queries = list(args.queries)
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            queries.extend(line.strip() for line in f if line.strip())
+    if not queries:
+        parser.error("no queries given")
+
+    runner = PipelineRunner(
+        scraper=YouTubeScraper(output_path=args.output_path),
+        checkpoint_path=args.checkpoint,
+        top_n=args.top_n,
+        subtitles_only=not args.with_media,
+        concurrency={stage: getattr(args, f"{stage}_workers") for stage in STAGES},
+        queue_size=args.queue_size,
+    )
+
+    async def run():
+        # One JSON line per analyzed video on stdout; progress messages go to stderr
+        out = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            async for result in runner.run(queries):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+
+    asyncio.run(run())
+    if args.metrics_report:
+        instrumentation.write_report(args.metrics_report)
+    if args.metrics_prometheus:
+        instrumentation.write_prometheus(args.metrics_prometheus)
+
+
+if __name__ == "__main__":
+    main()
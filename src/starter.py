@@ -1,13 +1,59 @@
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
-from llama_index.core.agent.workflow import FunctionAgent
-from llama_index.llms.openai import OpenAI
 import asyncio
 import os
 
-# Create a RAG tool using LlamaIndex
-documents = SimpleDirectoryReader("data").load_data()
-index = VectorStoreIndex.from_documents(documents)
-query_engine = index.as_query_engine()
+DATA_DIR = "data"
+# Embedding the data directory is the slow part, so the index is persisted and reused
+PERSIST_DIR = "storage"
+# Shared index of every video VideoAnalyzer has processed
+VIDEO_CORPUS_DIR = "/app/data/video_analysis/corpus"
+
+_query_engine = None
+_video_query_engine = None
+
+
+def _index_is_fresh():
+    """True when a persisted index exists and no file in DATA_DIR is newer than it."""
+    docstore = os.path.join(PERSIST_DIR, "docstore.json")
+    if not os.path.exists(docstore):
+        return False
+    built_at = os.path.getmtime(docstore)
+    for root, _, files in os.walk(DATA_DIR):
+        if any(os.path.getmtime(os.path.join(root, name)) > built_at for name in files):
+            return False
+    return True
+
+
+def get_query_engine():
+    """Load the document index from PERSIST_DIR, or build it from DATA_DIR on first use."""
+    global _query_engine
+    if _query_engine is None:
+        from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext, load_index_from_storage
+
+        if _index_is_fresh():
+            index = load_index_from_storage(StorageContext.from_defaults(persist_dir=PERSIST_DIR))
+        else:
+            # Create a RAG tool using LlamaIndex
+            documents = SimpleDirectoryReader(DATA_DIR).load_data()
+            index = VectorStoreIndex.from_documents(documents)
+            index.storage_context.persist(persist_dir=PERSIST_DIR)
+        _query_engine = index.as_query_engine()
+    return _query_engine
+
+
+def get_video_query_engine():
+    """Query engine over the whole video corpus; None until a video has been analyzed."""
+    global _video_query_engine
+    if _video_query_engine is None:
+        if not os.path.exists(os.path.join(VIDEO_CORPUS_DIR, "manifest.json")):
+            return None
+        from llama_index.core.query_engine import RetrieverQueryEngine
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from utils.corpus_index import CorpusIndex
+
+        embed_model = OpenAIEmbedding()
+        corpus = CorpusIndex(VIDEO_CORPUS_DIR, embed_model.model_name)
+        _video_query_engine = RetrieverQueryEngine.from_args(corpus.as_retriever(embed_model))
+    return _video_query_engine
 
 
 def multiply(a: float, b: float) -> float:
@@ -17,22 +63,35 @@ def multiply(a: float, b: float) -> float:
 
 async def search_documents(query: str) -> str:
     """Useful for answering natural language questions about how to write an essay"""
+    response = await get_query_engine().aquery(query)
+    return str(response)
+
+
+async def search_video_library(query: str) -> str:
+    """Useful for answering questions from the transcripts of every analyzed video, with timestamps"""
+    query_engine = get_video_query_engine()
+    if query_engine is None:
+        return "No videos have been analyzed yet."
     response = await query_engine.aquery(query)
     return str(response)
 
 
-# Create an enhanced workflow with both tools
-agent = FunctionAgent(
-    tools=[multiply, search_documents],
-    llm=OpenAI(model="gpt-4o-mini"),
-    system_prompt="""You are a helpful assistant that can perform calculations
+def build_agent():
+    """Create an enhanced workflow with both tools."""
+    from llama_index.core.agent.workflow import FunctionAgent
+    from llama_index.llms.openai import OpenAI
+
+    return FunctionAgent(
+        tools=[multiply, search_documents, search_video_library],
+        llm=OpenAI(model="gpt-4o-mini"),
+        system_prompt="""You are a helpful assistant that can perform calculations
     and search through documents to answer questions.""",
-)
+    )
 
 
 # Now we can ask questions about the documents or do calculations
 async def main():
-    response = await agent.run(
+    response = await build_agent().run(
         "What are the advices on the documents about writting essays, what's 7 * 8?"
     )
     print(response)
@@ -40,4 +99,4 @@ async def main():
 
 # Run the agent
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+import shutil
+import subprocess
+
+import pytest
+
+from utils.audio_analysis import detect_audio_highlights, iter_audio_windows
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="needs ffmpeg")
+
+TONE = "sin(2*PI*440*t)"
+
+
+def make_audio(path, expression, duration=15):
+    """Render an aevalsrc expression of t to a mono WAV file."""
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+                    f"aevalsrc='{expression}':s=16000:d={duration}", str(path)], check=True)
+    return str(path)
+
+
+def test_windows_measure_loudness(tmp_path):
+    windows = list(iter_audio_windows(make_audio(tmp_path / "tone.wav", f"0.5*{TONE}", duration=2)))
+    assert [t for t, _, _ in windows] == [0.0, 0.5, 1.0, 1.5]
+    # A sine of amplitude 0.5 has an RMS of 0.5/sqrt(2), about -9 dBFS; 440 Hz crosses zero 880 times a second
+    assert all(db == pytest.approx(-9.03, abs=0.1) and rate == pytest.approx(880 / 16000, abs=0.005)
+               for _, db, rate in windows)
+
+
+def test_burst_over_noise_bed(tmp_path):
+    path = make_audio(tmp_path / "bed.wav", f"0.02*(2*random(0)-1)+between(t,5,10)*0.5*{TONE}")
+    highlights = list(detect_audio_highlights(path))
+    assert len(highlights) == 1
+    assert highlights[0]['start'] <= 5 and highlights[0]['end'] >= 10
+    assert highlights[0]['query'] == 'audio-energy' and 0 < highlights[0]['score'] <= 1
+
+
+def test_burst_after_quiet_start(tmp_path):
+    # Below the silence threshold until the tone, so only the tone is active audio
+    highlights = list(detect_audio_highlights(make_audio(tmp_path / "quiet.wav", f"between(t,5,8)*0.3*{TONE}")))
+    assert len(highlights) == 1
+    assert highlights[0]['start'] <= 5 and highlights[0]['end'] >= 8
+
+
+def test_silence_and_steady_level(tmp_path):
+    assert list(detect_audio_highlights(make_audio(tmp_path / "silence.wav", "0"))) == []
+    assert list(detect_audio_highlights(make_audio(tmp_path / "steady.wav", f"0.1*{TONE}"))) == []
@@ -0,0 +1,55 @@
+import math
+
+import pytest
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from utils.bm25 import BM25Index, BM25Retriever, HybridRetriever, tokenize
+
+
+class FixedRetriever(BaseRetriever):
+    def __init__(self, results, **kwargs):
+        self.results = results
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle):
+        return self.results
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("So, the CACHE isn't warm!") == ['cache', "isn't", 'warm']
+
+
+def test_scores_follow_term_frequency_and_length():
+    index = BM25Index(["cache cache miss", "cache", "disk"])
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+    average = 5 / 3
+
+    def score(tf, length):
+        return idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * length / average))
+
+    # The one-word document wins over the longer one that repeats the term; "disk" scores 0 and is left out
+    assert index.search("cache") == [(1, pytest.approx(score(1, 1))), (0, pytest.approx(score(2, 3)))]
+    assert index.search("miss cache", top_k=1)[0][0] == 0
+    assert index.search("unknown words") == []
+
+
+def test_retriever_returns_nodes():
+    nodes = [TextNode(text=text, id_=str(i)) for i, text in enumerate(["heap allocator", "socket latency"])]
+    results = BM25Retriever(nodes, similarity_top_k=5).retrieve("latency of a socket")
+    assert [result.node.node_id for result in results] == ['1']
+
+
+def test_hybrid_merges_nodes_found_by_both_sides():
+    a, b, c, d = (TextNode(text=text, id_=text) for text in "abcd")
+    vector = FixedRetriever([NodeWithScore(node=a, score=0.9), NodeWithScore(node=b, score=0.5),
+                             NodeWithScore(node=c, score=0.1)])
+    bm25 = FixedRetriever([NodeWithScore(node=b, score=10.0), NodeWithScore(node=d, score=2.0)])
+
+    fused = HybridRetriever(vector, bm25, alpha=0.5, similarity_top_k=10).retrieve("query")
+    # Normalized: vector a=1, b=0.5, c=0; BM25 b=1, d=0
+    assert [(result.node.node_id, result.score) for result in fused[:2]] == [('b', 0.75), ('a', 0.5)]
+    assert sorted(result.node.node_id for result in fused) == ['a', 'b', 'c', 'd']
+
+    vector_only = HybridRetriever(vector, bm25, alpha=1.0, similarity_top_k=2).retrieve("query")
+    assert [(result.node.node_id, result.score) for result in vector_only] == [('a', 1.0), ('b', 0.5)]
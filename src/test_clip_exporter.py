@@ -0,0 +1,66 @@
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from utils.clip_exporter import concat_clips, export_clips, make_test_video, previous_keyframe
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="needs ffmpeg")
+
+
+def duration(path):
+    """Container duration in seconds, read from ffmpeg's own report so ffprobe isn't needed."""
+    stderr = subprocess.run(['ffmpeg', '-hide_banner', '-i', str(path)], capture_output=True, text=True).stderr
+    hours, minutes, seconds = re.search(r'Duration: (\d+):(\d+):([\d.]+)', stderr).groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory):
+    # 10 s at 25 fps with a keyframe every 2 s
+    return make_test_video(str(tmp_path_factory.mktemp('source') / 'lesson.mp4'), duration=10, keyframe_interval=50)
+
+
+SEGMENTS = [
+    {'start': 1.0, 'end': 3.0, 'text': 'intro'},
+    {'start': 5.5, 'end': 8.0, 'text': 'demo'},
+    {'start': 9.0, 'end': 9.0, 'text': 'empty, skipped'},
+]
+
+
+def test_stream_copy_clips(video, tmp_path):
+    clips = export_clips(video, SEGMENTS, str(tmp_path), max_workers=2)
+    assert [clip['text'] for clip in clips] == ['intro', 'demo']
+    for clip, segment in zip(clips, SEGMENTS):
+        assert clip['path'].endswith('.mp4') and os.path.exists(clip['path'])
+        # A stream copy may start early, at the keyframe before the cut, but never late
+        assert clip['start'] <= segment['start']
+        assert duration(clip['path']) >= segment['end'] - segment['start'] - 0.1
+
+
+@pytest.mark.skipif(shutil.which('ffprobe') is None, reason="keyframes are probed with ffprobe")
+def test_stream_copy_starts_on_keyframes(video, tmp_path):
+    assert previous_keyframe(video, 5.5) == pytest.approx(4.0)
+    assert previous_keyframe(video, 4.0) == pytest.approx(4.0)
+    clip = export_clips(video, SEGMENTS[1:2], str(tmp_path))[0]
+    assert clip['start'] == pytest.approx(4.0)
+    assert duration(clip['path']) == pytest.approx(8.0 - 4.0, abs=0.3)
+
+
+def test_precise_cuts(video, tmp_path):
+    clips = export_clips(video, SEGMENTS[1:2], str(tmp_path), precise=True, max_workers=1)
+    assert clips[0]['start'] == 5.5
+    assert duration(clips[0]['path']) == pytest.approx(2.5, abs=0.1)
+
+
+def test_highlight_reel(video, tmp_path):
+    clips = export_clips(video, SEGMENTS, str(tmp_path), precise=True)
+    reel = concat_clips([clip['path'] for clip in clips], str(tmp_path / 'highlights.mp4'))
+    assert duration(reel) == pytest.approx(sum(duration(clip['path']) for clip in clips), abs=0.3)
+
+
+def test_failed_cuts_are_dropped(tmp_path):
+    assert export_clips(str(tmp_path / 'missing.mp4'), SEGMENTS, str(tmp_path / 'clips')) == []
+    assert export_clips(str(tmp_path / 'missing.mp4'), [], str(tmp_path / 'clips')) == []
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from utils.corpus_index import CorpusIndex
+
+
+def _chunks(video_id, count, start=0.0):
+    return [{'start': start + i * 10.0, 'end': start + i * 10.0 + 10.0, 'text': f"{video_id} chunk {i}"}
+            for i in range(count)]
+
+
+def _embeddings(count, axis, dim=4):
+    return [[1.0 if j == axis else 0.1 * i for j in range(dim)] for i in range(count)]
+
+
+def test_search_filters_and_persists(tmp_path):
+    corpus = CorpusIndex(str(tmp_path), 'm')
+    corpus.add_video('a', _chunks('a', 3), _embeddings(3, axis=0), fingerprint='fa')
+    corpus.add_video('b', _chunks('b', 3), _embeddings(3, axis=1), fingerprint='fb')
+
+    best = [corpus.node(row).text for row, _ in corpus.search([1.0, 0, 0, 0], top_k=2)]
+    assert best == ['a chunk 0', 'a chunk 1']
+    only_b = corpus.search([1.0, 0, 0, 0], top_k=10, video_ids=['b'], min_start=10.0)
+    assert [corpus.node(row).text for row, _ in only_b] == ['b chunk 2', 'b chunk 1']
+
+    reopened = CorpusIndex(str(tmp_path), 'm')
+    assert len(reopened) == 6 and reopened.has_video('a', 'fa') and not reopened.has_video('a', 'other')
+    assert [node.text for node in reopened.nodes('b')] == ['b chunk 0', 'b chunk 1', 'b chunk 2']
+    with pytest.raises(ValueError):
+        CorpusIndex(str(tmp_path), 'another-model')
+
+
+def test_interrupted_insert_is_rolled_back(tmp_path):
+    corpus = CorpusIndex(str(tmp_path), 'm')
+    corpus.add_video('a', _chunks('a', 2), _embeddings(2, axis=0))
+    with open(corpus.nodes_path, 'a') as f:
+        f.write('{"video_id": "half"')
+    with open(corpus.texts_path, 'ab') as f:
+        f.write(b'uncommitted')
+
+    reopened = CorpusIndex(str(tmp_path), 'm')
+    assert [node.text for node in reopened.nodes('a')] == ['a chunk 0', 'a chunk 1']
+    reopened.add_video('b', _chunks('b', 1), _embeddings(1, axis=1))
+    assert [node.text for node in CorpusIndex(str(tmp_path), 'm').nodes('b')] == ['b chunk 0']
+
+
+def test_replaced_rows_are_compacted(tmp_path):
+    corpus = CorpusIndex(str(tmp_path), 'm', compact_dead_fraction=0.5)
+    corpus.add_video('a', _chunks('a', 4), _embeddings(4, axis=0), fingerprint=1)
+    corpus.append_chunks('b', _chunks('b', 2), _embeddings(2, axis=1), fingerprint=1)
+    corpus.add_video('a', _chunks('a', 2, start=100.0), _embeddings(2, axis=0), fingerprint=2)
+    # 4 of 8 rows are dead, not past the threshold yet
+    assert corpus.generation == 0 and corpus.count == 8
+    corpus.append_chunks('b', _chunks('b', 1, start=20.0), _embeddings(1, axis=1), fingerprint=1)
+    corpus.add_video('a', _chunks('a', 1, start=200.0), _embeddings(1, axis=0), fingerprint=3)
+    assert corpus.generation == 1 and corpus.count == len(corpus) == 4
+    assert sorted(os.listdir(tmp_path)) == ['.lock', 'manifest.json', 'nodes.1.jsonl', 'texts.1.txt', 'vectors.1.f32']
+
+    for reader in (corpus, CorpusIndex(str(tmp_path), 'm')):
+        assert [(node.metadata['start'], node.text) for node in reader.nodes('a')] == [(200.0, 'a chunk 0')]
+        assert [node.text for node in reader.nodes('b')] == ['b chunk 0', 'b chunk 1', 'b chunk 0']
+        row, score = reader.search([1.0, 0, 0, 0], top_k=1)[0]
+        assert reader.node(row).text == 'a chunk 0' and score == pytest.approx(1.0)
+
+
+def test_long_lived_reader_sees_other_writers(tmp_path):
+    reader = CorpusIndex(str(tmp_path), 'm', compact_dead_fraction=0.3)
+    writer = CorpusIndex(str(tmp_path), 'm', compact_dead_fraction=0.3)
+    assert reader.search([1.0, 0, 0, 0]) == []
+
+    writer.add_video('a', _chunks('a', 3), _embeddings(3, axis=0), fingerprint=1)
+    assert [reader.node(row).text for row, _ in reader.search([1.0, 0, 0, 0], top_k=1)] == ['a chunk 0']
+
+    # A compaction in the writer removes the files the reader has open
+    writer.add_video('a', _chunks('a', 1, start=50.0), _embeddings(1, axis=0), fingerprint=2)
+    assert writer.generation == 1
+    rows = reader.search([1.0, 0, 0, 0], top_k=5, video_ids=['a'])
+    assert [(reader.node(row).metadata['start'], reader.node(row).text) for row, _ in rows] == [(50.0, 'a chunk 0')]
+
+
+def test_reader_that_has_not_read_yet_survives_a_compaction(tmp_path):
+    writer = CorpusIndex(str(tmp_path), 'm', compact_dead_fraction=0.3)
+    writer.add_video('a', _chunks('a', 3), _embeddings(3, axis=0), fingerprint=1)
+    reader = CorpusIndex(str(tmp_path), 'm')
+    writer.add_video('a', _chunks('a', 1, start=50.0), _embeddings(1, axis=0), fingerprint=2)
+    assert writer.generation == 1 and not os.path.exists(tmp_path / 'texts.txt')
+    # Still the rows of generation 0 until the reader reloads on its next search
+    assert [node.text for node in reader.nodes('a')] == ['a chunk 0', 'a chunk 1', 'a chunk 2']
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+from utils.download_cache import DownloadCache, normalize_video_id
+from utils.youtube_utils import DownloadResult, fetch_video, get_download_cache
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+@pytest.mark.parametrize('url', [
+    VIDEO_ID,
+    f'https://www.youtube.com/watch?v={VIDEO_ID}&t=42s',
+    f'youtube.com/watch?list=PL123&v={VIDEO_ID}',
+    f'https://youtu.be/{VIDEO_ID}?si=abc',
+    f'https://www.youtube.com/shorts/{VIDEO_ID}',
+    f'https://www.youtube-nocookie.com/embed/{VIDEO_ID}',
+])
+def test_normalize_video_id(url):
+    assert normalize_video_id(url) == VIDEO_ID
+
+
+def test_normalize_rejects_other_urls():
+    assert normalize_video_id('https://example.com/watch?v=dQw4w9WgXcQ') is None
+    assert normalize_video_id('https://www.youtube.com/watch?v=short') is None
+
+
+def downloaded(tmp_path, video=b'video' * 100, subtitles='WEBVTT\n\n00:00.000 --> 00:01.000\nhi\n'):
+    paths = {
+        'video_path': tmp_path / f'{VIDEO_ID}.mp4',
+        'subtitle_path': tmp_path / f'{VIDEO_ID}.en.vtt',
+        'info_path': tmp_path / f'{VIDEO_ID}.info.json',
+    }
+    paths['video_path'].write_bytes(video)
+    paths['subtitle_path'].write_text(subtitles)
+    paths['info_path'].write_text(json.dumps({'id': VIDEO_ID}))
+    result = DownloadResult(VIDEO_ID, *(str(path) for path in paths.values()), title='Title', duration=1.0)
+    return result, paths
+
+
+def overwrite_keeping_mtime(path, data):
+    stat = os.stat(path)
+    path.write_bytes(data)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_hit_survives_reopening(tmp_path):
+    result, _ = downloaded(tmp_path)
+    DownloadCache(str(tmp_path)).record(result)
+    entry = DownloadCache(str(tmp_path)).get(VIDEO_ID)
+    assert entry['title'] == 'Title'
+    assert entry['artifacts']['video_path']['path'] == result.video_path
+
+
+def test_corrupt_subtitles_of_the_same_size_are_refetched(tmp_path):
+    result, paths = downloaded(tmp_path)
+    cache = DownloadCache(str(tmp_path))
+    cache.record(result)
+    overwrite_keeping_mtime(paths['subtitle_path'], paths['subtitle_path'].read_bytes().replace(b'hi', b'yo'))
+    assert cache.get(VIDEO_ID) is None
+    assert not paths['subtitle_path'].exists()
+    assert 'subtitle_path' not in DownloadCache(str(tmp_path))._entries[VIDEO_ID]['artifacts']
+
+
+def test_media_is_hashed_only_when_its_mtime_changed(tmp_path):
+    result, paths = downloaded(tmp_path)
+    cache = DownloadCache(str(tmp_path))
+    cache.record(result)
+
+    # Same size, same mtime: trusted without hashing the video
+    overwrite_keeping_mtime(paths['video_path'], b'VIDEO' * 100)
+    assert cache.get(VIDEO_ID) is not None
+    assert DownloadCache(str(tmp_path), verify_checksums=True).get(VIDEO_ID) is None
+
+    result, paths = downloaded(tmp_path)
+    cache.record(result)
+    # Touched but intact: the hash checks out and the new mtime is recorded
+    os.utime(paths['video_path'], ns=(0, 10**9))
+    assert cache.get(VIDEO_ID) is not None
+    assert DownloadCache(str(tmp_path))._entries[VIDEO_ID]['artifacts']['video_path']['mtime_ns'] == 10**9
+    # Touched and changed: re-fetched
+    paths['video_path'].write_bytes(b'VIDEO' * 100)
+    assert cache.get(VIDEO_ID) is None
+
+
+def test_truncated_media_only_matters_when_needed(tmp_path):
+    result, paths = downloaded(tmp_path)
+    cache = DownloadCache(str(tmp_path))
+    cache.record(result)
+    paths['video_path'].write_bytes(b'vid')
+    assert cache.get(VIDEO_ID, need_media=False) is not None
+    assert cache.get(VIDEO_ID) is None
+
+
+def test_subtitle_only_fetch_keeps_recorded_media(tmp_path):
+    result, _ = downloaded(tmp_path)
+    cache = DownloadCache(str(tmp_path))
+    cache.record(result)
+    cache.record(result._replace(video_path=None))
+    assert cache.get(VIDEO_ID)['artifacts']['video_path']['path'] == result.video_path
+
+
+def test_fetch_video_answers_from_the_cache(tmp_path):
+    result, _ = downloaded(tmp_path)
+    get_download_cache(str(tmp_path)).record(result)
+    # No network: a cache miss would try to reach YouTube and fail
+    cached = fetch_video(f'https://www.youtube.com/watch?v={VIDEO_ID}', output_path=str(tmp_path))
+    assert cached == result
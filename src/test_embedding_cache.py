@@ -0,0 +1,80 @@
+import multiprocessing
+
+import pytest
+
+from utils.embedding_cache import EmbeddingCache, CachedEmbedding
+from benchmarks.synthetic import HashEmbedding
+
+
+def test_round_trip_and_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many('m', ['one', 'two'], [[1.0, 0.0], [0.0, 1.0]])
+    assert cache.get_many('m', ['two', 'three']) == [[0.0, 1.0], None]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    reopened = EmbeddingCache(str(tmp_path))
+    assert reopened.get_many('m', ['one']) == [[1.0, 0.0]]
+    # Keys are per model
+    assert reopened.get_many('other', ['one']) == [None]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_many('m', ['a', 'b'], [[1.0], [2.0]])
+    cache.get_many('m', ['a'])
+    cache.put_many('m', ['c'], [[3.0]])
+    assert cache.get_many('m', ['a', 'b', 'c']) == [[1.0], None, [3.0]]
+    assert cache.evictions == 1
+
+
+def test_instances_sharing_a_directory(tmp_path):
+    first = EmbeddingCache(str(tmp_path))
+    second = EmbeddingCache(str(tmp_path))
+    first.put_many('m', ['a-text'], [[1.0, 0.0]])
+    second.put_many('m', ['b-text'], [[0.0, 1.0]])
+    fresh = EmbeddingCache(str(tmp_path))
+    assert fresh.get_many('m', ['a-text', 'b-text']) == [[1.0, 0.0], [0.0, 1.0]]
+    # The first instance sees what the second one wrote
+    assert first.get_many('m', ['b-text']) == [[0.0, 1.0]]
+
+
+def test_growth_never_shrinks_the_file(tmp_path):
+    small = EmbeddingCache(str(tmp_path), max_entries=10)
+    large = EmbeddingCache(str(tmp_path), max_entries=5000)
+    large.put_many('m', [f"l{i}" for i in range(2000)], [[float(i)] for i in range(2000)])
+    small.put_many('m', ['s'], [[-1.0]])
+    assert EmbeddingCache(str(tmp_path)).get_many('m', ['l1999', 's']) == [[1999.0], [-1.0]]
+
+
+def _writer(cache_dir, worker):
+    cache = EmbeddingCache(cache_dir)
+    for batch in range(5):
+        texts = [f"{worker}-{batch}-{i}" for i in range(50)]
+        cache.put_many('m', texts, [[float(worker), float(batch), float(i)] for i in range(50)])
+
+
+def test_concurrent_processes(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_writer, args=(str(tmp_path), worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path))
+    assert len(cache) == 4 * 5 * 50
+    for worker in range(4):
+        texts = [f"{worker}-{batch}-{i}" for batch in range(5) for i in range(50)]
+        expected = [[float(worker), float(batch), float(i)] for batch in range(5) for i in range(50)]
+        assert cache.get_many('m', texts) == expected
+
+
+def test_cached_embedding_only_sends_misses(tmp_path):
+    model = CachedEmbedding(HashEmbedding(dim=16), EmbeddingCache(str(tmp_path)))
+    first = model.get_text_embedding_batch(['alpha beta', 'gamma'])
+    assert model.cache.stats()['misses'] == 2
+    second = model.get_text_embedding_batch(['gamma', 'alpha beta'])
+    # Vectors are stored as float32
+    assert second[0] == pytest.approx(first[1], abs=1e-6) and second[1] == pytest.approx(first[0], abs=1e-6)
+    assert model.cache.stats()['hits'] == 2
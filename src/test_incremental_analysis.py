@@ -0,0 +1,86 @@
+from agents.youtube_analizer import VideoAnalyzer
+from benchmarks.synthetic import HashEmbedding, write_transcript
+from utils.subtitle_parser import load_cues
+
+
+class FlakyEmbedding(HashEmbedding):
+    """Fails the first failures batches, then embeds like HashEmbedding."""
+
+    failures: int = 0
+
+    def _get_text_embeddings(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("embedding service unavailable")
+        return [self._vector(text) for text in texts]
+
+
+def _analyzer(tmp_path, subtitle_path, **kwargs):
+    kwargs = {'retrieval_mode': 'vector', 'embed_model': HashEmbedding(dim=64), **kwargs}
+    return VideoAnalyzer(None, subtitle_path=str(subtitle_path), output_path=str(tmp_path / "analysis"),
+                         corpus_dir=str(tmp_path / "corpus"), embedding_cache_dir=None, extraction_mode="retrieval",
+                         queries=["a very simple example", "how it works in practice"], chunk_tokens=64,
+                         audio_highlights="off", **kwargs)
+
+
+def _grow(tmp_path, pieces=3):
+    """A finished transcript, and a function writing its first i/pieces to a growing file (cut anywhere)."""
+    full_path = tmp_path / "full.vtt"
+    write_transcript(full_path, 300)
+    data = full_path.read_bytes()
+    live_path = tmp_path / "abcdefghijk.en.vtt"
+
+    def write(i):
+        live_path.write_bytes(data[:len(data) * i // pieces])
+
+    return full_path, live_path, write
+
+
+def _indexed_words(analyzer):
+    return ' '.join(node.text for node in analyzer.corpus.nodes(analyzer.video_id)).split()
+
+
+def _words(path):
+    return ' '.join(cue.text for cue in load_cues(str(path))).split()
+
+
+def test_failed_embedding_is_retried(tmp_path):
+    full_path, live_path, write = _grow(tmp_path)
+    analyzer = _analyzer(tmp_path, live_path, embed_model=FlakyEmbedding(dim=64))
+    write(1)
+    analyzer.embed_model.failures = 1
+    assert analyzer.analyze_incremental() is None
+    assert analyzer.analyze_incremental() is not None
+    write(2)
+    analyzer.embed_model.failures = 1
+    assert analyzer.analyze_incremental() is None
+    write(3)
+    assert analyzer.analyze_incremental() is not None
+    assert analyzer.analyze_incremental(final=True) is not None
+    assert _indexed_words(analyzer) == _words(full_path)
+
+
+def test_resumes_from_saved_state(tmp_path):
+    full_path, live_path, write = _grow(tmp_path, pieces=4)
+    write(1)
+    _analyzer(tmp_path, live_path).analyze_incremental()
+    write(3)
+    _analyzer(tmp_path, live_path).analyze_incremental()
+    write(4)
+    # A new process picks up at the saved offset, deduper state and held back cues
+    analyzer = _analyzer(tmp_path, live_path)
+    segments = analyzer.analyze_incremental(final=True)
+    assert segments and all(segment['start'] >= 150 for segment in segments)
+    assert _indexed_words(analyzer) == _words(full_path)
+
+
+def test_hybrid_window_fuses_both_retrievers(tmp_path):
+    full_path, live_path, write = _grow(tmp_path, pieces=2)
+    write(1)
+    analyzer = _analyzer(tmp_path, live_path, retrieval_mode="hybrid")
+    _, retriever = analyzer._ingest_new_cues()
+    for query in analyzer.queries:
+        results = retriever.retrieve(query)
+        texts = [result.node.get_content() for result in results]
+        assert results and len(texts) == len(set(texts))
+        assert all(result.node.node_id.startswith(f"{analyzer.video_id}:") for result in results)
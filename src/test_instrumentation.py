@@ -0,0 +1,72 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from utils import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    was_enabled = instrumentation.enabled()
+    instrumentation.reset()
+    yield
+    instrumentation.enable(was_enabled)
+    instrumentation.reset()
+
+
+def test_disabled_records_nothing():
+    instrumentation.enable(False)
+    with instrumentation.span('parse'):
+        instrumentation.incr('api_calls', service='llm')
+    assert instrumentation.snapshot() == {'spans': {}, 'counters': {}}
+    assert instrumentation.prometheus_text() == '\n'
+
+
+def test_spans_and_counters():
+    instrumentation.enable()
+    for _ in range(3):
+        with instrumentation.span('parse'):
+            pass
+    instrumentation.incr('api_calls', service='llm')
+    instrumentation.incr('api_calls', 2, service='llm')
+    instrumentation.incr('api_calls', 0, service='search')
+    report = instrumentation.report()
+    assert report['spans']['parse']['count'] == 3
+    assert report['counters'] == [{'name': 'api_calls', 'labels': {'service': 'llm'}, 'value': 3}]
+    json.dumps(report)
+
+
+def _worker_job():
+    instrumentation.enable()
+    instrumentation.reset()
+    with instrumentation.span('embedding'):
+        instrumentation.incr('api_calls', 5, service='embedding')
+    return instrumentation.snapshot()
+
+
+def test_worker_snapshot_is_merged():
+    instrumentation.enable()
+    with instrumentation.span('embedding'):
+        instrumentation.incr('api_calls', service='embedding')
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        worker = pool.submit(_worker_job).result()
+    instrumentation.merge(worker)
+
+    report = instrumentation.report()
+    assert report['spans']['embedding']['count'] == 2
+    assert report['spans']['embedding']['max_seconds'] >= round(worker['spans']['embedding'][2], 6)
+    assert report['counters'] == [{'name': 'api_calls', 'labels': {'service': 'embedding'}, 'value': 6}]
+
+
+def test_prometheus_escapes_label_values():
+    instrumentation.enable()
+    instrumentation.incr('errors', query='say "hi"\nback\\slash')
+    instrumentation.incr('cache-hits', cache='search')
+    text = instrumentation.prometheus_text(prefix='app')
+    assert '# TYPE app_errors_total counter' in text
+    assert 'app_errors_total{query="say \\"hi\\"\\nback\\\\slash"} 1\n' in text
+    # One sample per line, and metric names are sanitized
+    assert 'app_cache_hits_total{cache="search"} 1\n' in text
+    assert all(line.startswith(('#', 'app_')) for line in text.splitlines())
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+from agents.youtube_analizer import VideoAnalyzer
+from benchmarks.synthetic import write_transcript
+from pipeline import PipelineCheckpoint, PipelineRunner
+
+VIDEO_IDS = {'first query': 'aaaaaaaaaaa', 'second query': 'bbbbbbbbbbb'}
+
+
+class FakeScraper:
+    """Searches and downloads from transcripts written to a directory, counting every call."""
+
+    def __init__(self, directory, failing_downloads=()):
+        self.directory = directory
+        self.failing_downloads = set(failing_downloads)
+        self.calls = []
+
+    def search(self, query, max_results=1):
+        self.calls.append(('search', query))
+        return [f"https://www.youtube.com/watch?v={VIDEO_IDS[query]}"]
+
+    def _download(self, video_url, query, subtitles_only=False):
+        self.calls.append(('download', video_url))
+        video_id = video_url.rsplit('=', 1)[1]
+        if video_id in self.failing_downloads:
+            return None
+        subtitle_path = self.directory / f"{video_id}.en.vtt"
+        write_transcript(subtitle_path, 300, rolling=True, seed=len(self.calls))
+        return {'query': query, 'video_url': video_url, 'video_path': None, 'subtitle_path': str(subtitle_path),
+                'metadata': {'id': video_id}, 'key_segments': None}
+
+
+def _run(runner, queries=tuple(VIDEO_IDS)):
+    async def collect():
+        return [result async for result in runner.run(queries)]
+
+    return sorted(asyncio.run(collect()), key=lambda result: result['video_id'])
+
+
+@pytest.fixture
+def make_runner(tmp_path):
+    def make(scraper):
+        return PipelineRunner(
+            scraper=scraper, checkpoint_path=str(tmp_path / "checkpoint.jsonl"),
+            concurrency={'index': 1}, analyzer_kwargs={
+                'output_path': str(tmp_path / "analysis"), 'retrieval_mode': 'bm25', 'extraction_mode': 'retrieval',
+                'embedding_cache_dir': None, 'corpus_dir': None, 'audio_highlights': 'off',
+                # Words of the synthetic transcripts, so BM25 finds chunks
+                'queries': ['a very simple example', 'how it works in practice'],
+            },
+        )
+    return make
+
+
+def test_checkpoint_skips_half_written_line(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = PipelineCheckpoint(str(path))
+    checkpoint.record('v:x', 'download', {'subtitle_path': 'x.vtt'})
+    with open(path, 'a') as f:
+        f.write('{"key": "v:x", "stage": "ind')
+    reopened = PipelineCheckpoint(str(path))
+    assert reopened.get('v:x', 'download') == {'subtitle_path': 'x.vtt'}
+    assert not reopened.done('v:x', 'index')
+
+
+def test_rerun_resumes_every_stage(tmp_path, make_runner):
+    scraper = FakeScraper(tmp_path)
+    first = _run(make_runner(scraper))
+    assert [result['video_id'] for result in first] == sorted(VIDEO_IDS.values())
+    assert all(result['key_segments'] for result in first)
+    json.dumps(first)
+
+    calls = len(scraper.calls)
+    runner = make_runner(scraper)
+    assert _run(runner) == first
+    assert len(scraper.calls) == calls
+    for stage in ('search', 'download', 'index', 'analyze'):
+        assert runner.stats[stage] == {'done': 0, 'resumed': 2, 'failed': 0}
+
+
+def test_failures_are_not_checkpointed(tmp_path, make_runner, monkeypatch):
+    scraper = FakeScraper(tmp_path, failing_downloads={'bbbbbbbbbbb'})
+
+    async def failing_extraction(self, retriever):
+        raise RuntimeError("LLM unavailable")
+
+    with monkeypatch.context() as patch:
+        # The analysis runs in this process, indexing in a worker
+        patch.setattr(VideoAnalyzer, '_extract_segments', failing_extraction)
+        runner = make_runner(scraper)
+        assert _run(runner) == []
+    assert runner.stats['download'] == {'done': 1, 'resumed': 0, 'failed': 1}
+    assert runner.stats['index']['done'] == 1
+    assert runner.stats['analyze'] == {'done': 0, 'resumed': 0, 'failed': 1}
+
+    scraper.failing_downloads.clear()
+    runner = make_runner(scraper)
+    results = _run(runner)
+    assert [result['video_id'] for result in results] == sorted(VIDEO_IDS.values())
+    assert all(result['key_segments'] for result in results)
+    assert runner.stats['download'] == {'done': 1, 'resumed': 1, 'failed': 0}
+    assert runner.stats['analyze'] == {'done': 2, 'resumed': 0, 'failed': 0}
+
+
+def test_analysis_reuses_what_the_index_worker_prepared(tmp_path, make_runner, monkeypatch):
+    prepared_here = []
+    prepare = VideoAnalyzer._prepare_subtitles
+
+    def counting_prepare(self):
+        prepared_here.append(self.video_id)
+        return prepare(self)
+
+    monkeypatch.setattr(VideoAnalyzer, '_prepare_subtitles', counting_prepare)
+    assert len(_run(make_runner(FakeScraper(tmp_path)))) == 2
+    assert prepared_here == []
@@ -0,0 +1,50 @@
+from utils.rolling_captions import RollingCaptionDeduper, clean_cue_text, dedupe_rolling_cues
+from utils.subtitle_parser import Cue, load_cues
+from benchmarks.synthetic import write_transcript
+
+
+def test_clean_cue_text():
+    assert clean_cue_text("so<00:00:01.439><c> we</c><c.colorE5E5E5> take</c> &amp; go") == "so we take & go"
+
+
+def test_rolling_captions_keep_only_new_text():
+    cues = [
+        Cue(0.0, 2.0, "hello<00:00:00.500><c> world</c>"),
+        Cue(2.0, 2.01, "hello world"),
+        Cue(2.01, 4.0, "hello world\nhow<00:00:02.500><c> are</c><c> you</c>"),
+        Cue(4.0, 4.01, "how are you"),
+    ]
+    stats = {}
+    assert list(dedupe_rolling_cues(cues, stats=stats)) == [
+        # The 10 ms repeat extends the cue still on screen
+        Cue(0.0, 2.01, "hello world"),
+        Cue(2.01, 4.01, "how are you"),
+    ]
+    assert stats['cues_before'] == 4 and stats['cues_after'] == 2
+
+
+def test_ordinary_repeats_are_kept():
+    cues = [Cue(0.0, 2.0, "we did it again and again"), Cue(2.0, 4.0, "again and again we tried")]
+    assert [cue.text for cue in dedupe_rolling_cues(cues)] == [cue.text for cue in cues]
+
+
+def test_synthetic_rolling_transcript_matches_plain_one(tmp_path):
+    write_transcript(tmp_path / "plain.vtt", 120, seed=3)
+    write_transcript(tmp_path / "rolling.vtt", 120, rolling=True, seed=3)
+    plain = load_cues(str(tmp_path / "plain.vtt"))
+    deduped = list(dedupe_rolling_cues(load_cues(str(tmp_path / "rolling.vtt"))))
+    assert [cue.text for cue in deduped] == [cue.text for cue in plain]
+    assert [cue.start for cue in deduped] == [round(cue.start, 3) for cue in plain]
+
+
+def test_state_survives_a_restart():
+    cues = [
+        Cue(0.0, 2.0, "one two"),
+        Cue(2.0, 4.0, "one two\nthree four"),
+        Cue(4.0, 6.0, "three four\nfive six"),
+    ]
+    first = RollingCaptionDeduper()
+    emitted = first.feed(cues[:2])
+    second = RollingCaptionDeduper.from_dict(first.to_dict())
+    emitted += second.feed(cues[2:]) + second.flush()
+    assert [cue.text for cue in emitted] == ["one two", "three four", "five six"]
@@ -0,0 +1,61 @@
+import json
+import threading
+import time
+
+from agents.youtube_scraper import YouTubeScraper
+from utils.search_cache import SearchCache, normalize_query
+from utils.youtube_utils import get_search_cache, search_youtube
+
+URLS = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(3)]
+
+
+def test_normalize_query():
+    assert normalize_query("  What is   LlamaIndex? ") == "what is llamaindex?"
+
+
+def test_hits_misses_and_fewer_results(tmp_path):
+    cache = SearchCache(str(tmp_path / "log.jsonl"))
+    assert cache.get("rust async", 2) is None
+    cache.record("rust async", 3, URLS)
+    assert cache.get("Rust  Async", 2) == URLS[:2]
+    # A search for more results than were cached is a miss
+    assert cache.get("rust async", 5) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_ttl_and_empty_results(tmp_path, monkeypatch):
+    cache = SearchCache(str(tmp_path / "log.jsonl"), ttl_seconds=100, empty_ttl_seconds=10)
+    cache.record("found", 1, URLS[:1])
+    cache.record("nothing", 1, [])
+    now = time.time()
+    monkeypatch.setattr('utils.search_cache.time.time', lambda: now + 50)
+    assert cache.get("found", 1) == URLS[:1]
+    # An empty answer may have been a transient failure; it is retried after empty_ttl_seconds
+    assert cache.get("nothing", 1) is None
+    monkeypatch.setattr('utils.search_cache.time.time', lambda: now + 150)
+    assert cache.get("found", 1) is None
+
+
+def test_log_is_append_only_and_shared(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    writer, reader = SearchCache(path), SearchCache(path)
+    threads = [threading.Thread(target=writer.record, args=(f"query {i}", 1, URLS[:1])) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.record("query 0", 1, URLS[1:2])
+    lines = [json.loads(line) for line in open(path)]
+    assert len(lines) == 21
+    # The other instance picks up the new lines, newest record first
+    assert reader.get("query 0", 1) == URLS[1:2]
+    assert reader.get("query 19", 1) == URLS[:1]
+
+
+def test_search_youtube_uses_the_shared_log(tmp_path):
+    path = str(tmp_path / "found_urls.jsonl")
+    assert get_search_cache(path) is get_search_cache(path)
+    # Recorded by the scraper, so no search runs
+    YouTubeScraper(output_path=str(tmp_path), urls_log_file=path).search_cache.record("python decorators", 2, URLS[:2])
+    assert search_youtube("Python decorators", max_results=2, log_path=path) == URLS[:2]
+    assert get_search_cache(path).hits == 1
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from utils.segment_merger import _iou, merge_segments
+
+
+def segment(start, end, query='q', text=None, **extra):
+    return {'start': start, 'end': end, 'text': text if text is not None else f"{start}-{end}", 'query': query, **extra}
+
+
+def reference_merge(segments, policy, iou_threshold=0.5, max_length=None, gap_tolerance=0.0):
+    """Quadratic version of the documented behaviour: join the newest group that qualifies."""
+    groups = []
+    for item in sorted(segments, key=lambda s: (s['start'], s['end'])):
+        target = None
+        for group in reversed(groups):
+            start, end = group[0]['start'], max(member['end'] for member in group)
+            if max_length is not None and max(end, item['end']) - start > max_length:
+                continue
+            if policy == 'union' and start <= item['start'] <= end + gap_tolerance:
+                target = group
+                break
+            if policy == 'iou' and _iou(start, end, item['start'], item['end']) >= iou_threshold:
+                target = group
+                break
+        if target is None:
+            groups.append([item])
+        else:
+            target.append(item)
+    return [(group[0]['start'], max(member['end'] for member in group), len(group)) for group in groups]
+
+
+def test_union_merges_clusters_and_keeps_provenance():
+    merged = merge_segments([
+        segment(10, 20, 'a', 'first'),
+        segment(15, 30, 'b', 'second'),
+        segment(0, 5, 'a'),
+        segment(29, 31, 'a', 'first'),
+    ])
+    assert [(s['start'], s['end']) for s in merged] == [(0, 5), (10, 31)]
+    assert merged[1]['sources'] == ['a', 'b']
+    assert merged[1]['text'] == 'first | second'
+    assert merged[1]['score'] == 3
+
+
+def test_gap_tolerance_and_max_length():
+    items = [segment(0, 10), segment(11, 20), segment(21, 40)]
+    assert len(merge_segments(items)) == 3
+    assert len(merge_segments(items, gap_tolerance=1)) == 1
+    assert [(s['start'], s['end']) for s in merge_segments(items, gap_tolerance=1, max_length=25)] == [(0, 20), (21, 40)]
+
+
+def test_iou_keeps_nested_segments_apart():
+    items = [segment(0, 100, 'a'), segment(10, 20, 'b'), segment(11, 21, 'c')]
+    merged = merge_segments(items, policy='iou', iou_threshold=0.5)
+    assert [(s['start'], s['end'], s['sources']) for s in merged] == [(0, 100, ['a']), (10, 21, ['b', 'c'])]
+    with pytest.raises(ValueError):
+        merge_segments(items, policy='iou', iou_threshold=0)
+    with pytest.raises(ValueError):
+        merge_segments(items, policy='nearest')
+
+
+def test_categories_and_scores_from_structured_segments():
+    merged = merge_segments([
+        {'start': 0, 'end': 10, 'text': 'x', 'category': 'topic', 'score': 0.5},
+        {'start': 5, 'end': 12, 'text': 'y', 'category': 'example', 'score': 0.25},
+    ])
+    assert merged[0]['category'] == 'example, topic'
+    assert merged[0]['sources'] == ['topic', 'example']
+    assert merged[0]['score'] == 0.75
+
+
+@pytest.mark.parametrize('options', [
+    {'policy': 'union'},
+    {'policy': 'union', 'max_length': 20},
+    {'policy': 'union', 'max_length': 10, 'gap_tolerance': 1},
+    {'policy': 'iou'},
+    {'policy': 'iou', 'iou_threshold': 0.2, 'max_length': 30},
+    {'policy': 'iou', 'iou_threshold': 1.0},
+])
+def test_matches_reference(options):
+    rng = random.Random(7)
+    for _ in range(300):
+        items = []
+        for i in range(rng.randint(0, 30)):
+            start = round(rng.uniform(0, 100), 1)
+            length = round(rng.choice([rng.uniform(0, 5), rng.uniform(0, 40)]), 1)
+            # Unique texts, so each group's text tells how many members it has
+            items.append(segment(start, start + length, text=f"s{i}"))
+        merged = merge_segments(items, **options)
+        assert [(s['start'], s['end'], len(s['text'].split(' | '))) for s in merged] == reference_merge(items, **options)
+
+
+def test_dense_overlapping_cluster_is_fast():
+    # Every segment overlaps the next ones, which used to make each step rescan all open groups
+    items = [segment(i * 0.001, i * 0.001 + 1 + i % 7) for i in range(20000)]
+    assert len(merge_segments(items, max_length=2)) > 1000
+    assert merge_segments(items, policy='iou', iou_threshold=0.9)
@@ -0,0 +1,70 @@
+import json
+
+from agents.youtube_analizer import VideoAnalyzer
+from benchmarks.synthetic import ScriptedLLM, write_transcript
+from utils.structured_extraction import CATEGORIES, build_extraction_prompt, parse_extracted_segments
+
+
+def test_prompt_lists_real_chunk_times():
+    prompt = build_extraction_prompt([{'start': 12.0, 'end': 48.25, 'text': 'hello'}])
+    assert '[12.0s - 48.2s]\nhello' in prompt
+    assert all(f"- {category}:" in prompt for category in CATEGORIES)
+
+
+def test_parse_valid_answer_in_fences():
+    answer = '```json\n' + json.dumps({'segments': [
+        {'category': 'step', 'start': 1, 'end': 5.5, 'reason': 'installs it'},
+    ]}) + '\n```'
+    assert parse_extracted_segments(answer) == [{'start': 1.0, 'end': 5.5, 'text': 'installs it', 'category': 'step'}]
+
+
+def test_invalid_items_are_dropped_one_by_one():
+    answer = 'Sure! ' + json.dumps({'segments': [
+        {'category': 'topic', 'start': 10, 'end': 5, 'reason': 'backwards'},
+        {'category': 'gossip', 'start': 1, 'end': 2, 'reason': 'unknown category'},
+        {'category': 'example', 'start': 3, 'end': 4},
+        {'category': 'takeaway', 'start': 7, 'end': 9, 'reason': 'kept'},
+    ]}) + ' Hope this helps.'
+    assert [segment['text'] for segment in parse_extracted_segments(answer)] == ['kept']
+
+
+def test_answers_without_json():
+    assert parse_extracted_segments('I could not find anything.') == []
+    assert parse_extracted_segments('{"segments": [}') == []
+
+
+def test_structured_mode_makes_one_llm_call(tmp_path):
+    subtitle_path = tmp_path / "abcdefghijk.en.vtt"
+    write_transcript(subtitle_path, 600, rolling=True)
+
+    calls = []
+
+    class CountingLLM(ScriptedLLM):
+        def _answer(self, prompt):
+            calls.append(prompt)
+            return super()._answer(prompt)
+
+    analyzer = VideoAnalyzer(None, subtitle_path=str(subtitle_path), output_path=str(tmp_path / "analysis"),
+                             extraction_mode="structured", retrieval_mode="bm25", llm=CountingLLM(),
+                             embedding_cache_dir=None, corpus_dir=None, audio_highlights="off")
+    segments = analyzer.analyze()
+    assert len(calls) == 1
+    assert segments
+    assert all(segment['end'] > segment['start'] and segment['end'] <= 600 for segment in segments)
+    assert {segment['category'] for segment in segments} <= set(CATEGORIES)
+
+
+def test_failed_extraction_is_not_an_empty_result(tmp_path):
+    subtitle_path = tmp_path / "abcdefghijk.en.vtt"
+    write_transcript(subtitle_path, 120)
+
+    class FailingLLM(ScriptedLLM):
+        def _answer(self, prompt):
+            raise ConnectionError("LLM unavailable")
+
+    for mode in ("structured", "queries"):
+        analyzer = VideoAnalyzer(None, subtitle_path=str(subtitle_path), output_path=str(tmp_path / "analysis"),
+                                 extraction_mode=mode, retrieval_mode="bm25", llm=FailingLLM(),
+                                 queries=["a very simple example", "how it works in practice"],
+                                 embedding_cache_dir=None, corpus_dir=None, audio_highlights="off")
+        assert analyzer.analyze() is None
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.subtitle_chunker import approximate_token_count, chunk_stats, chunk_track_by_tokens
+from utils.subtitle_parser import Cue
+from utils.subtitle_track import SubtitleTrack
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def make_track(count, words_per_cue=3, cue_seconds=2.0):
+    return SubtitleTrack.from_cues(
+        Cue(i * cue_seconds, (i + 1) * cue_seconds, ' '.join(f"w{i}" for _ in range(words_per_cue)))
+        for i in range(count)
+    )
+
+
+def test_track_range_queries():
+    track = SubtitleTrack.from_cues([Cue(4.0, 6.0, "c"), Cue(0.0, 10.0, "a"), Cue(2.0, 3.0, "b")])
+    assert [cue.text for cue in track] == ["a", "b", "c"]
+    assert track.duration == 10.0
+    assert [cue.text for cue in track.cues_between(3.5, 5.0)] == ["a", "c"]
+    assert [cue.text for cue in track.cues_at(2.5)] == ["a", "b"]
+    assert track.text_between(0, 2) == "a b c"
+
+
+def test_chunks_fit_the_budget_and_cover_every_cue():
+    track = make_track(100)
+    chunks = chunk_track_by_tokens(track, max_tokens=20, count_tokens=count_words)
+    # 3 words + 1 separator per cue, so 5 cues per chunk
+    assert [chunk['tokens'] for chunk in chunks] == [20] * 20
+    assert all(chunk['tokens'] <= 20 for chunk in chunks)
+    assert ' '.join(chunk['text'] for chunk in chunks) == track.text_between(0, len(track) - 1)
+    assert chunks[0]['start'] == 0.0 and chunks[-1]['end'] == 200.0
+
+
+def test_overlap_repeats_trailing_cues():
+    chunks = chunk_track_by_tokens(make_track(20), max_tokens=20, overlap_tokens=8, count_tokens=count_words)
+    assert chunks[1]['text'].split()[:6] == chunks[0]['text'].split()[-6:]
+    with pytest.raises(ValueError):
+        chunk_track_by_tokens(make_track(2), max_tokens=10, overlap_tokens=10)
+
+
+def test_oversized_cue_and_silence_gaps():
+    track = SubtitleTrack.from_cues([
+        Cue(0.0, 1.0, "short"),
+        Cue(1.0, 2.0, "much too long for one chunk"),
+        Cue(2.0, 3.0, "after"),
+        Cue(30.0, 31.0, "later"),
+    ])
+    chunks = chunk_track_by_tokens(track, max_tokens=4, count_tokens=count_words, max_gap_seconds=5)
+    assert [chunk['text'] for chunk in chunks] == ["short", "much too long for one chunk", "after", "later"]
+    chunks = chunk_track_by_tokens(track, max_tokens=100, count_tokens=count_words, max_gap_seconds=5)
+    assert [chunk['text'] for chunk in chunks] == ["short much too long for one chunk after", "later"]
+
+
+def test_stats_and_approximate_counter():
+    assert chunk_stats([])['chunks'] == 0
+    stats = chunk_stats([{'tokens': 3}, {'tokens': 1}, {'tokens': 2}])
+    assert stats == {'chunks': 3, 'total_tokens': 6, 'min_tokens': 1, 'max_tokens': 3, 'mean_tokens': 2.0,
+                     'median_tokens': 2}
+    assert approximate_token_count("Hello, world!") == 4
+    assert chunk_track_by_tokens([]) == []
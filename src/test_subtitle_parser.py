@@ -0,0 +1,101 @@
+from utils.subtitle_parser import Cue, iter_cues, iter_cues_from_lines, load_cues, parse_timing_line, read_new_cues
+
+VTT = """WEBVTT
+Kind: captions
+Language: en
+
+NOTE This block is a comment
+that spans two lines
+
+STYLE
+::cue { color: white }
+
+intro
+00:00.500 --> 00:02.000 align:start position:0%
+Hello there
+
+00:00:02.000 --> 00:00:04.250
+General Kenobi
+you are a bold one
+
+00:00:05.000 --> 00:00:06.000
+
+"""
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+First line
+
+2
+00:01:02,05 --> 01:00:03,5
+Second line
+"""
+
+
+def test_parse_timing_line():
+    assert parse_timing_line("00:01.000 --> 00:02.500") == (1.0, 2.5)
+    assert parse_timing_line("01:02:03,004 --> 01:02:04,040 line:0%") == (3723.004, 3724.04)
+    assert parse_timing_line("Hello --> there") is None
+
+
+def test_vtt_blocks_and_cue_settings(tmp_path):
+    path = tmp_path / "video.en.vtt"
+    path.write_text(VTT, encoding='utf-8')
+    assert load_cues(str(path)) == [
+        Cue(0.5, 2.0, 'Hello there'),
+        Cue(2.0, 4.25, 'General Kenobi you are a bold one'),
+    ]
+
+
+def test_srt_indices_and_short_fractions(tmp_path):
+    path = tmp_path / "video.srt"
+    path.write_text(SRT, encoding='utf-8')
+    assert list(iter_cues(str(path))) == [
+        Cue(1.0, 2.5, 'First line'),
+        # "05" is 50 ms, "5" is 500 ms
+        Cue(62.05, 3603.5, 'Second line'),
+    ]
+
+
+def test_byte_order_mark_and_crlf(tmp_path):
+    path = tmp_path / "video.srt"
+    path.write_bytes(b'\xef\xbb\xbf' + SRT.replace('\n', '\r\n').encode('utf-8'))
+    assert [cue.text for cue in load_cues(str(path))] == ['First line', 'Second line']
+
+
+def test_whitespace_lines_and_missing_blank_line():
+    lines = [
+        "00:00:01.000 --> 00:00:02.000\n",
+        "first\n",
+        # A whitespace-only line ends a cue that has text
+        " \n",
+        "00:00:02.000 --> 00:00:03.000\n",
+        "second\n",
+        "00:00:03.000 --> 00:00:04.000\n",
+        "third\n",
+    ]
+    assert list(iter_cues_from_lines(lines)) == [
+        Cue(1.0, 2.0, 'first'),
+        Cue(2.0, 3.0, 'second'),
+        Cue(3.0, 4.0, 'third'),
+    ]
+
+
+def test_read_new_cues_from_a_growing_file(tmp_path):
+    path = tmp_path / "live.en.vtt"
+    full = ("WEBVTT\n\n" + ''.join(
+        f"00:00:{i:02d}.000 --> 00:00:{i + 1:02d}.000\nline {i}\n\n" for i in range(9)
+    )).encode('utf-8')[:-1]
+    expected = [Cue(float(i), float(i + 1), f'line {i}') for i in range(9)]
+
+    cues, offset = [], 0
+    # Cuts inside a timing line, inside a cue's text and right after one
+    for cut in (full.index(b'00:00:02') + 5, full.index(b'line 5') + 3, full.index(b'line 7\n') + 7, len(full)):
+        path.write_bytes(full[:cut])
+        new_cues, offset = read_new_cues(str(path), offset)
+        cues += new_cues
+    # The last cue has no blank line after it yet
+    assert cues == expected[:-1]
+    new_cues, offset = read_new_cues(str(path), offset, final=True)
+    assert cues + new_cues == expected
+    assert offset == len(full)
@@ -0,0 +1,49 @@
+import pytest
+
+from utils.timestamp_extractor import TranscriptSnapper, extract_timestamps, time_expression_to_seconds
+
+
+@pytest.mark.parametrize('expression, seconds', [
+    ("5:20", 320.0),
+    ("05:20.5", 320.5),
+    ("1:02:03", 3723.0),
+    ("5 minutes and 20 seconds", 320.0),
+    ("1 hour 2 mins", 3720.0),
+    ("90 seconds", 90.0),
+    ("minute 5", 300.0),
+    ("the 7-minute mark", 420.0),
+])
+def test_time_expressions(expression, seconds):
+    assert time_expression_to_seconds(expression) == seconds
+
+
+def test_ranges_points_and_lines():
+    text = ("Main topics:\n"
+            "- From 01:10 to 02:30: setting up the project\n"
+            "- At 5 minutes and 20 seconds the speaker runs the tests\n"
+            "- Around the 7 minute mark there is a demo (12:00-13:15)")
+    assert extract_timestamps(text) == [
+        (70.0, 150.0, "- From 01:10 to 02:30: setting up the project"),
+        (320.0, None, "- At 5 minutes and 20 seconds the speaker runs the tests"),
+        (420.0, None, "- Around the 7 minute mark there is a demo (12:00-13:15)"),
+        (720.0, 795.0, "- Around the 7 minute mark there is a demo (12:00-13:15)"),
+    ]
+
+
+def test_durations_are_not_timestamps():
+    assert extract_timestamps("The build takes 5 minutes and the tests 30 seconds.") == []
+    # A backwards range keeps only its start
+    assert extract_timestamps("from 3:00 to 2:00") == [(180.0, None, "from 3:00 to 2:00")]
+
+
+def test_snapper_grounds_times_to_the_transcript():
+    snapper = TranscriptSnapper(
+        cue_starts=[0.0, 4.0, 9.0, 15.0], cue_ends=[3.5, 8.0, 14.0, 20.0],
+        chunk_starts=[0.0, 9.0], chunk_ends=[8.0, 20.0],
+    )
+    assert snapper.snap(4.4, 13.0) == (4.0, 14.0)
+    # A point in time runs to the end of its chunk
+    assert snapper.snap(10.0) == (9.0, 20.0)
+    # Made-up times beyond the transcript are clamped to it
+    assert snapper.snap(100.0, 200.0) == (15.0, 20.0)
+    assert TranscriptSnapper([], [], [], []).snap(5.0) == (5.0, 5.0)
@@ -9,6 +9,8 @@ if __name__ == '__main__':
     
     # Run the analysis
     segments = analyzer.analyze()
+    if segments is None:
+        raise SystemExit('Analysis failed')
     
     # Print the results
     print(f'Found {len(segments)} important segments')
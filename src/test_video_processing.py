@@ -0,0 +1,40 @@
+import shutil
+import subprocess
+
+import pytest
+
+from utils.video_processing import extract_key_segments
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="needs ffmpeg")
+
+
+@pytest.fixture(scope='module')
+def three_scenes(tmp_path_factory):
+    """12 s of black, test pattern and white, 4 s each."""
+    path = tmp_path_factory.mktemp('scenes') / 'scenes.mp4'
+    sources = ['color=c=black:', 'testsrc=', 'color=c=white:']
+    inputs = [arg for source in sources for arg in ('-f', 'lavfi', '-i', f'{source}size=160x120:rate=10:duration=4')]
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y', *inputs,
+        '-filter_complex', 'concat=n=3:v=1:a=0', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', str(path),
+    ], check=True)
+    return str(path)
+
+
+def _bounds(segments):
+    return [(round(segment['start'], 1), round(segment['end'], 1)) for segment in segments]
+
+
+def test_single_range(three_scenes):
+    segments = extract_key_segments(three_scenes, duration=12.0)
+    assert _bounds(segments) == [(0.0, 4.0), (4.0, 8.0), (8.0, 12.0)]
+    assert segments[0]['score'] == 1.0 and all(segment['score'] > 0.3 for segment in segments[1:])
+
+
+# 4 s ranges put both cuts exactly between two ranges, 3 s ranges put them inside one
+@pytest.mark.parametrize('range_seconds', [4.0, 3.0])
+def test_split_ranges_match_single_range(three_scenes, range_seconds):
+    single = extract_key_segments(three_scenes, duration=12.0)
+    split = extract_key_segments(three_scenes, duration=12.0, range_seconds=range_seconds, max_workers=2)
+    assert _bounds(split) == _bounds(single)
+    assert [segment['score'] for segment in split] == pytest.approx([segment['score'] for segment in single])
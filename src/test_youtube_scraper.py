@@ -0,0 +1,41 @@
+import threading
+import time
+
+from agents.youtube_scraper import YouTubeScraper
+
+
+class StubScraper(YouTubeScraper):
+    """Every query finds the same five videos; each download takes 0.2 s."""
+
+    def __init__(self, tmp_path):
+        super().__init__(output_path=str(tmp_path), urls_log_file=str(tmp_path / "searches.jsonl"))
+        self.downloads = []
+        self._lock = threading.Lock()
+
+    def search(self, query, max_results=1):
+        return [f"https://youtu.be/video{i:06d}" for i in range(5)]
+
+    def _download(self, video_url, query, subtitles_only=False):
+        with self._lock:
+            self.downloads.append(video_url)
+        time.sleep(0.2)
+        return {'query': query, 'video_url': video_url}
+
+
+def test_batch_downloads_each_video_once(tmp_path):
+    scraper = StubScraper(tmp_path)
+    results = list(scraper.process_batch(['one', 'two', 'one'], top_n=5, max_download_workers=5))
+    assert sorted(result['video_url'] for result in results) == sorted(scraper.downloads)
+    assert len(scraper.downloads) == 5
+
+
+def test_stopping_early_cancels_queued_downloads(tmp_path):
+    scraper = StubScraper(tmp_path)
+    batch = scraper.process_batch(['one'], top_n=5, max_download_workers=1)
+    started = time.monotonic()
+    next(batch)
+    batch.close()
+    # Only the download running when the caller stopped may still finish
+    assert time.monotonic() - started < 0.6
+    time.sleep(0.5)
+    assert len(scraper.downloads) <= 2
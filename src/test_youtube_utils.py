@@ -0,0 +1,87 @@
+import functools
+import os
+import shutil
+import subprocess
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from utils.search_cache import SearchCache
+from utils.youtube_utils import fetch_video, get_youtube_dl
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="needs ffmpeg to generate fixture media")
+
+PAGE = """<html><head><title>Fixture lesson</title></head><body>
+<video controls src="clip.mp4"><track kind="captions" srclang="en" src="clip.vtt"></video>
+</body></html>
+"""
+SUBTITLES = "WEBVTT\n\n00:00.000 --> 00:01.000\nhello\n\n00:01.000 --> 00:02.000\nworld\n"
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """Local HTTP server with a page embedding a 2 s lavfi test video and English captions."""
+    root = tmp_path_factory.mktemp('site')
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=10', '-f', 'lavfi', '-i', 'sine=frequency=440',
+        '-t', '2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', str(root / 'clip.mp4'),
+    ], check=True)
+    (root / 'clip.vtt').write_text(SUBTITLES)
+    (root / 'lesson.html').write_text(PAGE)
+
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=str(root)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield SimpleNamespace(url=f"http://127.0.0.1:{httpd.server_address[1]}", root=root, requests=requests)
+    httpd.shutdown()
+
+
+def test_one_extraction_fetches_media_subtitles_and_info(server, tmp_path):
+    server.requests.clear()
+    result = fetch_video(f"{server.url}/lesson.html", output_path=str(tmp_path))
+    assert result.title.startswith('Fixture lesson')
+    for path in (result.video_path, result.subtitle_path, result.info_path):
+        assert path is not None and os.path.exists(path)
+    assert open(result.subtitle_path).read() == SUBTITLES
+    assert os.path.getsize(result.video_path) == os.path.getsize(server.root / 'clip.mp4')
+    # The page is fetched once for media, subtitles and metadata
+    assert server.requests.count('/lesson.html') == 1
+
+
+def test_subtitles_only(server, tmp_path):
+    result = fetch_video(f"{server.url}/lesson.html", output_path=str(tmp_path), download_media=False)
+    assert result.video_path is None
+    assert result.subtitle_path and result.info_path
+    assert not any(name.endswith('.mp4') for name in os.listdir(tmp_path))
+
+
+def test_youtube_dl_is_reused_per_thread_and_configuration(tmp_path):
+    ydl = get_youtube_dl(str(tmp_path))
+    assert get_youtube_dl(str(tmp_path)) is ydl
+    assert get_youtube_dl(str(tmp_path), download_media=False) is not ydl
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_youtube_dl(str(tmp_path))))
+    thread.start()
+    thread.join()
+    assert other[0] is not ydl
+
+
+def test_download_best_match_searches_through_the_cache(server, tmp_path):
+    from youtube_tools import download_best_match
+    cache = SearchCache(str(tmp_path / "searches.jsonl"))
+    cache.record('fixture lesson', 1, [f"{server.url}/lesson.html"])
+    video_path = download_best_match('Fixture  Lesson', output_path=str(tmp_path / "videos"), cache=cache)
+    assert os.path.getsize(video_path) == os.path.getsize(server.root / 'clip.mp4')
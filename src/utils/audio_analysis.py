@@ -0,0 +1,124 @@
+# src/utils/audio_analysis.py
+import itertools
+import math
+
+import ffmpeg
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Quietest level reported, so digital silence doesn't produce -inf
+_FLOOR_DB = -100.0
+
+
+def iter_audio_windows(video_path: str, window_seconds: float = 0.5, buffer_windows: int = 64,
+                       sample_rate: int = SAMPLE_RATE):
+    """Stream (time, rms_dbfs, zero_crossing_rate) per window of the video's audio.
+
+    ffmpeg decodes to 16-bit mono PCM on a pipe, which is read in fixed-size
+    buffers of buffer_windows windows, so memory does not depend on the length
+    of the video.
+    """
+    window_samples = int(window_seconds * sample_rate)
+    buffer_bytes = window_samples * buffer_windows * 2
+    process = (
+        ffmpeg.input(video_path)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=sample_rate, vn=None)
+        .run_async(pipe_stdout=True, quiet=True)
+    )
+    index = 0
+    try:
+        while True:
+            data = process.stdout.read(buffer_bytes)
+            windows = len(data) // (window_samples * 2)
+            if windows == 0:
+                break
+            samples = np.frombuffer(data[:windows * window_samples * 2], dtype='<i2')
+            samples = samples.reshape(windows, window_samples).astype(np.float32) / 32768.0
+            rms = np.sqrt(np.mean(samples * samples, axis=1))
+            rms_db = np.maximum(20 * np.log10(np.maximum(rms, 1e-10)), _FLOOR_DB)
+            zcr = np.mean(np.abs(np.diff(np.signbit(samples), axis=1)), axis=1)
+            for db, rate in zip(rms_db.tolist(), zcr.tolist()):
+                yield index * window_seconds, db, rate
+                index += 1
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def _close_highlight(start, end, peak_excess, speech_windows, total_windows, peak_margin_db):
+    # Louder relative to the running baseline and more speech both raise the score
+    loudness = min(1.0, peak_excess / (2 * peak_margin_db))
+    speech_ratio = speech_windows / total_windows if total_windows else 0.0
+    return {
+        'start': round(start, 3),
+        'end': round(end, 3),
+        'text': f"Audio highlight: {peak_excess:.1f} dB above baseline, {speech_ratio:.0%} speech",
+        'score': round(0.7 * loudness + 0.3 * speech_ratio, 3),
+        'query': 'audio-energy',
+    }
+
+
+def detect_audio_highlights(video_path: str, window_seconds: float = 0.5, silence_db: float = -40.0,
+                            peak_margin_db: float = 6.0, baseline_seconds: float = 60.0,
+                            smoothing_seconds: float = 2.0, merge_gap_seconds: float = 2.0,
+                            min_highlight_seconds: float = 3.0, pad_seconds: float = 1.0):
+    """Yield loudness-peak segments as soon as each one ends, in constant memory.
+
+    A window is speech when it is above silence_db and its zero-crossing rate is
+    in the voiced range. A short-term loudness average (smoothing_seconds) is
+    compared with a long-term baseline over non-silent audio (baseline_seconds);
+    stretches more than peak_margin_db above the baseline become highlights,
+    merged across gaps up to merge_gap_seconds and padded by pad_seconds.
+    Silence counts as silence_db in both averages. The baseline starts at the
+    average of the first baseline_seconds of windows, so the first loud
+    stretch after a quiet start stands out instead of becoming the baseline.
+
+    Segments use VideoAnalyzer's {'start', 'end', 'text'} format plus a score.
+    """
+    short_alpha = 1 - math.exp(-window_seconds / smoothing_seconds)
+    long_alpha = 1 - math.exp(-window_seconds / baseline_seconds)
+    windows = iter_audio_windows(video_path, window_seconds=window_seconds)
+    # At most baseline_seconds of windows are held, so memory stays constant
+    warmup = list(itertools.islice(windows, max(1, round(baseline_seconds / window_seconds))))
+    if not warmup:
+        return
+    baseline_db = sum(max(db, silence_db) for _, db, _ in warmup) / len(warmup)
+    short_db = onset = None
+
+    current = None  # [start, last_peak_end, peak_excess, speech_windows, total_windows]
+    last_time = 0.0
+    for t, db, zcr in itertools.chain(warmup, windows):
+        last_time = t + window_seconds
+        active = db > silence_db
+        is_speech = active and 0.02 < zcr < 0.35
+
+        level = max(db, silence_db)
+        short_db = level if short_db is None else short_db + short_alpha * (level - short_db)
+        if active:
+            baseline_db += long_alpha * (db - baseline_db)
+        excess = short_db - baseline_db
+        is_peak = active and excess > peak_margin_db
+        # The short-term average lags behind a sudden rise; a highlight starts where the rise did
+        if active and level - baseline_db > peak_margin_db:
+            onset = t if onset is None else onset
+        else:
+            onset = None
+
+        if current is not None and not is_peak and t - current[1] > merge_gap_seconds:
+            if current[1] - current[0] >= min_highlight_seconds:
+                yield _close_highlight(max(0.0, current[0] - pad_seconds), current[1] + pad_seconds,
+                                       current[2], current[3], current[4], peak_margin_db)
+            current = None
+
+        if is_peak:
+            if current is None:
+                current = [t if onset is None else onset, t + window_seconds, excess, 0, 0]
+            current[1] = t + window_seconds
+            current[2] = max(current[2], excess)
+        if current is not None:
+            current[3] += int(is_speech)
+            current[4] += 1
+
+    if current is not None and current[1] - current[0] >= min_highlight_seconds:
+        yield _close_highlight(max(0.0, current[0] - pad_seconds), min(last_time, current[1] + pad_seconds),
+                               current[2], current[3], current[4], peak_margin_db)
@@ -0,0 +1,124 @@
+# src/utils/bm25.py
+import asyncio
+import math
+import re
+from collections import Counter
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Words too common in spoken transcripts to tell chunks apart
+STOPWORDS = frozenset("""
+a an and are as at be but by do for from had has have he her his i if in is it its me my no not of on or our
+she so that the their them then there they this to up us was we were what when where which who will with
+you your um uh yeah okay like just
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts, held as an in-memory inverted index.
+
+    Every term maps to its (document, term frequency) postings, so a search only
+    touches the documents containing a query term.
+    """
+
+    def __init__(self, texts: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        n = len(self.doc_lengths)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[int, float]]:
+        """The top_k (doc_id, score) pairs for the query, best first; documents scoring 0 are left out."""
+        scores = {}
+        k1, b, avg_length = self.k1, self.b, self.avg_length or 1.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+class BM25Retriever(BaseRetriever):
+    """LlamaIndex retriever over nodes using BM25; needs no embeddings or network."""
+
+    def __init__(self, nodes, similarity_top_k: int = 5, **kwargs):
+        self._nodes = list(nodes)
+        self._bm25 = BM25Index([node.get_content() for node in self._nodes])
+        self.similarity_top_k = similarity_top_k
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle):
+        return [
+            NodeWithScore(node=self._nodes[doc_id], score=score)
+            for doc_id, score in self._bm25.search(query_bundle.query_str, self.similarity_top_k)
+        ]
+
+
+def _normalized(results):
+    """Min-max scale retriever scores to [0, 1] so BM25 and cosine scores can be added."""
+    if not results:
+        return {}
+    scores = [result.score or 0.0 for result in results]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return {
+        result.node.node_id: (result, (score - low) / span if span else 1.0)
+        for result, score in zip(results, scores)
+    }
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuse a vector retriever and a BM25 retriever: alpha * vector + (1 - alpha) * BM25.
+
+    Both retrievers' scores are min-max normalized per query; a node found by
+    only one of them gets 0 from the other.
+    """
+
+    def __init__(self, vector_retriever, bm25_retriever, alpha: float = 0.5, similarity_top_k: int = 5, **kwargs):
+        self.vector_retriever = vector_retriever
+        self.bm25_retriever = bm25_retriever
+        self.alpha = alpha
+        self.similarity_top_k = similarity_top_k
+        super().__init__(**kwargs)
+
+    def _fuse(self, vector_results, bm25_results):
+        vector_scores = _normalized(vector_results)
+        bm25_scores = _normalized(bm25_results)
+        fused = []
+        for node_id in {**vector_scores, **bm25_scores}:
+            result = (vector_scores.get(node_id) or bm25_scores.get(node_id))[0]
+            score = (self.alpha * vector_scores.get(node_id, (None, 0.0))[1]
+                     + (1 - self.alpha) * bm25_scores.get(node_id, (None, 0.0))[1])
+            fused.append(NodeWithScore(node=result.node, score=score))
+        fused.sort(key=lambda result: -result.score)
+        return fused[:self.similarity_top_k]
+
+    def _retrieve(self, query_bundle):
+        return self._fuse(self.vector_retriever.retrieve(query_bundle), self.bm25_retriever.retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle):
+        vector_results, bm25_results = await asyncio.gather(
+            self.vector_retriever.aretrieve(query_bundle),
+            self.bm25_retriever.aretrieve(query_bundle),
+        )
+        return self._fuse(vector_results, bm25_results)
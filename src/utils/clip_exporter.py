@@ -0,0 +1,118 @@
+# src/utils/clip_exporter.py
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# How far before a cut to look for the keyframe a stream copy will start from
+_KEYFRAME_SEARCH_SECONDS = 20
+
+
+def previous_keyframe(source: str, t: float) -> float:
+    """Time of the last video keyframe at or before t, or t itself if it can't be probed.
+
+    Only a short window before t is read, so this stays cheap on long videos.
+    """
+    window_start = max(0.0, t - _KEYFRAME_SEARCH_SECONDS)
+    try:
+        probe = ffmpeg.probe(
+            source,
+            select_streams='v:0',
+            skip_frame='nokey',
+            show_entries='frame=pts_time',
+            read_intervals=f'{window_start}%{t + 0.5}',
+        )
+    except (ffmpeg.Error, FileNotFoundError) as e:
+        logger.warning("Could not probe keyframes of %s, cutting at %s: %s", source, t, e)
+        return t
+    keyframes = [float(frame['pts_time']) for frame in probe.get('frames', []) if 'pts_time' in frame]
+    candidates = [kf for kf in keyframes if kf <= t + 1e-3]
+    return max(candidates) if candidates else t
+
+
+def export_clip(source: str, start: float, end: float, output: str, precise: bool = False) -> dict:
+    """Cut [start, end) out of source into output.
+
+    By default the clip is stream-copied (no re-encode) from the keyframe at or
+    before start, so it may begin slightly early; the actual start is returned.
+    precise=True re-encodes to cut at exactly start.
+    """
+    if precise:
+        stream = ffmpeg.input(source, ss=start).output(
+            output, t=end - start, vcodec='libx264', acodec='aac', preset='veryfast', movflags='+faststart',
+        )
+        actual_start = start
+    else:
+        actual_start = previous_keyframe(source, start)
+        stream = ffmpeg.input(source, ss=actual_start).output(
+            output, t=end - actual_start, c='copy', avoid_negative_ts='make_zero',
+        )
+    stream.overwrite_output().run(quiet=True)
+    return {'path': output, 'start': actual_start, 'end': end}
+
+
+def _export_clip_job(job):
+    source, start, end, output, precise = job
+    try:
+        return export_clip(source, start, end, output, precise=precise)
+    except ffmpeg.Error as e:
+        stderr = e.stderr.decode(errors='replace') if e.stderr else ''
+        logger.error("Error exporting clip %s: %s", output, stderr[-500:])
+        return None
+
+
+def export_clips(source: str, segments: list[dict], output_dir: str, precise: bool = False,
+                 max_workers: int | None = None) -> list[dict]:
+    """Export every segment from VideoAnalyzer.analyze() as a clip, in parallel processes.
+
+    Returns one {'path', 'start', 'end', 'text'} dict per exported clip, in segment order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    base, ext = os.path.splitext(os.path.basename(source))
+    # A stream copy must keep the source container; a re-encode always produces mp4
+    ext = '.mp4' if precise else ext
+    jobs = []
+    for i, segment in enumerate(segments):
+        if segment['end'] <= segment['start']:
+            continue
+        output = os.path.join(output_dir, f"{base}_{i:03d}_{segment['start']:.0f}-{segment['end']:.0f}{ext}")
+        jobs.append(((source, float(segment['start']), float(segment['end']), output, precise), segment))
+    if not jobs:
+        return []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_export_clip_job, [job for job, _ in jobs]))
+
+    clips = []
+    for result, (_, segment) in zip(results, jobs):
+        if result is not None:
+            clips.append({**result, 'text': segment.get('text', '')})
+    return clips
+
+
+def concat_clips(clip_paths: list[str], output: str) -> str:
+    """Join clips into one highlight reel with the concat demuxer (stream copy, no re-encode)."""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as list_file:
+        for path in clip_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    try:
+        ffmpeg.input(list_file.name, format='concat', safe=0).output(output, c='copy').overwrite_output().run(quiet=True)
+    finally:
+        os.remove(list_file.name)
+    return output
+
+
+def make_test_video(output: str, duration: float = 10, size: str = '320x240', rate: int = 25,
+                    keyframe_interval: int = 50) -> str:
+    """Generate a synthetic video with audio from ffmpeg's lavfi sources, for offline tests."""
+    video = ffmpeg.input(f'testsrc=duration={duration}:size={size}:rate={rate}', f='lavfi')
+    audio = ffmpeg.input(f'sine=frequency=440:duration={duration}', f='lavfi')
+    ffmpeg.output(
+        video, audio, output, vcodec='libx264', acodec='aac', g=keyframe_interval, pix_fmt='yuv420p',
+    ).overwrite_output().run(quiet=True)
+    return output
@@ -0,0 +1,369 @@
+# src/utils/corpus_index.py
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+logger = logging.getLogger(__name__)
+
+# vectors.f32, nodes.jsonl and texts.txt, and their compacted generations (vectors.2.f32, ...)
+_DATA_FILE_PATTERN = re.compile(r'^(?:vectors(?:\.\d+)?\.f32|nodes(?:\.\d+)?\.jsonl|texts(?:\.\d+)?\.txt)$')
+
+
+class CorpusIndex:
+    """One persistent vector index over the subtitle chunks of every analyzed video.
+
+    vectors.f32 is a memory-mapped float32 matrix of unit-normalized chunk
+    embeddings; each video's chunks occupy a few contiguous blocks of rows (one,
+    unless chunks were appended over time), so a query filtered to some videos
+    only scores their rows and its cost does not grow with the library. A query over the whole library is one matrix-vector
+    product. Chunk metadata (video_id, start, end) is in nodes.jsonl and the
+    text in texts.txt, both append-only; manifest.json records how much of each
+    file is committed and which rows belong to which video, and is written last
+    so an interrupted insert is rolled back on the next open. Inserts from
+    several processes are serialized with a file lock and each one first
+    catches up with what the others committed.
+
+    Adding a video whose fingerprint (subtitles, chunking, embedding model) is
+    unchanged is a no-op; a changed video gets new rows and its old ones are
+    dropped from the manifest. append_chunks() adds rows to a video that is
+    still growing (live captions). Once more than compact_dead_fraction of the
+    rows belong to replaced videos, the live rows are copied into files of the
+    next generation and the old files are removed.
+
+    search() reloads the manifest when another process committed since, so a
+    long-lived reader sees videos added elsewhere without being reopened.
+    """
+
+    def __init__(self, corpus_dir: str, model_name: str, compact_dead_fraction: float = 0.5):
+        self.corpus_dir = corpus_dir
+        self.model_name = model_name
+        self.compact_dead_fraction = compact_dead_fraction
+        self.manifest_path = os.path.join(corpus_dir, 'manifest.json')
+        self.lock_path = os.path.join(corpus_dir, '.lock')
+        os.makedirs(corpus_dir, exist_ok=True)
+        self._texts_fd = None
+        self._lock = threading.Lock()
+        with self._lock, self._file_lock():
+            self._load()
+
+    def _set_generation(self, generation):
+        """Point the data paths at the files of a generation; generation 0 keeps the original names."""
+        self.generation = generation
+        suffix = f'.{generation}' if generation else ''
+        self.vectors_path = os.path.join(self.corpus_dir, f'vectors{suffix}.f32')
+        self.nodes_path = os.path.join(self.corpus_dir, f'nodes{suffix}.jsonl')
+        self.texts_path = os.path.join(self.corpus_dir, f'texts{suffix}.txt')
+
+    def _remove_stale_files(self, keep=()):
+        """Delete data files of every generation but the ones in keep."""
+        for name in os.listdir(self.corpus_dir):
+            path = os.path.join(self.corpus_dir, name)
+            if _DATA_FILE_PATTERN.match(name) and path not in keep:
+                os.remove(path)
+
+    def _file_lock(self):
+        lock_file = open(self.lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        return lock_file
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        self._stamp = self._manifest_stamp()
+        self.dim = None
+        self.count = 0
+        self.videos = {}  # video_id -> {'fingerprint', 'blocks': [[first, last], ...]}
+        self._rows = []  # row -> (video_id, start, end, text offset, text length)
+        self._vectors = None
+        self._live = np.zeros(0, dtype=bool)
+        if self._texts_fd is not None:
+            os.close(self._texts_fd)
+            self._texts_fd = None
+        if not os.path.exists(self.manifest_path):
+            # Only an interrupted first insert can have left files behind
+            self._set_generation(0)
+            self._remove_stale_files()
+            return
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest['model_name'] != self.model_name:
+            raise ValueError(f"Corpus in {self.corpus_dir} was built with {manifest['model_name']}, not {self.model_name}")
+        self._set_generation(manifest.get('generation', 0))
+        # Files of earlier generations, or of a compaction that was interrupted before its manifest
+        self._remove_stale_files(keep=(self.vectors_path, self.nodes_path, self.texts_path))
+        self.dim = manifest['dim']
+        self.count = manifest['count']
+        self.videos = manifest['videos']
+        # Drop anything an interrupted insert wrote past the committed sizes
+        for path, size in ((self.nodes_path, manifest['nodes_bytes']), (self.texts_path, manifest['texts_bytes'])):
+            with open(path, 'ab') as f:
+                f.truncate(size)
+        # Opened with the manifest, so texts stay readable after a compaction in another process removes the file
+        self._texts_fd = os.open(self.texts_path, os.O_RDONLY)
+        with open(self.nodes_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                node = json.loads(line)
+                self._rows.append((node['video_id'], node['start'], node['end'], node['offset'], node['length']))
+        self._open_vectors()
+        self._update_live()
+
+    def _capacity(self):
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def _open_vectors(self):
+        if self.dim is None:
+            return
+        rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(rows, self.dim)) if rows else None
+
+    def _grow(self, needed):
+        rows = self._capacity()
+        if self.count + needed <= rows:
+            return
+        new_rows = max(self.count + needed, rows * 2, 1024)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(new_rows * self.dim * 4)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(new_rows, self.dim))
+
+    def _update_live(self):
+        live = np.zeros(self.count, dtype=bool)
+        for video in self.videos.values():
+            for first, last in video['blocks']:
+                live[first:last] = True
+        self._live = live
+
+    def _save_manifest(self):
+        manifest = {
+            'model_name': self.model_name,
+            'generation': self.generation,
+            'dim': self.dim,
+            'count': self.count,
+            'nodes_bytes': os.path.getsize(self.nodes_path),
+            'texts_bytes': os.path.getsize(self.texts_path),
+            'videos': self.videos,
+        }
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._stamp = self._manifest_stamp()
+
+    def __len__(self):
+        return int(self._live.sum())
+
+    def has_video(self, video_id: str, fingerprint=None) -> bool:
+        video = self.videos.get(video_id)
+        return video is not None and (fingerprint is None or video['fingerprint'] == fingerprint)
+
+    def add_video(self, video_id: str, chunks: list[dict], embeddings: list[list[float]], fingerprint=None):
+        """Store one video's chunks ({'start', 'end', 'text'}) and their embeddings, replacing older rows."""
+        if self._commit(video_id, chunks, embeddings, fingerprint, replace=True):
+            logger.info("Added %d chunks of %s to corpus (%d videos)", len(chunks), video_id, len(self.videos))
+
+    def append_chunks(self, video_id: str, chunks: list[dict], embeddings: list[list[float]], fingerprint=None):
+        """Add chunks to a video already in the corpus (or a new one), keeping its existing rows."""
+        self._commit(video_id, chunks, embeddings, fingerprint, replace=False)
+
+    def _commit(self, video_id, chunks, embeddings, fingerprint, replace):
+        if len(chunks) != len(embeddings):
+            raise ValueError("Need one embedding per chunk")
+        with self._lock, self._file_lock():
+            if self._manifest_stamp() != self._stamp:
+                # Another process committed since we loaded
+                self._load()
+            if replace and self.has_video(video_id, fingerprint):
+                return False
+
+            first = self.count
+            if chunks:
+                vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1)
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embeddings of size {vectors.shape[1]}, corpus holds size {self.dim}")
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors /= np.where(norms == 0, 1, norms)
+                self._grow(len(chunks))
+                self._vectors[first:first + len(chunks)] = vectors
+                self._vectors.flush()
+            texts_offset = os.path.getsize(self.texts_path) if os.path.exists(self.texts_path) else 0
+            new_rows = []
+            with open(self.texts_path, 'ab') as texts, open(self.nodes_path, 'a', encoding='utf-8') as nodes:
+                for chunk in chunks:
+                    data = chunk['text'].encode('utf-8')
+                    texts.write(data)
+                    row = (video_id, chunk['start'], chunk['end'], texts_offset, len(data))
+                    nodes.write(json.dumps({
+                        'video_id': video_id, 'start': chunk['start'], 'end': chunk['end'],
+                        'offset': texts_offset, 'length': len(data),
+                    }) + '\n')
+                    texts_offset += len(data)
+                    new_rows.append(row)
+            if self._texts_fd is None:
+                # The first insert into an empty corpus created the file
+                self._texts_fd = os.open(self.texts_path, os.O_RDONLY)
+            self._rows.extend(new_rows)
+            self.count += len(chunks)
+            video = self.videos.get(video_id)
+            if replace or video is None:
+                video = self.videos[video_id] = {'fingerprint': fingerprint, 'blocks': []}
+            video['fingerprint'] = fingerprint
+            if chunks:
+                blocks = video['blocks']
+                if blocks and blocks[-1][1] == first:
+                    # Nothing else was inserted in between; extend the last block
+                    blocks[-1][1] = self.count
+                else:
+                    blocks.append([first, self.count])
+            self._save_manifest()
+            self._update_live()
+            if self.count and 1 - len(self) / self.count > self.compact_dead_fraction:
+                self._compact()
+        return True
+
+    def _compact(self):
+        """Copy the live rows, video by video, into next-generation files; commits by replacing the manifest."""
+        dead = self.count - len(self)
+        old_files = (self.vectors_path, self.nodes_path, self.texts_path)
+        old_vectors = self._vectors
+        old_rows = self._rows
+        texts_fd = self._texts_fd
+        self._set_generation(self.generation + 1)
+
+        live = len(self)
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='w+', shape=(live, self.dim)) if live else None
+        if vectors is None:
+            open(self.vectors_path, 'wb').close()
+        videos = {}
+        row = 0
+        texts_offset = 0
+        with open(self.texts_path, 'wb') as texts, open(self.nodes_path, 'w', encoding='utf-8') as nodes:
+            for video_id, video in self.videos.items():
+                first_row = row
+                for first, last in video['blocks']:
+                    vectors[row:row + last - first] = old_vectors[first:last]
+                    row += last - first
+                    for old_row in range(first, last):
+                        _, start, end, offset, length = old_rows[old_row]
+                        texts.write(os.pread(texts_fd, length, offset))
+                        nodes.write(json.dumps({
+                            'video_id': video_id, 'start': start, 'end': end,
+                            'offset': texts_offset, 'length': length,
+                        }) + '\n')
+                        texts_offset += length
+                videos[video_id] = {'fingerprint': video['fingerprint'],
+                                    'blocks': [[first_row, row]] if row > first_row else []}
+        if vectors is not None:
+            vectors.flush()
+            del vectors
+
+        self.count = live
+        self.videos = videos
+        self._save_manifest()
+        for path in old_files:
+            os.remove(path)
+        # Other processes keep reading the old files they have open until they reload
+        self._load()
+        logger.info("Compacted corpus %s: dropped %d replaced rows, %d left", self.corpus_dir, dead, live)
+
+    def _text(self, row):
+        _, _, _, offset, length = self._rows[row]
+        return os.pread(self._texts_fd, length, offset).decode('utf-8')
+
+    def node(self, row: int) -> TextNode:
+        video_id, start, end, _, _ = self._rows[row]
+        return TextNode(
+            id_=f"{video_id}:{row}",
+            text=self._text(row),
+            metadata={'video_id': video_id, 'start': start, 'end': end},
+            excluded_embed_metadata_keys=['video_id', 'start', 'end'],
+        )
+
+    def nodes(self, video_id: str, min_start=None) -> list[TextNode]:
+        """A video's chunks in row order; min_start keeps those starting at or after it."""
+        video = self.videos.get(video_id)
+        if video is None:
+            return []
+        return [self.node(row) for first, last in video['blocks'] for row in range(first, last)
+                if min_start is None or self._rows[row][1] >= min_start]
+
+    def search(self, query_embedding, top_k: int = 5, video_ids=None, min_start=None) -> list[tuple[int, float]]:
+        """The top_k (row, cosine similarity) pairs, best first.
+
+        video_ids limits the search to those videos, min_start to chunks starting at or after it.
+        """
+        if self._manifest_stamp() != self._stamp:
+            with self._lock, self._file_lock():
+                # Another process committed or compacted since we loaded
+                if self._manifest_stamp() != self._stamp:
+                    self._load()
+        if self._vectors is None or not self.count:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        if video_ids is None:
+            # Score every row in place and drop replaced ones, rather than copying the live rows out
+            scores = self._vectors[:self.count] @ query
+            rows = np.flatnonzero(self._live)
+            scores = scores[rows]
+        else:
+            blocks = [block for video_id in video_ids if video_id in self.videos
+                      for block in self.videos[video_id]['blocks']]
+            if not blocks:
+                return []
+            rows = np.concatenate([np.arange(first, last) for first, last in blocks])
+            scores = np.concatenate([self._vectors[first:last] @ query for first, last in blocks])
+        if min_start is not None:
+            keep = np.fromiter((self._rows[row][1] >= min_start for row in rows), dtype=bool, count=len(rows))
+            rows, scores = rows[keep], scores[keep]
+        if not len(scores):
+            return []
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def as_retriever(self, embed_model, video_ids=None, similarity_top_k: int = 5, min_start=None):
+        return CorpusRetriever(self, embed_model, video_ids=video_ids, similarity_top_k=similarity_top_k,
+                               min_start=min_start)
+
+
+class CorpusRetriever(BaseRetriever):
+    """LlamaIndex retriever over a CorpusIndex, restricted to video_ids or across the whole library."""
+
+    def __init__(self, corpus: CorpusIndex, embed_model, video_ids=None, similarity_top_k: int = 5,
+                 min_start=None, **kwargs):
+        self.corpus = corpus
+        self.min_start = min_start
+        self.embed_model = embed_model
+        self.video_ids = list(video_ids) if video_ids is not None else None
+        self.similarity_top_k = similarity_top_k
+        super().__init__(**kwargs)
+
+    def _results(self, query_embedding):
+        return [
+            NodeWithScore(node=self.corpus.node(row), score=score)
+            for row, score in self.corpus.search(query_embedding, self.similarity_top_k, self.video_ids, self.min_start)
+        ]
+
+    def _retrieve(self, query_bundle):
+        return self._results(self.embed_model.get_query_embedding(query_bundle.query_str))
+
+    async def _aretrieve(self, query_bundle):
+        return self._results(await self.embed_model.aget_query_embedding(query_bundle.query_str))
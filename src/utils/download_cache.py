@@ -0,0 +1,147 @@
+# src/utils/download_cache.py
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from utils.file_hash import file_sha256
+
+logger = logging.getLogger(__name__)
+
+_VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_PATH_PREFIXES = ('shorts', 'embed', 'live', 'v', 'e')
+
+
+def normalize_video_id(url_or_id: str) -> str | None:
+    """Canonical YouTube video ID for any watch/short/embed/youtu.be URL or a bare ID."""
+    url_or_id = url_or_id.strip()
+    if _VIDEO_ID_PATTERN.match(url_or_id):
+        return url_or_id
+    parsed = urlparse(url_or_id if '://' in url_or_id else f'https://{url_or_id}')
+    host = (parsed.hostname or '').lower()
+    parts = [part for part in parsed.path.split('/') if part]
+
+    candidate = None
+    if host.endswith('youtu.be') and parts:
+        candidate = parts[0]
+    elif host.endswith('youtube.com') or host.endswith('youtube-nocookie.com'):
+        if parts and parts[0] == 'watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        elif len(parts) >= 2 and parts[0] in _PATH_PREFIXES:
+            candidate = parts[1]
+    if candidate and _VIDEO_ID_PATTERN.match(candidate):
+        return candidate
+    return None
+
+
+class DownloadCache:
+    """Manifest of completed downloads in an output directory, keyed by video ID.
+
+    manifest.json records the size, modification time and SHA-256 of every
+    artifact (video, subtitles, info JSON). A lookup only succeeds when all
+    requested artifacts are still on disk and intact; broken ones are deleted so
+    the next download fetches them again. Subtitles and info JSON are small and
+    re-hashed on every lookup; media is only re-hashed when its modification
+    time changed (or always, with verify_checksums=True), and a changed size
+    fails without hashing.
+    """
+
+    ARTIFACTS = ('video_path', 'subtitle_path', 'info_path')
+
+    def __init__(self, output_path: str, verify_checksums: bool = False):
+        self.output_path = output_path
+        self.manifest_path = os.path.join(output_path, 'manifest.json')
+        # Hashing unchanged media on every hit is opt-in since videos can be large
+        self.verify_checksums = verify_checksums
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning("Error reading download manifest, starting empty: %s", e)
+            return {}
+
+    def _save(self):
+        os.makedirs(self.output_path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _intact(self, name, artifact):
+        """Whether an artifact is still on disk as recorded; refreshes its mtime once its hash checked out."""
+        try:
+            stat = os.stat(artifact['path'])
+        except FileNotFoundError:
+            return False
+        if stat.st_size != artifact['size']:
+            return False
+        unchanged = artifact.get('mtime_ns') == stat.st_mtime_ns
+        if name == 'video_path' and unchanged and not self.verify_checksums:
+            return True
+        if file_sha256(artifact['path']) != artifact['sha256']:
+            return False
+        artifact['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def get(self, video_id: str, need_media: bool = True):
+        """Return the cached entry for video_id, or None if it must be (re)fetched."""
+        with self._lock:
+            entry = self._entries.get(video_id)
+        if entry is None:
+            return None
+        required = ['subtitle_path', 'info_path'] + (['video_path'] if need_media else [])
+        broken = False
+        refreshed = False
+        for name in self.ARTIFACTS:
+            artifact = entry['artifacts'].get(name)
+            if artifact is None:
+                # A video without captions is still complete; missing media is not when it is needed
+                broken = broken or (name == 'video_path' and need_media)
+                continue
+            mtime_ns = artifact.get('mtime_ns')
+            if self._intact(name, artifact):
+                refreshed = refreshed or artifact.get('mtime_ns') != mtime_ns
+            else:
+                logger.warning("Cached %s for %s is missing or corrupt, re-fetching", name, video_id)
+                if os.path.exists(artifact['path']):
+                    os.remove(artifact['path'])
+                with self._lock:
+                    entry['artifacts'].pop(name, None)
+                    self._save()
+                if name in required:
+                    broken = True
+        if refreshed:
+            with self._lock:
+                self._save()
+        if broken:
+            return None
+        return entry
+
+    def record(self, result):
+        """Store the artifacts of a DownloadResult with their sizes, modification times and checksums."""
+        artifacts = {}
+        for name in self.ARTIFACTS:
+            path = getattr(result, name)
+            if path and os.path.exists(path):
+                stat = os.stat(path)
+                artifacts[name] = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                   'sha256': file_sha256(path)}
+        with self._lock:
+            previous = self._entries.get(result.video_id, {}).get('artifacts', {})
+            # Keep media recorded by an earlier full download when this was a subtitle-only fetch
+            self._entries[result.video_id] = {
+                'artifacts': {**previous, **artifacts},
+                'title': result.title,
+                'duration': result.duration,
+                'completed_at': time.time(),
+            }
+            self._save()
@@ -0,0 +1,275 @@
+# src/utils/embedding_cache.py
+import fcntl
+import hashlib
+import heapq
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from utils.instrumentation import incr
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_key(model_name, text):
+    """Content address of an embedding: hash of the model name and the exact text."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache: a memory-mapped float32 matrix plus a JSON key index.
+
+    vectors.f32 holds one row per cached embedding; index.json maps each key to
+    its row and a last-used tick. When max_entries is reached the least recently
+    used row is overwritten. Several processes may share one cache_dir: writers
+    hold an exclusive file lock and readers a shared one, and each first reloads
+    index.json if another process replaced it, so rows are never handed out
+    twice or read after being reused for another key.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 100_000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(cache_dir, 'vectors.f32')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.lock_path = os.path.join(cache_dir, '.lock')
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        with self._lock, self._file_lock(shared=True):
+            self._load()
+
+    def _file_lock(self, shared=False):
+        lock_file = open(self.lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        return lock_file
+
+    def _index_stamp(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        # index.json is replaced, never rewritten in place, so a new inode means a new version
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        self._stamp = self._index_stamp()
+        self.dim = None
+        self._slots = {}  # key -> [row, last_used]
+        self._free_rows = []
+        self._clock = 0
+        self._vectors = None
+        if self._stamp is None:
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            self.dim = data['dim']
+            self._slots = data['slots']
+            self._clock = data['clock']
+            self._open_vectors()
+        except Exception as e:
+            logger.warning("Error loading embedding cache, starting empty: %s", e)
+            self.dim = None
+            self._slots = {}
+            self._clock = 0
+            self._vectors = None
+
+    def _sync(self):
+        """Reload the index if another process committed since we last read or wrote it."""
+        if self._index_stamp() != self._stamp:
+            self._load()
+
+    def _rows(self):
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def _disk_rows(self):
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        return size // (self.dim * 4)
+
+    def _open_vectors(self):
+        rows = self._disk_rows()
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(rows, self.dim)) if rows else None
+        used = {row for row, _ in self._slots.values()}
+        self._free_rows = [row for row in range(rows) if row not in used]
+
+    def _grow(self, needed):
+        # Another process may have grown the file already; never shrink it under its memmap
+        rows = max(self._rows(), self._disk_rows())
+        new_rows = max(rows, min(self.max_entries, max(rows + needed, rows * 2, 1024)))
+        if new_rows <= self._rows():
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        if new_rows > self._disk_rows():
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(new_rows * self.dim * 4)
+        old_rows = self._rows()
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(new_rows, self.dim))
+        used = {row for row, _ in self._slots.values()}
+        self._free_rows.extend(row for row in range(new_rows - 1, old_rows - 1, -1) if row not in used)
+
+    def _take_rows(self, count):
+        """Reserve count rows, growing the matrix and then evicting least recently used entries."""
+        if len(self._free_rows) < count:
+            self._grow(count - len(self._free_rows))
+        short = count - len(self._free_rows)
+        if short > 0:
+            for key in heapq.nsmallest(short, self._slots, key=lambda key: self._slots[key][1]):
+                self._free_rows.append(self._slots.pop(key)[0])
+            self.evictions += short
+        return [self._free_rows.pop() for _ in range(min(count, len(self._free_rows)))]
+
+    def __len__(self):
+        return len(self._slots)
+
+    def get_many(self, model_name, texts):
+        """Return cached vectors for texts (None for misses), counting hits and misses."""
+        results = []
+        hits = 0
+        with self._lock, self._file_lock(shared=True):
+            self._sync()
+            for text in texts:
+                slot = self._slots.get(embedding_key(model_name, text))
+                if slot is None:
+                    results.append(None)
+                    continue
+                hits += 1
+                self._clock += 1
+                slot[1] = self._clock
+                results.append(self._vectors[slot[0]].tolist())
+        self.hits += hits
+        self.misses += len(texts) - hits
+        incr('cache_hits', hits, cache='embedding')
+        incr('cache_misses', len(texts) - hits, cache='embedding')
+        return results
+
+    def put_many(self, model_name, texts, embeddings):
+        if not texts:
+            return
+        with self._lock, self._file_lock():
+            self._sync()
+            if self.dim is None:
+                self.dim = len(embeddings[0])
+            new_entries = {}
+            for text, embedding in zip(texts, embeddings):
+                if len(embedding) != self.dim:
+                    logger.warning("Not caching embedding of size %d, cache holds size %d", len(embedding), self.dim)
+                    continue
+                key = embedding_key(model_name, text)
+                if key not in self._slots:
+                    new_entries[key] = embedding
+            # Never store more than the cache can hold; the last ones are the most recent
+            keys = list(new_entries)[-self.max_entries:]
+            for key, row in zip(keys, self._take_rows(len(keys))):
+                self._vectors[row] = np.asarray(new_entries[key], dtype=np.float32)
+                self._clock += 1
+                self._slots[key] = [row, self._clock]
+            self._save()
+
+    def flush(self):
+        """Write the index, including last-used ticks, unless another process changed it since."""
+        with self._lock, self._file_lock():
+            if self._index_stamp() == self._stamp:
+                self._save()
+
+    def _save(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'dim': self.dim, 'clock': self._clock, 'slots': self._slots}, f)
+        os.replace(tmp_path, self.index_path)
+        self._stamp = self._index_stamp()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._slots),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that answers from an EmbeddingCache and only sends misses."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _split(self, namespace, texts):
+        cached = self._cache.get_many(namespace, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        return cached, missing
+
+    def _merge(self, namespace, texts, cached, missing, embeddings):
+        self._cache.put_many(namespace, [texts[i] for i in missing], embeddings)
+        for i, embedding in zip(missing, embeddings):
+            cached[i] = embedding
+        return cached
+
+    def _get_text_embeddings(self, texts):
+        cached, missing = self._split(self.model_name, texts)
+        if not missing:
+            return cached
+        embeddings = self._embed_model.get_text_embedding_batch([texts[i] for i in missing])
+        return self._merge(self.model_name, texts, cached, missing, embeddings)
+
+    async def _aget_text_embeddings(self, texts):
+        cached, missing = self._split(self.model_name, texts)
+        if not missing:
+            return cached
+        embeddings = await self._embed_model.aget_text_embedding_batch([texts[i] for i in missing])
+        return self._merge(self.model_name, texts, cached, missing, embeddings)
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text):
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query):
+        namespace = f"{self.model_name}:query"
+        cached, missing = self._split(namespace, [query])
+        if not missing:
+            return cached[0]
+        embedding = self._embed_model.get_query_embedding(query)
+        return self._merge(namespace, [query], cached, missing, [embedding])[0]
+
+    async def _aget_query_embedding(self, query):
+        namespace = f"{self.model_name}:query"
+        cached, missing = self._split(namespace, [query])
+        if not missing:
+            return cached[0]
+        embedding = await self._embed_model.aget_query_embedding(query)
+        return self._merge(namespace, [query], cached, missing, [embedding])[0]
@@ -0,0 +1,282 @@
+# src/utils/instrumentation.py
+"""Per-stage timing spans, counters and log setup for the whole pipeline.
+
+Metrics are off unless VIDEO_METRICS=1 is set or enable() is called; while
+off, span() returns a shared no-op context manager and incr() returns
+immediately, so instrumented code pays for one global lookup and a call.
+
+    with span('embedding'):
+        embeddings = embed_model.get_text_embedding_batch(texts)
+    incr('cache_hits', cache='search')
+
+A span records how often a stage ran and its total and longest wall time.
+Spans of concurrent work (queries, pipeline workers) overlap, so their totals
+can add up to more than the run took. report() returns everything as a dict
+(write_report() saves it as JSON) and prometheus_text() renders it in the
+Prometheus text exposition format, e.g. for the node exporter's textfile
+collector.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+_enabled = os.getenv('VIDEO_METRICS', '') not in ('', '0')
+_lock = threading.Lock()
+_spans = {}  # name -> [count, total seconds, max seconds]
+_counters = {}  # (name, ((label, value), ...)) -> value
+_started_at = time.time()
+_llama_index_handler = None
+
+
+def enable(enabled: bool = True):
+    global _enabled
+    _enabled = enabled
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Drop everything recorded so far and restart the run clock."""
+    global _started_at
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _started_at = time.time()
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            stats = _spans.get(self.name)
+            if stats is None:
+                _spans[self.name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """Context manager timing one run of the stage name (sync or async code alike)."""
+    return _Span(name) if _enabled else _NOOP_SPAN
+
+
+def incr(name: str, value: float = 1, **labels):
+    """Add value to the counter name, e.g. incr('bytes_downloaded', size) or incr('api_calls', service='llm')."""
+    if not _enabled or not value:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def snapshot() -> dict:
+    """Raw spans and counters, picklable, for merge() in another process."""
+    with _lock:
+        return {'spans': {name: list(stats) for name, stats in _spans.items()}, 'counters': dict(_counters)}
+
+
+def merge(other: dict):
+    """Add a snapshot() taken in a worker process to this process's metrics."""
+    with _lock:
+        for name, (count, total, longest) in other['spans'].items():
+            stats = _spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += count
+            stats[1] += total
+            stats[2] = max(stats[2], longest)
+        for key, value in other['counters'].items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def report() -> dict:
+    """The run so far: wall time, per-span count/total/mean/max seconds, and every counter."""
+    with _lock:
+        spans = {
+            name: {
+                'count': count,
+                'total_seconds': round(total, 6),
+                'mean_seconds': round(total / count, 6),
+                'max_seconds': round(longest, 6),
+            }
+            for name, (count, total, longest) in sorted(_spans.items())
+        }
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        started_at = _started_at
+    return {
+        'started_at': started_at,
+        'wall_seconds': round(time.time() - started_at, 3),
+        'spans': spans,
+        'counters': counters,
+    }
+
+
+def _atomic_write(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_report(path: str):
+    _atomic_write(path, json.dumps(report(), indent=4))
+
+
+def _metric_name(prefix, name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', f"{prefix}_{name}")
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+
+def prometheus_text(prefix: str = 'video_agent') -> str:
+    """Every span and counter in the Prometheus text exposition format."""
+    with _lock:
+        spans = sorted(_spans.items())
+        counters = sorted(_counters.items())
+    lines = []
+    if spans:
+        for suffix, kind, help_text, field in (
+            ('span_seconds_total', 'counter', 'Wall time spent in each stage', 1),
+            ('span_runs_total', 'counter', 'Times each stage ran', 0),
+            ('span_seconds_max', 'gauge', 'Longest single run of each stage', 2),
+        ):
+            metric = _metric_name(prefix, suffix)
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in spans:
+                lines.append(f"{metric}{_label_text((('span', name),))} {stats[field]:g}")
+    by_name = {}
+    for (name, labels), value in counters:
+        by_name.setdefault(name, []).append((labels, value))
+    for name, series in by_name.items():
+        metric = _metric_name(prefix, f"{name}_total")
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in series:
+            lines.append(f"{metric}{_label_text(labels)} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path: str, prefix: str = 'video_agent'):
+    _atomic_write(path, prometheus_text(prefix))
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(level: str | None = None, json_format: bool | None = None):
+    """Send log records to stderr at level (LOG_LEVEL, default INFO), as text or JSON lines (LOG_FORMAT=json).
+
+    Library code only logs; entry points call this once. Without it Python
+    shows warnings and errors only.
+    """
+    level = (level or os.getenv('LOG_LEVEL') or 'INFO').upper()
+    if json_format is None:
+        json_format = os.getenv('LOG_FORMAT', '').lower() == 'json'
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(_JsonFormatter() if json_format else
+                         logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def instrument_llama_index():
+    """Count LLM and embedding API calls, and LLM token usage, made anywhere inside LlamaIndex.
+
+    Does nothing while metrics are off; safe to call more than once.
+    """
+    global _llama_index_handler
+    if not _enabled or _llama_index_handler is not None:
+        return
+    from llama_index.core.instrumentation import get_dispatcher
+    from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+    from llama_index.core.instrumentation.events.embedding import EmbeddingStartEvent
+    from llama_index.core.instrumentation.events.llm import (
+        LLMChatEndEvent, LLMChatStartEvent, LLMCompletionEndEvent, LLMCompletionStartEvent,
+    )
+
+    # LLM calls in progress in this thread or task; acomplete() of many LLMs is built on complete()
+    depth = contextvars.ContextVar('llm_call_depth', default=0)
+
+    class MetricsEventHandler(BaseEventHandler):
+        @classmethod
+        def class_name(cls) -> str:
+            return "MetricsEventHandler"
+
+        def handle(self, event, **kwargs):
+            if isinstance(event, EmbeddingStartEvent):
+                # Wrappers such as CachedEmbedding emit events too; only the model that calls the API counts
+                if event.model_dict.get('class_name') != 'CachedEmbedding':
+                    incr('api_calls', service='embedding')
+            elif isinstance(event, (LLMChatStartEvent, LLMCompletionStartEvent)):
+                depth.set(depth.get() + 1)
+            elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                depth.set(max(depth.get() - 1, 0))
+                if depth.get():
+                    return
+                incr('api_calls', service='llm')
+                raw = getattr(event.response, 'raw', None)
+                usage = raw.get('usage') if isinstance(raw, dict) else getattr(raw, 'usage', None)
+                for kind in ('prompt_tokens', 'completion_tokens'):
+                    tokens = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+                    if tokens:
+                        incr('tokens', tokens, kind=kind.split('_')[0])
+
+    with _lock:
+        if _llama_index_handler is None:
+            _llama_index_handler = MetricsEventHandler()
+            get_dispatcher().add_event_handler(_llama_index_handler)
@@ -0,0 +1,110 @@
+# src/utils/rolling_captions.py
+import html
+import re
+
+from utils.subtitle_parser import Cue
+
+# Inline VTT markup: <c>, </c>, <c.colorE5E5E5>, <00:00:01.439>, <i>, ...
+_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+# How many already-emitted words are kept to look for overlaps
+_TAIL_WORDS = 64
+
+
+def clean_cue_text(text):
+    """Strip inline tags and entities from cue text and normalize whitespace."""
+    return ' '.join(html.unescape(_TAG_PATTERN.sub('', text)).split())
+
+
+def _overlap(tail, words):
+    """Length of the longest suffix of tail that is also a prefix of words."""
+    for k in range(min(len(tail), len(words)), 0, -1):
+        if tail[-k:] == words[:k]:
+            return k
+    return 0
+
+
+class RollingCaptionDeduper:
+    """State of dedupe_rolling_cues() kept between calls, for transcripts that arrive in pieces.
+
+    feed() returns the cues that are final so far; the last one stays pending
+    since the next cue may still extend it. flush() returns it at the end of the
+    stream. to_dict()/from_dict() let the state survive a restart.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = {} if stats is None else stats
+        for key in ('cues_before', 'cues_after', 'chars_before', 'chars_after'):
+            self.stats.setdefault(key, 0)
+        self.pending = None
+        self.tail = []
+
+    def _emit(self):
+        cue = Cue(self.pending[0], self.pending[1], ' '.join(self.pending[2]))
+        self.stats['cues_after'] += 1
+        self.stats['chars_after'] += len(cue.text)
+        return cue
+
+    def feed(self, cues):
+        finished = []
+        for start, end, text in cues:
+            self.stats['cues_before'] += 1
+            self.stats['chars_before'] += len(text)
+            words = clean_cue_text(text).split()
+            if not words:
+                continue
+
+            pending = self.pending
+            k = _overlap(self.tail, words) if pending is not None else 0
+            if pending is not None and k < len(pending[2]):
+                k = 0
+            new_words = words[k:]
+
+            if not new_words:
+                pending[1] = max(pending[1], end)
+                continue
+
+            if pending is not None:
+                finished.append(self._emit())
+            self.pending = [start, end, new_words]
+            self.tail = (self.tail + new_words)[-_TAIL_WORDS:]
+        return finished
+
+    def flush(self):
+        if self.pending is None:
+            return []
+        cue = self._emit()
+        self.pending = None
+        return [cue]
+
+    def to_dict(self):
+        return {'pending': self.pending, 'tail': self.tail}
+
+    @classmethod
+    def from_dict(cls, data, stats=None):
+        deduper = cls(stats)
+        # Copied, since feed() extends the pending cue in place and data may be needed again
+        deduper.pending = list(data['pending']) if data['pending'] is not None else None
+        deduper.tail = list(data['tail'])
+        return deduper
+
+
+def dedupe_rolling_cues(cues, stats=None):
+    """Collapse YouTube rolling auto-captions into cues that each carry only new text.
+
+    Rolling captions repeat the previous cue's line at the top of every cue and
+    add 10 ms "transition" cues that only repeat text. An overlap is only removed
+    when it covers all the text the previous cue added, which is that signature;
+    ordinary subtitles that happen to repeat a few words are left alone. Cues
+    with nothing new extend the end time of the cue still on screen, so timing
+    stays accurate.
+
+    If a stats dict is given it is filled with cues_before/cues_after and
+    chars_before/chars_after as the generator is consumed.
+    """
+    if stats is not None:
+        stats.update(cues_before=0, cues_after=0, chars_before=0, chars_after=0)
+    deduper = RollingCaptionDeduper(stats)
+    for cue in cues:
+        yield from deduper.feed((cue,))
+    yield from deduper.flush()
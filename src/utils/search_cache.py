@@ -0,0 +1,90 @@
+# src/utils/search_cache.py
+import fcntl
+import json
+import os
+import threading
+import time
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+class SearchCache:
+    """TTL cache of YouTube search results on top of an append-only JSONL log.
+
+    Every search is appended as one line, so history is never lost and several
+    threads or processes can record results at once (appends are serialized with
+    an exclusive file lock). Lines written by other processes are picked up on the
+    next lookup. A cached search also answers later ones for the same normalized
+    query asking for fewer results. Searches that found nothing are only trusted
+    for empty_ttl_seconds, since that is often a transient failure.
+    """
+
+    def __init__(self, log_path: str, ttl_seconds: float = 24 * 3600, empty_ttl_seconds: float = 300):
+        self.log_path = log_path
+        self.ttl_seconds = ttl_seconds
+        self.empty_ttl_seconds = empty_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._latest = {}  # normalized query -> newest record
+        self._offset = 0
+
+    def _fresh(self, record):
+        ttl = self.ttl_seconds if record['urls'] else self.empty_ttl_seconds
+        return time.time() - record['ts'] <= ttl
+
+    def _refresh(self):
+        """Read lines appended since the last refresh."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line.endswith('\n'):
+                    # Missing or half-written last line; read it again next time
+                    break
+                self._offset = f.tell()
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                previous = self._latest.get(record['key'])
+                # Keep the newest record, unless it has fewer results than a still fresh older one
+                if (previous is None or record['max_results'] >= previous['max_results']
+                        or not self._fresh(previous)):
+                    self._latest[record['key']] = record
+
+    def get(self, query: str, max_results: int):
+        """Cached URLs for the query if a fresh enough search returned at least as many results."""
+        with self._lock:
+            self._refresh()
+            record = self._latest.get(normalize_query(query))
+            if record is None or record['max_results'] < max_results or not self._fresh(record):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return record['urls'][:max_results]
+
+    def record(self, query: str, max_results: int, urls: list[str]):
+        record = {
+            'ts': time.time(),
+            'query': query,
+            'key': normalize_query(query),
+            'max_results': max_results,
+            'urls': urls,
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.write(line)
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,141 @@
+# src/utils/segment_merger.py
+import heapq
+from bisect import bisect_left
+from itertools import count
+
+MERGE_POLICIES = ('union', 'iou')
+
+
+def _iou(a_start, a_end, b_start, b_end):
+    intersection = min(a_end, b_end) - max(a_start, b_start)
+    if intersection <= 0:
+        return 0.0
+    return intersection / (max(a_end, b_end) - min(a_start, b_start))
+
+
+def _source(segment):
+    return segment.get('query') or segment.get('category') or 'unknown'
+
+
+class _Group:
+    __slots__ = ('start', 'end', 'members', 'open')
+
+    def __init__(self, segment):
+        self.start = segment['start']
+        self.end = segment['end']
+        self.members = [segment]
+        self.open = True
+
+    def add(self, segment):
+        self.end = max(self.end, segment['end'])
+        self.members.append(segment)
+
+    def to_segment(self):
+        sources = []
+        texts = []
+        for member in self.members:
+            for source in member.get('sources') or [_source(member)]:
+                if source not in sources:
+                    sources.append(source)
+            if member['text'] and member['text'] not in texts:
+                texts.append(member['text'])
+        merged = {
+            'start': self.start,
+            'end': self.end,
+            'text': ' | '.join(texts),
+            'sources': sources,
+            'score': round(sum(member.get('score', 1.0) for member in self.members), 3),
+        }
+        categories = sorted({member['category'] for member in self.members if member.get('category')})
+        if categories:
+            merged['category'] = categories[0] if len(categories) == 1 else ', '.join(categories)
+        return merged
+
+
+def merge_segments(segments, policy='union', iou_threshold=0.5, max_length=None, gap_tolerance=0.0):
+    """Merge overlapping segments from all queries in one sorted sweep.
+
+    Segments are sorted by start once; a cluster is a run of segments that
+    overlap (or are within gap_tolerance seconds of) each other.
+
+    policy='union' merges a whole cluster into one segment. policy='iou' only
+    merges a segment into an open group of the cluster when their
+    intersection-over-union is at least iou_threshold, so nested or slightly
+    overlapping segments stay separate; the most recently started group that
+    qualifies wins. With max_length, a group never grows past that many seconds;
+    the segment that would exceed it starts a new group.
+
+    Each result keeps its provenance in 'sources' (the queries or categories
+    that produced it) and a 'score' that sums its members' scores (1 each by
+    default), so segments found by several queries rank higher.
+
+    After the sort, 'union' is linear. 'iou' keeps the open groups in a heap by
+    end so finished ones are dropped in O(log n), and only compares a segment
+    with the open groups that started close enough before it to reach the
+    threshold.
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy: {policy}")
+    if policy == 'iou' and not 0 < iou_threshold <= 1:
+        raise ValueError("iou_threshold must be in (0, 1]")
+    if not segments:
+        return []
+
+    ordered = sorted(segments, key=lambda segment: (segment['start'], segment['end']))
+    groups = []
+    # union: a new group is only started when the segment can't join the last one that can
+    # still grow (is not already over max_length), so that group always ends furthest and
+    # is the only one that can take the next segment
+    growable = None
+    # iou: open groups in start order (closed ones are skipped, then compacted away),
+    # and a heap of (end, sequence, group) to find the ones that have ended
+    open_groups = []
+    closed = 0
+    ends = []
+    sequence = count()
+
+    for segment in ordered:
+        start, end = segment['start'], segment['end']
+        if policy == 'union':
+            candidates = [growable] if growable is not None else []
+        else:
+            while ends and ends[0][0] < start:
+                group_end, _, group = heapq.heappop(ends)
+                if group.end > group_end:
+                    # The group grew since it was pushed
+                    heapq.heappush(ends, (group.end, next(sequence), group))
+                else:
+                    group.open = False
+                    closed += 1
+            if closed > len(open_groups) // 2:
+                open_groups = [group for group in open_groups if group.open]
+                closed = 0
+            # IoU >= t needs the group to start at most (end - start) * (1/t - 1) before this segment
+            earliest = start - (end - start) * (1 / iou_threshold - 1) - 1e-9
+            lo = bisect_left(open_groups, earliest, key=lambda group: group.start)
+            candidates = (group for group in reversed(open_groups[lo:]) if group.open)
+
+        target = None
+        for group in candidates:
+            if max_length is not None and max(group.end, end) - group.start > max_length:
+                continue
+            if policy == 'union' and start <= group.end + gap_tolerance:
+                target = group
+                break
+            if policy == 'iou' and _iou(group.start, group.end, start, end) >= iou_threshold:
+                target = group
+                break
+
+        if target is None:
+            target = _Group(segment)
+            groups.append(target)
+            if policy == 'union':
+                if max_length is None or end - start <= max_length:
+                    growable = target
+            else:
+                open_groups.append(target)
+                heapq.heappush(ends, (end, next(sequence), target))
+        else:
+            target.add(segment)
+
+    return [group.to_segment() for group in groups]
@@ -0,0 +1,85 @@
+# src/utils/structured_extraction.py
+import json
+import logging
+import re
+from typing import Literal, get_args
+
+from llama_index.core.bridge.pydantic import BaseModel, Field, ValidationError, model_validator
+
+logger = logging.getLogger(__name__)
+
+Category = Literal['topic', 'step', 'takeaway', 'example']
+CATEGORIES = get_args(Category)
+
+
+class ExtractedSegment(BaseModel):
+    category: Category
+    start: float = Field(ge=0)
+    end: float = Field(ge=0)
+    reason: str = Field(min_length=1)
+
+    @model_validator(mode='after')
+    def check_order(self):
+        if self.end <= self.start:
+            raise ValueError('end must be after start')
+        return self
+
+
+PROMPT_TEMPLATE = """You are given transcript excerpts from a video. Each excerpt has its real start and end time in seconds.
+
+{excerpts}
+
+Find the important segments of the video:
+- topic: main topics or concepts explained
+- step: key steps or processes demonstrated
+- takeaway: summaries or key takeaways stated by the speaker
+- example: important examples or demonstrations
+
+Only use times inside the excerpts above. Answer with JSON only, no prose, in exactly this shape:
+{{"segments": [{{"category": "topic", "start": 12.0, "end": 48.5, "reason": "why this segment matters"}}]}}
+"""
+
+_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def build_extraction_prompt(chunks):
+    """Prompt listing each retrieved chunk with its start/end metadata."""
+    excerpts = '\n\n'.join(
+        f"[{chunk['start']:.1f}s - {chunk['end']:.1f}s]\n{chunk['text']}" for chunk in chunks
+    )
+    return PROMPT_TEMPLATE.format(excerpts=excerpts)
+
+
+def parse_extracted_segments(response_text):
+    """Parse and validate the model's JSON answer into VideoAnalyzer segment dicts.
+
+    Items that fail the schema are dropped individually; an answer that is not
+    JSON at all yields no segments.
+    """
+    text = _FENCE_PATTERN.sub('', response_text.strip())
+    # Tolerate chatter around the JSON object
+    first, last = text.find('{'), text.rfind('}')
+    if first == -1 or last == -1:
+        logger.warning("Structured extraction returned no JSON: %s", response_text[:200])
+        return []
+    try:
+        data = json.loads(text[first:last + 1])
+    except json.JSONDecodeError as e:
+        logger.warning("Structured extraction returned invalid JSON: %s", e)
+        return []
+
+    items = data.get('segments', []) if isinstance(data, dict) else []
+    segments = []
+    for item in items:
+        try:
+            segment = ExtractedSegment.model_validate(item)
+        except ValidationError as e:
+            logger.info("Dropping invalid segment %s: %s", item, e.errors()[0]['msg'])
+            continue
+        segments.append({
+            'start': segment.start,
+            'end': segment.end,
+            'text': segment.reason,
+            'category': segment.category,
+        })
+    return segments
@@ -0,0 +1,108 @@
+# src/utils/subtitle_chunker.py
+import logging
+import re
+
+from utils.subtitle_track import SubtitleTrack
+
+logger = logging.getLogger(__name__)
+
+# Encoding used by OpenAI's text-embedding-ada-002 / text-embedding-3-* models
+DEFAULT_ENCODING = "cl100k_base"
+
+_tokenizers = {}
+# Rough stand-in for BPE tokens: words and single punctuation marks
+_APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_count(text):
+    return len(_APPROX_TOKEN_PATTERN.findall(text))
+
+
+def get_token_counter(encoding_name=DEFAULT_ENCODING):
+    """Return a function counting tokens with tiktoken, cached per encoding.
+
+    tiktoken downloads its encoding files on first use; when that isn't possible
+    (offline CI) token counts are approximated from words and punctuation.
+    """
+    if encoding_name not in _tokenizers:
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning("Could not load tiktoken encoding %s, approximating token counts: %s", encoding_name, e)
+            _tokenizers[encoding_name] = approximate_token_count
+        else:
+            _tokenizers[encoding_name] = lambda text: len(encoding.encode(text, disallowed_special=()))
+    return _tokenizers[encoding_name]
+
+
+def chunk_track_by_tokens(track, max_tokens=512, overlap_tokens=0, count_tokens=None, max_gap_seconds=None):
+    """Pack consecutive cues into chunks of at most max_tokens tokens.
+
+    Each cue is tokenized once. When a chunk is full the next one starts with
+    the trailing cues of the previous chunk worth up to overlap_tokens. A cue
+    that alone exceeds the budget becomes its own chunk. If max_gap_seconds is
+    set, a silence longer than that also closes the chunk.
+
+    Returns a list of {'start', 'end', 'text', 'tokens'} dicts.
+    """
+    if not isinstance(track, SubtitleTrack):
+        track = SubtitleTrack.from_cues(track)
+    if not track:
+        return []
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    if count_tokens is None:
+        count_tokens = get_token_counter()
+
+    starts, ends = track.starts, track.ends
+    # +1 for the space that joins a cue to the previous one
+    cue_tokens = [count_tokens(track.text(i)) + 1 for i in range(len(track))]
+
+    chunks = []
+
+    def close(first, last, tokens):
+        chunks.append({
+            'start': starts[first],
+            'end': max(ends[first:last + 1]),
+            'text': track.text_between(first, last),
+            'tokens': tokens,
+        })
+
+    first = 0
+    tokens = cue_tokens[0]
+    for i in range(1, len(track)):
+        gap_break = max_gap_seconds is not None and starts[i] - ends[i - 1] > max_gap_seconds
+        if not gap_break and tokens + cue_tokens[i] <= max_tokens:
+            tokens += cue_tokens[i]
+            continue
+
+        close(first, i - 1, tokens)
+
+        # Carry trailing cues over into the next chunk, never the whole previous chunk
+        new_first, tokens = i, cue_tokens[i]
+        if overlap_tokens and not gap_break:
+            while (new_first - 1 > first
+                   and tokens + cue_tokens[new_first - 1] <= max_tokens
+                   and tokens - cue_tokens[i] + cue_tokens[new_first - 1] <= overlap_tokens):
+                new_first -= 1
+                tokens += cue_tokens[new_first]
+        first = new_first
+
+    close(first, len(track) - 1, tokens)
+    return chunks
+
+
+def chunk_stats(chunks):
+    """Summary of a chunking run, for tuning the token budget."""
+    tokens = sorted(chunk['tokens'] for chunk in chunks)
+    if not tokens:
+        return {'chunks': 0, 'total_tokens': 0, 'min_tokens': 0, 'max_tokens': 0, 'mean_tokens': 0, 'median_tokens': 0}
+    return {
+        'chunks': len(tokens),
+        'total_tokens': sum(tokens),
+        'min_tokens': tokens[0],
+        'max_tokens': tokens[-1],
+        'mean_tokens': round(sum(tokens) / len(tokens), 1),
+        'median_tokens': tokens[len(tokens) // 2],
+    }
@@ -0,0 +1,120 @@
+# src/utils/subtitle_parser.py
+import logging
+import re
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Compact cue record: start/end in seconds, text with the cue's lines joined by spaces
+Cue = namedtuple('Cue', ['start', 'end', 'text'])
+
+# Matches both VTT ("00:01.000", "00:00:01.000") and SRT ("00:00:01,000") timing lines.
+# Anything after the end time (VTT cue settings like "align:start position:0%") is ignored.
+_TIMING_PATTERN = re.compile(
+    r'^\s*(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?\s*-->\s*'
+    r'(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?'
+)
+
+# Blocks in a VTT file that never contain cues
+_SKIPPED_BLOCKS = ('WEBVTT', 'NOTE', 'STYLE', 'REGION')
+
+
+def _to_seconds(hours, minutes, seconds, fraction):
+    total = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    if fraction:
+        # "5" means 500 ms, "05" means 50 ms
+        total += int(fraction.ljust(3, '0')) / 1000.0
+    return float(total)
+
+
+def parse_timing_line(line):
+    """Return (start, end) in seconds for a cue timing line, or None if it isn't one."""
+    match = _TIMING_PATTERN.match(line)
+    if not match:
+        return None
+    g = match.groups()
+    return _to_seconds(*g[0:4]), _to_seconds(*g[4:8])
+
+
+def iter_cues_from_lines(lines):
+    """Parse VTT or SRT cues from any iterable of lines in a single pass.
+
+    Header, NOTE, STYLE and REGION blocks are skipped, as are SRT sequence numbers
+    and VTT cue identifiers. Cues without text are dropped.
+    """
+    timing = None
+    text_lines = []
+    skipping = False
+    block_start = True
+
+    for line in lines:
+        raw = line.rstrip('\r\n')
+        line = raw.strip()
+
+        # YouTube auto-captions pad cues with whitespace-only lines; those only
+        # end a cue once it has text, a truly empty line always does.
+        if not raw or (not line and text_lines):
+            if timing and text_lines:
+                yield Cue(timing[0], timing[1], ' '.join(text_lines))
+            timing = None
+            text_lines = []
+            skipping = False
+            block_start = True
+            continue
+
+        if skipping or not line:
+            continue
+
+        if block_start and line.startswith(_SKIPPED_BLOCKS):
+            skipping = True
+            continue
+        block_start = False
+
+        if '-->' in line:
+            parsed = parse_timing_line(line)
+            if parsed is None:
+                logger.warning("Error parsing subtitle line: %s", line)
+                continue
+            # Tolerate files that are missing the blank line between cues
+            if timing and text_lines:
+                yield Cue(timing[0], timing[1], ' '.join(text_lines))
+            timing = parsed
+            text_lines = []
+        elif timing:
+            text_lines.append(line)
+        # Lines before the timing line are SRT indices or VTT cue identifiers
+
+    if timing and text_lines:
+        yield Cue(timing[0], timing[1], ' '.join(text_lines))
+
+
+def iter_cues(subtitle_path, encoding='utf-8-sig'):
+    """Yield cues from a .vtt or .srt file, reading it incrementally."""
+    with open(subtitle_path, 'r', encoding=encoding, errors='replace') as f:
+        yield from iter_cues_from_lines(f)
+
+
+def load_cues(subtitle_path, encoding='utf-8-sig'):
+    """Load every cue from a subtitle file into a list."""
+    return list(iter_cues(subtitle_path, encoding=encoding))
+
+
+def read_new_cues(subtitle_path, offset=0, final=False):
+    """Parse the cues appended to a growing subtitle file since byte offset.
+
+    Only complete blocks (ended by an empty line) are parsed, so a cue that is
+    still being written is left for the next call; final=True parses whatever
+    is left once the file is known to be finished. Returns (cues, new_offset).
+    """
+    with open(subtitle_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    if final:
+        complete = data
+    else:
+        boundary = max(data.rfind(b'\n\n'), data.rfind(b'\n\r\n'))
+        if boundary < 0:
+            return [], offset
+        complete = data[:data.index(b'\n', boundary + 1) + 1]
+    text = complete.decode('utf-8-sig' if offset == 0 else 'utf-8', errors='replace')
+    return list(iter_cues_from_lines(text.splitlines(keepends=True))), offset + len(complete)
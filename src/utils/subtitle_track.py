@@ -0,0 +1,88 @@
+# src/utils/subtitle_track.py
+from array import array
+from bisect import bisect_left, bisect_right
+
+from utils.subtitle_parser import Cue
+
+
+class SubtitleTrack:
+    """Time-indexed, array-backed store for subtitle cues.
+
+    Start and end times live in contiguous float arrays and all cue texts share a
+    single string buffer (joined by spaces) addressed by offsets, so a 10-hour
+    transcript costs a few bytes per cue plus its text. Cues are kept sorted by
+    start time and lookups use binary search.
+    """
+
+    def __init__(self, starts, ends, text_buffer, offsets):
+        self.starts = starts
+        self.ends = ends
+        self._buffer = text_buffer
+        # offsets[i] is where cue i's text begins; it ends one separator before offsets[i + 1]
+        self._offsets = offsets
+        # Running maximum of end times, so "which cues are still on screen at t"
+        # can be answered by bisection even when cues overlap
+        self._max_ends = array('d')
+        running = float('-inf')
+        for end in ends:
+            running = max(running, end)
+            self._max_ends.append(running)
+
+    @classmethod
+    def from_cues(cls, cues):
+        """Build a track from any iterable of (start, end, text) cues."""
+        cues = [cue for cue in cues if cue[2]]
+        if any(cues[i][0] > cues[i + 1][0] for i in range(len(cues) - 1)):
+            cues.sort(key=lambda cue: cue[0])
+
+        starts = array('d', (cue[0] for cue in cues))
+        ends = array('d', (cue[1] for cue in cues))
+        offsets = array('Q', [0])
+        for cue in cues:
+            offsets.append(offsets[-1] + len(cue[2]) + 1)
+        return cls(starts, ends, ' '.join(cue[2] for cue in cues), offsets)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('cue index out of range')
+        return Cue(self.starts[i], self.ends[i], self.text(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Cue(self.starts[i], self.ends[i], self.text(i))
+
+    @property
+    def duration(self):
+        return self._max_ends[-1] if len(self) else 0.0
+
+    def text(self, i):
+        return self._buffer[self._offsets[i]:self._offsets[i + 1] - 1]
+
+    def text_between(self, first, last):
+        """Text of cues first..last (inclusive) joined by spaces, as one slice of the buffer."""
+        return self._buffer[self._offsets[first]:self._offsets[last + 1] - 1]
+
+    def index_range(self, start, end):
+        """Indices (lo, hi) of the cues overlapping [start, end); some in between may not overlap."""
+        lo = bisect_right(self._max_ends, start)
+        hi = bisect_left(self.starts, end)
+        return lo, max(lo, hi)
+
+    def cues_between(self, start, end):
+        """All cues overlapping the time range [start, end)."""
+        lo, hi = self.index_range(start, end)
+        return [self[i] for i in range(lo, hi) if self.ends[i] > start]
+
+    def cues_at(self, t):
+        """Cues being said at time t."""
+        lo = bisect_right(self._max_ends, t)
+        hi = bisect_right(self.starts, t)
+        return [self[i] for i in range(lo, hi) if self.ends[i] > t]
+
+    def text_between_times(self, start, end):
+        return ' '.join(cue.text for cue in self.cues_between(start, end))
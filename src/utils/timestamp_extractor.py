@@ -0,0 +1,108 @@
+# src/utils/timestamp_extractor.py
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+# "1:02:03", "5:20", "05:20.5". Two parts are always minutes:seconds.
+_CLOCK = r'\d{1,3}(?::\d{2}){1,2}(?:\.\d+)?'
+# "1 hour 2 minutes", "5 minutes and 20 seconds", "90 seconds", "5 min 3 s"
+_SPOKEN = (
+    r'\d+\s*(?:hours?|hrs?)(?:\s*(?:and\s*)?\d+\s*(?:minutes?|mins?))?(?:\s*(?:and\s*)?\d+\s*(?:seconds?|secs?))?'
+    r'|\d+\s*(?:minutes?|mins?)(?:\s*(?:and\s*)?\d+\s*(?:seconds?|secs?))?'
+    r'|\d+\s*(?:seconds?|secs?)'
+)
+# "minute 5", "the 5 minute mark", "5-minute mark"
+_MARK = r'minute\s+\d+|\d+[\s-]*minute\s+mark'
+_TIME = rf'(?:{_CLOCK}|{_SPOKEN}|{_MARK})\b'
+
+# Single alternation scanned once over the whole response
+_TIMESTAMP_PATTERN = re.compile(
+    rf'(?P<prefix>\b(?:at|around|from|between|starting|near|by)\s+(?:the\s+)?)?'
+    rf'\(?(?P<start>{_TIME})\)?'
+    rf'(?:\s*(?:to|until|till|through|-|–|—|and)\s*(?:the\s+)?\(?(?P<end>{_TIME})\)?)?',
+    re.IGNORECASE,
+)
+_CLOCK_PATTERN = re.compile(rf'^{_CLOCK}$')
+_UNIT_PATTERN = re.compile(r'(\d+)\s*(h|m|s)', re.IGNORECASE)
+_MARK_NUMBER_PATTERN = re.compile(r'\d+')
+_UNIT_SECONDS = {'h': 3600, 'm': 60, 's': 1}
+
+
+def time_expression_to_seconds(expression):
+    """Seconds for a clock ("1:02:03", "5:20"), spoken ("5 minutes 20 seconds") or mark ("minute 5") time."""
+    expression = expression.strip()
+    if _CLOCK_PATTERN.match(expression):
+        total = 0.0
+        for part in expression.split(':'):
+            total = total * 60 + float(part)
+        return total
+    if 'mark' in expression.lower() or expression.lower().startswith('minute'):
+        return float(_MARK_NUMBER_PATTERN.search(expression).group()) * 60
+    return float(sum(int(value) * _UNIT_SECONDS[unit.lower()] for value, unit in _UNIT_PATTERN.findall(expression)))
+
+
+def extract_timestamps(text):
+    """Find every timestamp or time range in a response in one scan.
+
+    Returns (start, end, line) tuples in order of appearance; end is None for a
+    single point in time. Spoken durations such as "5 minutes" only count as a
+    time when introduced by "at", "from", ... or used in a range, so "takes 5
+    minutes" is not mistaken for a timestamp.
+    """
+    results = []
+    for match in _TIMESTAMP_PATTERN.finditer(text):
+        start_expression, end_expression = match.group('start'), match.group('end')
+        is_clock = _CLOCK_PATTERN.match(start_expression.strip()) is not None
+        is_mark = 'mark' in start_expression.lower() or start_expression.lower().startswith('minute')
+        if not (is_clock or is_mark or match.group('prefix') or end_expression):
+            continue
+
+        line_start = text.rfind('\n', 0, match.start()) + 1
+        line_end = text.find('\n', match.end())
+        line = text[line_start:line_end if line_end != -1 else len(text)].strip()
+
+        start = time_expression_to_seconds(start_expression)
+        end = time_expression_to_seconds(end_expression) if end_expression else None
+        if end is not None and end <= start:
+            end = None
+        results.append((start, end, line))
+    return results
+
+
+class TranscriptSnapper:
+    """Snaps times from LLM answers onto real transcript boundaries with binary search.
+
+    Starts snap to the nearest cue start and ends to the nearest cue end. A single
+    point in time ends where the subtitle chunk containing it ends.
+    """
+
+    def __init__(self, cue_starts, cue_ends, chunk_starts, chunk_ends):
+        self.cue_starts = array('d', sorted(cue_starts))
+        self.cue_ends = array('d', sorted(cue_ends))
+        order = sorted(range(len(chunk_starts)), key=lambda i: chunk_starts[i])
+        self.chunk_starts = array('d', (chunk_starts[i] for i in order))
+        self.chunk_ends = array('d', (chunk_ends[i] for i in order))
+
+    @staticmethod
+    def _nearest(values, t):
+        i = bisect_left(values, t)
+        if i == 0:
+            return values[0]
+        if i == len(values):
+            return values[-1]
+        return values[i] if values[i] - t < t - values[i - 1] else values[i - 1]
+
+    def snap(self, start, end=None):
+        if not self.cue_starts:
+            return start, end if end is not None else start
+        start = self._nearest(self.cue_starts, start)
+        if end is not None:
+            end = self._nearest(self.cue_ends, end)
+        elif self.chunk_starts:
+            i = max(0, bisect_right(self.chunk_starts, start) - 1)
+            end = self.chunk_ends[i]
+        if end is None or end <= start:
+            # Fall back to the first cue that ends after the start
+            i = bisect_right(self.cue_ends, start)
+            end = self.cue_ends[min(i, len(self.cue_ends) - 1)]
+        return start, end
@@ -0,0 +1,149 @@
+# src/utils/video_processing.py
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import ffmpeg
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_BINS = 32
+# Frames decoded and scored per NumPy batch
+_BATCH_FRAMES = 256
+
+
+def probe_duration(video_path: str) -> float | None:
+    try:
+        return float(ffmpeg.probe(video_path)['format']['duration'])
+    except (ffmpeg.Error, FileNotFoundError, KeyError, ValueError) as e:
+        logger.warning("Could not probe duration of %s: %s", video_path, e)
+        return None
+
+
+def _histograms(frames: np.ndarray) -> np.ndarray:
+    """Normalized grey-level histograms of a (N, pixels) uint8 batch, in one bincount."""
+    n, pixels = frames.shape
+    bins = (frames >> (8 - int(math.log2(HISTOGRAM_BINS)))).astype(np.int64)
+    bins += np.arange(n, dtype=np.int64)[:, None] * HISTOGRAM_BINS
+    counts = np.bincount(bins.ravel(), minlength=n * HISTOGRAM_BINS).reshape(n, HISTOGRAM_BINS)
+    return counts / pixels
+
+
+def _change_scores(frames: np.ndarray, hists: np.ndarray) -> np.ndarray:
+    """Score in [0, 1] between each frame and the next: histogram distance blended with pixel difference."""
+    hist_distance = 0.5 * np.abs(np.diff(hists, axis=0)).sum(axis=1)
+    pixel_distance = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=1) / 255.0
+    return 0.5 * hist_distance + 0.5 * pixel_distance
+
+
+def _scan_range(job):
+    """Decode [start, start + length) at low resolution and score consecutive frames.
+
+    Returns the frame times, the scores between consecutive frames and the first
+    and last frames, so the caller can score across range boundaries.
+    """
+    video_path, start, length, sample_rate, width, height = job
+    frame_size = width * height
+    input_kwargs = {'ss': start}
+    if length is not None:
+        input_kwargs['t'] = length
+    process = (
+        ffmpeg.input(video_path, **input_kwargs)
+        .filter('fps', fps=sample_rate)
+        .filter('scale', width, height)
+        .output('pipe:', format='rawvideo', pix_fmt='gray')
+        .run_async(pipe_stdout=True, quiet=True)
+    )
+
+    scores = []
+    count = 0
+    first_frame = previous = None
+    try:
+        while True:
+            data = process.stdout.read(frame_size * _BATCH_FRAMES)
+            usable = len(data) - len(data) % frame_size
+            if usable == 0:
+                break
+            frames = np.frombuffer(data[:usable], dtype=np.uint8).reshape(-1, frame_size)
+            if previous is not None:
+                # Carry the last frame of the previous batch so no pair is skipped
+                frames = np.vstack([previous, frames])
+            elif first_frame is None:
+                first_frame = frames[0].copy()
+            scores.append(_change_scores(frames, _histograms(frames)))
+            count += len(frames) - (1 if previous is not None else 0)
+            previous = frames[-1:].copy()
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    times = start + np.arange(count) / sample_rate
+    scores = np.concatenate(scores) if scores else np.empty(0)
+    last_frame = previous[0] if previous is not None else None
+    return times, scores, first_frame, last_frame
+
+
+def extract_key_segments(video_path: str, sample_rate: float = 2.0, threshold: float = 0.3,
+                         min_scene_seconds: float = 1.0, width: int = 64, height: int = 36,
+                         range_seconds: float = 300.0, max_workers: int | None = None,
+                         duration: float | None = None) -> list:
+    """Split a video into scenes at detected cuts.
+
+    Frames are decoded by ffmpeg at width x height in grey at sample_rate frames
+    per second. Consecutive frames get a change score (histogram distance blended
+    with mean pixel difference, both vectorized in NumPy); a score above threshold
+    is a cut. Long videos are split into range_seconds pieces decoded in parallel
+    worker processes.
+
+    Returns [{"start", "end", "score"}], one per scene; score is the strength of
+    the cut that opens the scene (1.0 for the first scene).
+    """
+    if duration is None:
+        duration = probe_duration(video_path)
+    if duration is None:
+        ranges = [(0.0, None)]
+    else:
+        count = max(1, math.ceil(duration / range_seconds))
+        ranges = [(i * range_seconds, min(range_seconds, duration - i * range_seconds)) for i in range(count)]
+
+    jobs = [(video_path, start, length, sample_rate, width, height) for start, length in ranges]
+    if len(jobs) == 1:
+        results = [_scan_range(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_scan_range, jobs))
+
+    all_times = []
+    all_scores = []
+    previous_last = None
+    for times, scores, first_frame, last_frame in results:
+        if not len(times):
+            continue
+        if previous_last is not None:
+            # Score the pair that straddles two ranges
+            pair = np.vstack([previous_last, first_frame])
+            all_scores.append(_change_scores(pair, _histograms(pair)))
+        all_times.append(times)
+        all_scores.append(scores)
+        previous_last = last_frame
+
+    if not all_times:
+        return []
+    times = np.concatenate(all_times)
+    scores = np.concatenate(all_scores)
+    end_time = float(duration) if duration is not None else float(times[-1] + 1 / sample_rate)
+
+    # scores[i] compares frame i and i + 1, so a cut opens a scene at times[i + 1]
+    cut_indices = np.flatnonzero(scores > threshold) + 1
+    segments = []
+    scene_start, scene_score = 0.0, 1.0
+    for index in cut_indices:
+        cut_time = float(times[index])
+        if cut_time - scene_start < min_scene_seconds:
+            continue
+        segments.append({"start": round(scene_start, 3), "end": round(cut_time, 3), "score": round(scene_score, 3)})
+        scene_start, scene_score = cut_time, float(scores[index - 1])
+    if end_time > scene_start:
+        segments.append({"start": round(scene_start, 3), "end": round(end_time, 3), "score": round(scene_score, 3)})
+    return segments
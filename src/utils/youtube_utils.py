@@ -1,84 +1,256 @@
-import yt_dlp
+import logging
 import os
-import subprocess  
-import json 
+import threading
+from typing import NamedTuple, TYPE_CHECKING
 
-def search_youtube(query: str, max_results: int = 1) -> list[str]: # Reduced max_results for simplicity
+from utils.download_cache import DownloadCache, normalize_video_id
+from utils.instrumentation import span, incr
+from utils.search_cache import SearchCache
+
+if TYPE_CHECKING:
+    # yt-dlp takes a noticeable time to import; it is only loaded once something is fetched
+    import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_LOG = "/app/data/found_urls.jsonl"
+
+_search_caches = {}
+_search_caches_lock = threading.Lock()
+
+
+def get_search_cache(log_path: str) -> SearchCache:
+    """The shared SearchCache of a search log."""
+    with _search_caches_lock:
+        if log_path not in _search_caches:
+            _search_caches[log_path] = SearchCache(log_path)
+        return _search_caches[log_path]
+
+
+def search_youtube(query: str, max_results: int = 1, cache: SearchCache | None = None,
+                   log_path: str | None = DEFAULT_SEARCH_LOG) -> list[str]: # Reduced max_results for simplicity
     """Searches YouTube for videos based on the given query.
 
     Args:
         query: The search term.
         max_results: The maximum number of video URLs to return.
+        cache: SearchCache to use; defaults to the shared cache of log_path (the
+            same log YouTubeScraper writes). Fresh cached results are returned
+            without searching, and new results are appended to its log.
+        log_path: Search log used when no cache is given; None disables caching.
 
     Returns:
         A list of YouTube video URLs.
     """
+    if cache is None and log_path is not None:
+        cache = get_search_cache(log_path)
+    if cache is not None:
+        cached = cache.get(query, max_results)
+        if cached is not None:
+            incr('cache_hits', cache='search')
+            return cached
+        incr('cache_misses', cache='search')
+
+    import yt_dlp
     ydl_opts = {
-        'quiet': False, # Set to False to see more output
-        'extract_flat': 'in_playlist', # Let's keep this for now
-        'entries': f'ytsearch{max_results}:{query}',
+        'quiet': True,
+        'extract_flat': 'in_playlist',
         'skip_download': True,
         'ignoreerrors': False, # Keep this as False
     }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    with span('search'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        incr('api_calls', service='youtube_search')
         try:
             info_dict = ydl.extract_info(f'ytsearch{max_results}:{query}', download=False)
-            print(json.dumps(info_dict, indent=4)) # Print the raw info dictionary
-            video_urls = [entry.get('webpage_url') for entry in info_dict.get('entries', []) if entry and entry.get('webpage_url')]
-            return video_urls
         except Exception as e:
-            print(f"An error occurred during search: {e}")
+            logger.error("An error occurred during search: %s", e)
             return []
+    entries = [entry for entry in info_dict.get('entries', []) if entry]
+    video_urls = [entry.get('webpage_url') or entry.get('url') for entry in entries if entry.get('webpage_url') or entry.get('url')]
+    logger.info("Found %d videos for '%s'", len(video_urls), query)
+    if cache is not None:
+        cache.record(query, max_results, video_urls)
+    return video_urls
 
-def download_video(url: str, output_path: str = "/app/data/youtube_videos", **kwargs) -> tuple[str | None, str | None]:
-    """Downloads a YouTube video and its subtitles using subprocess."""
+class DownloadResult(NamedTuple):
+    """Paths yt-dlp actually wrote for one video; any of them may be None."""
+    video_id: str
+    video_path: str | None
+    subtitle_path: str | None
+    info_path: str | None
+    title: str | None = None
+    duration: float | None = None
+
+
+VIDEO_FORMAT = 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best'
+
+# One YoutubeDL per worker thread and configuration, so extractors are initialized once per worker
+_worker = threading.local()
+
+
+def _ydl_options(output_path: str, download_media: bool) -> dict:
+    return {
+        'format': VIDEO_FORMAT,
+        'merge_output_format': 'mp4',
+        'outtmpl': os.path.join(output_path, '%(id)s.%(ext)s'),
+        'writesubtitles': True,
+        'writeautomaticsub': True,
+        'subtitleslangs': ['en', 'en-US', 'en-GB'],
+        'subtitlesformat': 'vtt',
+        'writeinfojson': True,
+        'skip_download': not download_media,
+        # Resume .part files left behind by an interrupted download
+        'continuedl': True,
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+
+
+def get_youtube_dl(output_path: str, download_media: bool = True) -> 'yt_dlp.YoutubeDL':
+    """Return this thread's YoutubeDL for the given configuration, creating it on first use."""
+    instances = getattr(_worker, 'instances', None)
+    if instances is None:
+        instances = _worker.instances = {}
+    key = (output_path, download_media)
+    if key not in instances:
+        import yt_dlp
+        instances[key] = yt_dlp.YoutubeDL(_ydl_options(output_path, download_media))
+    return instances[key]
+
+
+def _result_from_info(ydl: 'yt_dlp.YoutubeDL', info: dict) -> DownloadResult:
+    downloads = info.get('requested_downloads') or []
+    video_path = downloads[0].get('filepath') if downloads else None
+    subtitle_path = None
+    for subtitle in (info.get('requested_subtitles') or {}).values():
+        if subtitle.get('filepath') and os.path.exists(subtitle['filepath']):
+            subtitle_path = subtitle['filepath']
+            break
+    # Not always set on the returned info (e.g. when the file already existed), so ask yt-dlp for the name
+    info_path = info.get('infojson_filename') or ydl.prepare_filename(info, 'infojson')
+    return DownloadResult(
+        video_id=info['id'],
+        video_path=video_path if video_path and os.path.exists(video_path) else None,
+        subtitle_path=subtitle_path,
+        info_path=info_path if info_path and os.path.exists(info_path) else None,
+        title=info.get('title'),
+        duration=info.get('duration'),
+    )
+
+
+def _size(*paths) -> int:
+    """Total size of the files that exist among paths (None entries are skipped)."""
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+
+_download_caches = {}
+_download_caches_lock = threading.Lock()
+
+
+def get_download_cache(output_path: str) -> DownloadCache:
+    """The shared DownloadCache of an output directory."""
+    with _download_caches_lock:
+        if output_path not in _download_caches:
+            _download_caches[output_path] = DownloadCache(output_path)
+        return _download_caches[output_path]
+
+
+def _result_from_entry(video_id: str, entry: dict) -> DownloadResult:
+    artifacts = entry['artifacts']
+    return DownloadResult(
+        video_id=video_id,
+        video_path=artifacts.get('video_path', {}).get('path'),
+        subtitle_path=artifacts.get('subtitle_path', {}).get('path'),
+        info_path=artifacts.get('info_path', {}).get('path'),
+        title=entry.get('title'),
+        duration=entry.get('duration'),
+    )
+
+
+def fetch_video(url: str, output_path: str = "/app/data/youtube_videos", download_media: bool = True,
+                use_cache: bool = True) -> DownloadResult:
+    """Fetch media, English subtitles and the info JSON for a video in a single in-process extraction.
+
+    With download_media=False only subtitles and metadata are written. When the
+    video's artifacts are already recorded in the output directory's manifest
+    and intact, they are returned without touching the network.
+    Raises yt_dlp.utils.DownloadError if the extraction fails.
+    """
     os.makedirs(output_path, exist_ok=True)
-    base_filename = url.split('/')[-1]  # Extract video ID from URL
-    video_output_path = os.path.join(output_path, f'{base_filename}.mp4')
-    subtitle_output_path = os.path.join(output_path, f'{base_filename}.en.vtt')
+    cache = get_download_cache(output_path) if use_cache else None
+    video_id = normalize_video_id(url)
+    if cache is not None and video_id:
+        entry = cache.get(video_id, need_media=download_media)
+        if entry is not None:
+            incr('cache_hits', cache='download')
+            logger.info("Using cached download for %s", video_id)
+            return _result_from_entry(video_id, entry)
+        incr('cache_misses', cache='download')
 
-    video_success = False
-    subtitle_success = False
+    ydl = get_youtube_dl(output_path, download_media)
+    with span('download'):
+        incr('api_calls', service='youtube_download')
+        info = ydl.extract_info(url, download=True)
+    result = _result_from_info(ydl, info)
+    incr('bytes_downloaded', _size(result.video_path, result.subtitle_path, result.info_path))
+    if cache is not None:
+        cache.record(result)
+    return result
+
+
+def fetch_segments(url: str, segments: list[dict], output_path: str = "/app/data/youtube_clips",
+                   precise: bool = False) -> list[str]:
+    """Download only the given {'start', 'end'} time ranges of a video, one file per range.
+
+    Used once clip export is requested after a subtitle-only analysis, so the
+    full video is never fetched. yt-dlp needs ffmpeg for this. With precise=True
+    cuts are re-encoded at exact times instead of the nearest keyframes.
+    """
+    ranges = [(float(segment['start']), float(segment['end'])) for segment in segments if segment['end'] > segment['start']]
+    if not ranges:
+        return []
+    import yt_dlp
+    os.makedirs(output_path, exist_ok=True)
+    ydl_opts = {
+        **_ydl_options(output_path, download_media=True),
+        'writesubtitles': False,
+        'writeautomaticsub': False,
+        'writeinfojson': False,
+        'download_ranges': yt_dlp.utils.download_range_func(None, ranges),
+        'force_keyframes_at_cuts': precise,
+        'outtmpl': os.path.join(output_path, '%(id)s.%(section_start)d-%(section_end)d.%(ext)s'),
+    }
+    with span('download'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        incr('api_calls', service='youtube_download')
+        info = ydl.extract_info(url, download=True)
+    paths = [
+        download['filepath'] for download in info.get('requested_downloads') or []
+        if download.get('filepath') and os.path.exists(download['filepath'])
+    ]
+    incr('bytes_downloaded', _size(*paths))
+    return paths
 
-    try:
-        print(f"Attempting to download video for '{url}' using subprocess...")
-        video_command = [
-            'yt-dlp',
-            '-o', video_output_path,
-            '-f', 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best',
-            url
-        ]
-        subprocess.run(video_command, check=True, capture_output=True)
-        video_success = True
-        print(f"Video downloaded to: {video_output_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error downloading video: {e.stderr.decode()}")
-    except FileNotFoundError:
-        print("Error: yt-dlp command not found. Is it installed in the container?")
 
+def download_video(url: str, output_path: str = "/app/data/youtube_videos", **kwargs) -> tuple[str | None, str | None]:
+    """Downloads a YouTube video and its subtitles in one in-process yt-dlp extraction."""
+    import yt_dlp
     try:
-        print(f"Attempting to download subtitles for '{url}' using subprocess...")
-        subtitle_command = [
-            'yt-dlp',
-            '--write-sub',
-            '--write-auto-sub',
-            '--sub-lang', 'en',
-            '--sub-format', 'vtt',
-            '-o', subtitle_output_path,
-            '--skip-download',  # Don't download the video again
-            url
-        ]
-        subprocess.run(subtitle_command, check=True, capture_output=True)
-        subtitle_success = True
-        print(f"Subtitles downloaded to: {subtitle_output_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error downloading subtitles: {e.stderr.decode()}")
-    except FileNotFoundError:
-        print("Error: yt-dlp command not found. Is it installed in the container?")
-
-    return video_output_path if video_success else None, subtitle_output_path if subtitle_success else None
+        logger.info("Attempting to download video and subtitles for '%s'...", url)
+        result = fetch_video(url, output_path=output_path)
+    except yt_dlp.utils.DownloadError as e:
+        logger.error("Error downloading video: %s", e)
+        return None, None
+
+    if result.video_path:
+        logger.info("Video downloaded to: %s", result.video_path)
+    if result.subtitle_path:
+        logger.info("Subtitles downloaded to: %s", result.subtitle_path)
+    return result.video_path, result.subtitle_path
 
 if __name__ == '__main__':
+    from utils.instrumentation import configure_logging
+    configure_logging()
     test_url = "https://www.youtube.com/watch?v=jnWaUtS2Fr8"  # Use the same test URL
     output_directory = "/app/data/youtube_videos"
     print(f"Attempting to directly download: {test_url} to {output_directory} using subprocess")
@@ -1,12 +1,13 @@
+from utils.search_cache import SearchCache
+from utils.youtube_utils import fetch_video, search_youtube
 
-import yt_dlp
+def download_best_match(query: str, output_path: str = "videos", cache: SearchCache | None = None) -> str | None:
+    """Downloads the top search result for query, reusing it if it was downloaded before.
 
-def download_best_match(query: str, **kwargs) -> str:
-    ydl_opts = {
-        "format": "best[height<=720]",
-        "outtmpl": "videos/%(id)s.%(ext)s",
-        **kwargs
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(f"ytsearch1:{query}", download=True)
-        return f"videos/{info['entries'][0]['id']}.mp4"
\ No newline at end of file
+    The search goes through search_youtube, so a recent identical search is answered
+    from its cache (cache, or the shared default one).
+    """
+    video_urls = search_youtube(query, max_results=1, cache=cache)
+    if not video_urls:
+        return None
+    return fetch_video(video_urls[0], output_path=output_path).video_path